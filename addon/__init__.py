@@ -2,12 +2,24 @@
 from __future__ import annotations
 
 def setup() -> None:
-    """Register editor UI and settings menu."""
+    """Register editor UI, settings menu and idle-time cache warming."""
     # Import inside the function to avoid circular imports / reload loops
     from .ui_editor import init_editor
     from .ui_menu import init_menu
+    from .warming import init_warming
     init_editor()
     init_menu()
+    init_warming()
+
+def _in_anki() -> bool:
+    """False when imported outside Anki (e.g. `python -m addon.cli`)."""
+    try:
+        from aqt import mw
+    except ImportError:
+        return False
+    return mw is not None
+
 
 # Run on module import (keeps behavior identical to your current file)
-setup()
+if _in_anki():
+    setup()
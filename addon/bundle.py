@@ -0,0 +1,232 @@
+# bundle.py
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+
+# Cache bundles: one SQLite file holding resolved queries (the result lists
+# of the query cache) and image bytes (from the content-addressed download
+# cache), so a team can resolve a curriculum once and pre-seed every other
+# machine. Imported bundles are kept as-is in a folder and queried through
+# their indexes on a cache miss, so thousands of queries cost no memory.
+# No Anki imports here.
+
+BUNDLE_VERSION = 1
+BUNDLE_SUFFIX = ".imgsearch-bundle"
+
+_SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE queries (
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    label TEXT,
+    fetched_at REAL,
+    results BLOB NOT NULL,
+    PRIMARY KEY (provider, query)
+);
+CREATE TABLE images (digest TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE image_urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL);
+"""
+
+
+def export_bundle(path: str, entries, images, meta: dict | None = None) -> dict:
+    """
+    Write a bundle to path. entries are dicts as returned by
+    QueryCache.export_entries() (key = (provider, query)); images yields
+    (url, bytes). Returns counts of what was written.
+    """
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    counts = {"queries": 0, "images": 0, "image_urls": 0}
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_SCHEMA)
+        info = {"version": str(BUNDLE_VERSION), "created_at": str(time.time())}
+        info.update({k: str(v) for k, v in (meta or {}).items()})
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", info.items())
+        for entry in entries:
+            provider, query = entry["key"]
+            blob = zlib.compress(json.dumps(entry["results"], separators=(",", ":")).encode("utf-8"))
+            conn.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                (provider, query, entry.get("provider"), entry.get("fetched_at"), blob),
+            )
+            counts["queries"] += 1
+        for url, data in images:
+            digest = hashlib.sha256(data).hexdigest()
+            if conn.execute("INSERT OR IGNORE INTO images VALUES (?, ?)", (digest, data)).rowcount:
+                counts["images"] += 1
+            conn.execute("INSERT OR REPLACE INTO image_urls VALUES (?, ?)", (url, digest))
+            counts["image_urls"] += 1
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return counts
+
+
+class Bundle:
+    """Read-only view of one bundle file; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            version = self._conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        except sqlite3.Error as e:
+            raise ValueError(f"not an image search bundle: {path}") from e
+        if not version or version[0] != str(BUNDLE_VERSION):
+            self._conn.close()
+            raise ValueError(f"unsupported bundle version: {path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def meta(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, value FROM meta"))
+
+    def lookup(self, provider: str, query: str):
+        """(label, fetched_at, result dicts) for the cache key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT label, fetched_at, results FROM queries WHERE provider = ? AND query = ?",
+                (provider, query),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            results = json.loads(zlib.decompress(row[2]))
+        except (zlib.error, ValueError):
+            return None
+        return row[0], row[1], results
+
+    def image(self, url: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT i.digest, i.data FROM image_urls u JOIN images i ON i.digest = u.digest WHERE u.url = ?",
+                (url,),
+            ).fetchone()
+        if row is None or hashlib.sha256(row[1]).hexdigest() != row[0]:
+            return None
+        return row[1]
+
+    def counts(self) -> dict:
+        with self._lock:
+            queries = self._conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+            images = self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        return {"queries": queries, "images": images}
+
+
+class BundleShelf:
+    """Imported bundles in one folder; the most recently imported answers first."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._bundles: list[Bundle] | None = None
+
+    def install(self, source: str) -> dict:
+        """Validate source and copy it onto the shelf; returns its counts."""
+        bundle = Bundle(source)
+        try:
+            result = bundle.counts()
+        finally:
+            bundle.close()
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        os.makedirs(self.folder, exist_ok=True)
+        target = os.path.join(self.folder, digest.hexdigest()[:16] + BUNDLE_SUFFIX)
+        if not os.path.exists(target):
+            tmp = target + ".tmp"
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, target)
+        os.utime(target, None)
+        self._reopen()
+        return result
+
+    def clear(self) -> int:
+        """Remove every imported bundle; returns how many were removed."""
+        with self._lock:
+            for bundle in self._bundles or []:
+                bundle.close()
+            self._bundles = []
+            removed = 0
+            for name in self._names():
+                try:
+                    os.unlink(os.path.join(self.folder, name))
+                    removed += 1
+                except OSError:
+                    pass
+            return removed
+
+    def lookup(self, provider: str, query: str):
+        for bundle in self._open():
+            try:
+                hit = bundle.lookup(provider, query)
+            except sqlite3.Error:
+                continue
+            if hit is not None:
+                return hit
+        return None
+
+    def image(self, url: str) -> bytes | None:
+        for bundle in self._open():
+            try:
+                data = bundle.image(url)
+            except sqlite3.Error:
+                continue
+            if data is not None:
+                return data
+        return None
+
+    def stats(self) -> dict:
+        stats = {"bundles": 0, "queries": 0, "images": 0}
+        for bundle in self._open():
+            try:
+                counts = bundle.counts()
+            except sqlite3.Error:
+                continue
+            stats["bundles"] += 1
+            stats["queries"] += counts["queries"]
+            stats["images"] += counts["images"]
+        return stats
+
+    # ----- internals -----
+    def _names(self) -> list[str]:
+        try:
+            names = [n for n in os.listdir(self.folder) if n.endswith(BUNDLE_SUFFIX)]
+        except OSError:
+            return []
+        mtime = lambda n: os.path.getmtime(os.path.join(self.folder, n))
+        return sorted(names, key=mtime, reverse=True)
+
+    def _open(self) -> list[Bundle]:
+        with self._lock:
+            if self._bundles is None:
+                self._bundles = []
+                for name in self._names():
+                    try:
+                        self._bundles.append(Bundle(os.path.join(self.folder, name)))
+                    except ValueError:
+                        continue
+            return list(self._bundles)
+
+    def _reopen(self) -> None:
+        with self._lock:
+            for bundle in self._bundles or []:
+                bundle.close()
+            self._bundles = None
@@ -0,0 +1,290 @@
+# cache.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Thread-safe LRU cache of search results, shared by the editor and any
+# background workers. No Anki imports here.
+
+# Version of the save() file format
+_FORMAT_VERSION = 1
+
+# Rough per-record overhead on top of the string payloads (object, slots, ints)
+_RECORD_OVERHEAD_BYTES = 200
+_ENTRY_OVERHEAD_BYTES = 300
+
+
+def _result_size(result) -> int:
+    size = _RECORD_OVERHEAD_BYTES
+    for name in ("url", "thumb_url", "original_url", "page_url", "mime", "provider"):
+        value = getattr(result, name, None)
+        if value:
+            size += len(value)
+    return size
+
+
+class CacheEntry:
+    """
+    One cached search. `results` may keep growing while a streaming drain
+    appends to it; `reason` is set (and `results` empty) for negative entries.
+    `shown` maps URLs already displayed for this query to their image hash.
+    """
+
+    __slots__ = ("key", "results", "index", "provider", "fetched_at", "reason", "size", "shown")
+
+    def __init__(self, key, results, provider: str, reason: str | None = None, fetched_at: float | None = None):
+        self.key = key
+        self.results = results
+        self.index = 0 if results else -1
+        self.provider = provider
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.reason = reason
+        self.shown = {}
+        self.size = _ENTRY_OVERHEAD_BYTES + sum(_result_size(r) for r in results)
+
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+    def current(self):
+        if 0 <= self.index < len(self.results):
+            return self.results[self.index]
+        return None
+
+
+class QueryCache:
+    """
+    LRU map of cache key -> CacheEntry, bounded by entry count and by an
+    approximate byte size. Every operation takes the same lock, so it can be
+    used from the UI thread and background workers at once.
+    """
+
+    def __init__(self, max_entries: int = 100, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key, valid=None):
+        """
+        Return the entry and mark it most recently used; counts a hit or miss.
+        An entry for which valid(entry) is false counts as a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (valid is not None and not valid(entry)):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        """Return the entry without touching LRU order or counters."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, results, provider: str, reason: str | None = None, fetched_at: float | None = None) -> CacheEntry:
+        entry = CacheEntry(key, results, provider, reason=reason, fetched_at=fetched_at)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def append(self, entry: CacheEntry, result) -> None:
+        """Add a result to an entry (e.g. from a streaming drain)."""
+        with self._lock:
+            entry.results.append(result)
+            if entry.index < 0:
+                entry.index = 0
+            grown = _result_size(result)
+            entry.size += grown
+            if self._entries.get(entry.key) is entry:
+                self._bytes += grown
+                self._evict()
+
+    def replace_results(self, key, results, provider: str) -> CacheEntry:
+        """
+        Swap in a fresh result list (e.g. after a background refresh), keeping
+        the user on the same image when it is still in the new list.
+        """
+        with self._lock:
+            old = self._entries.get(key)
+            if old is None:
+                return self.put(key, results, provider)
+            current = old.current()
+            fresh = CacheEntry(key, results, provider)
+            fresh.shown = old.shown
+            if current is not None and results:
+                urls = [r.url for r in results]
+                if current.url in urls:
+                    fresh.index = urls.index(current.url)
+                else:
+                    fresh.index = min(old.index, len(results) - 1)
+            self._bytes += fresh.size - old.size
+            self._entries[key] = fresh
+            self._evict()
+            return fresh
+
+    def reorder_tail(self, entry: CacheEntry, order) -> None:
+        """Replace the results after the current index with order(those results)."""
+        with self._lock:
+            start = entry.index + 1
+            if 0 < start < len(entry.results):
+                entry.results[start:] = order(entry.results[start:])
+
+    def step(self, key, delta: int, skip=None):
+        """
+        Move the entry's index by delta (clamped) and return the current result.
+        Results for which skip(result) is true are passed over, unless that
+        would run off the end of the list.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.results:
+                return None
+            last = len(entry.results) - 1
+            target = entry.index + delta
+            if skip is not None and delta:
+                while 0 <= target <= last and skip(entry.results[target]):
+                    target += delta
+                if not 0 <= target <= last:
+                    target = entry.index + delta
+            entry.index = max(0, min(last, target))
+            return entry.current()
+
+    def free_slots(self) -> int:
+        """Entries that can still be added before anything is evicted."""
+        with self._lock:
+            if self.max_bytes and self._bytes >= self.max_bytes:
+                return 0
+            return max(0, max(1, self.max_entries) - len(self._entries))
+
+    def pop(self, key):
+        with self._lock:
+            return self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "approx_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def export_entries(self, encode) -> list[dict]:
+        """
+        Entries with results as plain dicts (least recently used first);
+        encode(result) must return a JSON-serializable dict. Negative
+        entries are left out.
+        """
+        with self._lock:
+            return [
+                {
+                    "key": list(entry.key) if isinstance(entry.key, tuple) else entry.key,
+                    "provider": entry.provider,
+                    "fetched_at": entry.fetched_at,
+                    "index": entry.index,
+                    "results": [encode(r) for r in entry.results],
+                }
+                for entry in self._entries.values()
+                if entry.results
+            ]
+
+    def import_entries(self, items, decode) -> int:
+        """
+        Add entries in the export_entries() format as the least recently
+        used ones; decode(dict) rebuilds a result. Entries already in memory
+        win. Returns the number added.
+        """
+        loaded = 0
+        with self._lock:
+            for item in items:
+                try:
+                    key = item["key"]
+                    key = tuple(key) if isinstance(key, list) else key
+                    if key in self._entries:
+                        continue
+                    results = [decode(r) for r in item["results"]]
+                    entry = CacheEntry(key, results, item["provider"], fetched_at=float(item["fetched_at"]))
+                    entry.index = max(0, min(len(results) - 1, int(item.get("index", 0))))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not results:
+                    continue
+                # Saved entries are older than anything used this session
+                self._entries[key] = entry
+                self._entries.move_to_end(key, last=False)
+                self._bytes += entry.size
+                loaded += 1
+            self._evict()
+        return loaded
+
+    def save(self, path: str, encode) -> int:
+        """
+        Write export_entries(encode) to path as JSON. Returns the number of
+        entries written.
+        """
+        entries = self.export_entries(encode)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": _FORMAT_VERSION, "entries": entries}, f)
+        os.replace(tmp, path)
+        return len(entries)
+
+    def load(self, path: str, decode) -> int:
+        """
+        Add entries saved by save(); decode(dict) rebuilds a result. Entries
+        already in memory win over saved ones. Returns the number loaded.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get("version") != _FORMAT_VERSION:
+            return 0
+        return self.import_entries(data.get("entries") or [], decode)
+
+    # ----- internals (lock held) -----
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > max(1, self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1)
+        ):
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
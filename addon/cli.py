@@ -0,0 +1,229 @@
+# cli.py
+"""
+Bulk image search outside Anki, through the same provider, transport,
+merge and ranking code as the editor.
+
+    python -m addon.cli words.txt > results.jsonl
+    cat words.txt | python -m addon.cli --provider duckduckgo --concurrency 4 --rate 2
+    python -m addon.cli words.txt --download images/ --size medium --max-bytes 500000
+    python -m addon.cli words.txt --replay words.cassette --profile profiles/
+
+Queries are read one per line (blank lines and lines starting with # are
+skipped) from the given files, or from stdin. Each query produces one JSON
+line, written as soon as it is done:
+
+    {"line": 1, "query": "cat", "provider": "Yandex", "error": null,
+     "results": [{"url": ...}, ...], "file": "images/cat_1a2b3c4d5e.jpg",
+     "elapsed_ms": 412.3}
+
+Settings come from the shipped config.json, then --config, then the
+command-line flags. Needs `requests`; Anki is not required.
+
+--profile DIR runs the whole batch, worker threads included, under
+cProfile and tracemalloc and saves a .prof file and a text summary there.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from . import profiling, search, transport, utils
+from .results import SIZE_PROFILES
+
+_SLUG_RE = re.compile(r"[^\w-]+", re.UNICODE)
+
+
+class RateLimiter:
+    """Spaces calls at least 1/per_second apart across threads (0 = no limit)."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def read_queries(paths):
+    """Yield (line number, query) from files (or stdin for none / "-")."""
+    for path in paths or ["-"]:
+        stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+        try:
+            for number, line in enumerate(stream, 1):
+                query = line.strip()
+                if query and not query.startswith("#"):
+                    yield number, query
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def _file_name(query: str, url: str, data: bytes) -> str:
+    slug = _SLUG_RE.sub("_", query).strip("_")[:40] or "img"
+    return f"{slug}_{hashlib.sha1(data).hexdigest()[:10]}{utils._infer_suffix_from_url(url)}"
+
+
+def download_first(results, folder: str, query: str, profile: str, max_bytes: int, timeout_s: float):
+    """
+    Save the first result that downloads (trying its size-profile URL
+    variants in order, like the editor does). Returns (path, url) or (None, None).
+    """
+    for image in results:
+        for url in image.candidate_urls(profile, max_bytes):
+            try:
+                data = utils._download_bytes(url, timeout_s=timeout_s, max_bytes=max_bytes)
+            except Exception:
+                continue
+            path = os.path.join(folder, _file_name(query, url, data))
+            with open(path, "wb") as f:
+                f.write(data)
+            return path, url
+    return None, None
+
+
+def run_query(number: int, query: str, args, limiter: RateLimiter) -> dict:
+    started = time.monotonic()
+    q = search._clean_query(query)
+    record = {"line": number, "query": query, "provider": None, "error": None, "results": []}
+    if not q:
+        record["error"] = "empty_query"
+    else:
+        limiter.wait()
+        try:
+            results, label = search._merged_results_and_label(q)
+        except Exception as exc:
+            results, label = [], None
+            record["error"] = f"unexpected: {exc!r}"
+        record["provider"] = label
+        if not results and record["error"] is None:
+            record["error"] = search._failure_reason(getattr(results, "error", None))
+        results = list(results)[: args.limit] if args.limit else list(results)
+        record["results"] = [image.to_dict() for image in results]
+        if args.download and results:
+            path, url = download_first(results, args.download, q, args.size, args.max_bytes, args.timeout)
+            record["file"] = path
+            record["file_url"] = url
+    record["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return record
+
+
+def build_config(args) -> dict:
+    config = utils.default_config()
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    overrides = {
+        "provider": args.provider,
+        "local_images_dir": args.local_dir,
+        "google_api_key": args.google_key or os.environ.get("IMAGESEARCH_GOOGLE_KEY"),
+        "google_cx": args.google_cx or os.environ.get("IMAGESEARCH_GOOGLE_CX"),
+        "request_timeout_s": args.timeout,
+        "max_retries": args.retries,
+    }
+    if args.merge:
+        overrides["merge_providers"] = [p.strip() for p in args.merge.split(",") if p.strip()]
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    # Work the editor does ahead of time has no use here
+    config.update({"presearch_while_typing": False, "warm_enabled": False, "phash_prefetch": False})
+    return config
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m addon.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("inputs", nargs="*", help="query files, one query per line (default: stdin)")
+    parser.add_argument("-o", "--output", help="write JSONL here instead of stdout")
+    parser.add_argument("--config", help="JSON file of config overrides (same keys as config.json)")
+    parser.add_argument("--provider", choices=["yandex", "duckduckgo", "ddg", "google", "local"])
+    parser.add_argument("--merge", help="comma-separated providers to query together, e.g. yandex,duckduckgo")
+    parser.add_argument("--local-dir", help="folder of images for --provider local")
+    parser.add_argument("--google-key", help="or set IMAGESEARCH_GOOGLE_KEY")
+    parser.add_argument("--google-cx", help="or set IMAGESEARCH_GOOGLE_CX")
+    parser.add_argument("--concurrency", type=int, default=2, help="queries in flight at once")
+    parser.add_argument("--rate", type=float, default=1.0, help="max provider queries per second (0 = no limit)")
+    parser.add_argument("--timeout", type=float, help="request timeout in seconds")
+    parser.add_argument("--retries", type=int, help="retries on timeout")
+    parser.add_argument("--limit", type=int, default=10, help="results per query in the output (0 = all)")
+    parser.add_argument("--download", metavar="DIR", help="also save the first image of each query here")
+    parser.add_argument("--size", choices=SIZE_PROFILES, default="default", help="image size profile")
+    parser.add_argument("--max-bytes", type=int, default=0, help="skip image variants larger than this")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="record provider responses to a cassette")
+    cassette.add_argument("--replay", metavar="CASSETTE", help="answer from a cassette, no network")
+    parser.add_argument("--profile", metavar="DIR", help="profile the batch and save the results here")
+    args = parser.parse_args(argv)
+
+    config = build_config(args)
+    utils.set_standalone_config(config)
+    if args.timeout is None:
+        args.timeout = float(config.get("request_timeout_s", 10.0))
+    if args.download:
+        os.makedirs(args.download, exist_ok=True)
+    # Searches find no local images until the index is built
+    search.start_local_index(wait=True)
+    limiter = RateLimiter(args.rate)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    out_lock = threading.Lock()
+    counts = {"queries": 0, "failed": 0}
+
+    def work(item):
+        record = run_query(*item, args, limiter)
+        with out_lock:
+            counts["queries"] += 1
+            counts["failed"] += 1 if record["error"] else 0
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    def run_batch() -> int:
+        with ExitStack() as stack:
+            if out is not sys.stdout:
+                stack.callback(out.close)
+            if args.record:
+                stack.enter_context(transport.use_cassette(args.record, transport.RECORD))
+            elif args.replay:
+                stack.enter_context(transport.use_cassette(args.replay, transport.REPLAY))
+            pool = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, args.concurrency)))
+            # Bounded submission keeps memory flat for very long word lists
+            pending = []
+            try:
+                for item in read_queries(args.inputs):
+                    pending.append(pool.submit(work, item))
+                    if len(pending) >= args.concurrency * 4:
+                        pending.pop(0).result()
+                for future in pending:
+                    future.result()
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                return 130
+        return 0
+
+    if args.profile:
+        code, prof_path, summary_path = profiling.run_profiled(run_batch, args.profile, "batch", threads=True)
+        print(f"Profile saved: {prof_path} {summary_path}", file=sys.stderr)
+    else:
+        code = run_batch()
+    search.PAYLOADS.flush()
+    if code:
+        return code
+    print(f"{counts['queries']} queries, {counts['failed']} without results", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
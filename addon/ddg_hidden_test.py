@@ -1,9 +1,16 @@
 # ddg_hidden_test.py
 
+import json
 import re
+import threading
 import time
 import requests
-from aqt import mw
+
+from . import payload_cache, transport
+from .results import PROVIDER_ERROR, ImageResult, ResultList
+from .streamparse import iter_json_array, iter_text
+from .timing import PARSE, PROVIDER_HTTP, stream_span, timed
+from .utils import get_config
 
 # DuckDuckGo image search via the hidden i.js endpoint.
 # This is undocumented and may change; keep it best-effort and quiet.
@@ -50,7 +57,7 @@ def _safe_int(value, default, minimum=None, maximum=None):
 
 def _get_net_settings():
     try:
-        cfg = mw.addonManager.getConfig(__name__) or {}
+        cfg = get_config() or {}
     except Exception:
         cfg = {}
     timeout_s = _safe_float(cfg.get("request_timeout_s", 10.0), 10.0, minimum=1.0, maximum=120.0)
@@ -59,10 +66,21 @@ def _get_net_settings():
     return timeout_s, max_retries, backoff_base_s
 
 
-def _request_with_retry(url, params, timeout_s, max_retries, backoff_base_s):
+def _get_vqd_ttl() -> float:
+    try:
+        cfg = get_config() or {}
+    except Exception:
+        cfg = {}
+    return _safe_float(cfg.get("ddg_vqd_ttl_s", 600.0), 600.0, minimum=0.0, maximum=86400.0)
+
+
+def _request_with_retry(url, params, timeout_s, max_retries, backoff_base_s, accept_status=()):
     for attempt in range(max_retries + 1):
         try:
-            resp = requests.get(url, params=params, headers=_HEADERS, timeout=timeout_s)
+            with timed(PROVIDER_HTTP, "duckduckgo"):
+                resp = transport.get(url, params=params, headers=_HEADERS, timeout=timeout_s)
+            if resp.status_code in accept_status:
+                return resp
             resp.raise_for_status()
             return resp
         except requests.exceptions.Timeout:
@@ -92,57 +110,201 @@ def _get_vqd(query: str, timeout_s: float, max_retries: int, backoff_base_s: flo
     return match.group(1)
 
 
-def get_ddg_images(query: str) -> list[str]:
+# vqd tokens are per query and stay valid for a while; caching them saves the
+# HTML round trip on repeated searches. Entries: query -> (vqd, fetched_at).
+_VQD_CACHE: dict[str, tuple[str, float]] = {}
+_VQD_CACHE_MAX = 200
+_vqd_lock = threading.Lock()
+
+
+def _cached_vqd(query: str, net, refresh: bool = False) -> str | None:
+    ttl = _get_vqd_ttl()
+    now = time.monotonic()
+    if not refresh and ttl > 0:
+        with _vqd_lock:
+            cached = _VQD_CACHE.get(query)
+        if cached and now - cached[1] < ttl:
+            return cached[0]
+
+    vqd = _get_vqd(query, *net)
+    with _vqd_lock:
+        _VQD_CACHE.pop(query, None)
+        if vqd and ttl > 0:
+            _VQD_CACHE[query] = (vqd, now)
+            while len(_VQD_CACHE) > _VQD_CACHE_MAX:
+                _VQD_CACHE.pop(next(iter(_VQD_CACHE)), None)
+    return vqd
+
+
+def _forget_vqd(query: str) -> None:
+    with _vqd_lock:
+        _VQD_CACHE.pop(query, None)
+
+
+def get_ddg_image_results(query: str) -> list[ImageResult]:
     query = (query or "").strip()
     if not query:
         return []
 
-    timeout_s, max_retries, backoff_base_s = _get_net_settings()
-    vqd = _get_vqd(query, timeout_s, max_retries, backoff_base_s)
-    if not vqd:
-        return []
+    net = _get_net_settings()
+    timeout_s, max_retries, backoff_base_s = net
+    data = None
+    # A cached token can expire early; on 403 or an unusable body refresh once.
+    for refresh in (False, True):
+        vqd = _cached_vqd(query, net, refresh=refresh)
+        if not vqd:
+            return ResultList(error=PROVIDER_ERROR)
 
-    resp = _request_with_retry(
-        _DDG_IMAGE_API_URL,
-        params={
-            "q": query,
-            "vqd": vqd,
-            "o": "json",
-        },
-        timeout_s=timeout_s,
-        max_retries=max_retries,
-        backoff_base_s=backoff_base_s,
-    )
-    if not resp:
-        return []
+        resp = _request_with_retry(
+            _DDG_IMAGE_API_URL,
+            params={
+                "q": query,
+                "vqd": vqd,
+                "o": "json",
+            },
+            timeout_s=timeout_s,
+            max_retries=max_retries,
+            backoff_base_s=backoff_base_s,
+            accept_status=(403,),
+        )
+        if not resp:
+            return ResultList(error=PROVIDER_ERROR)
+        if resp.status_code != 403:
+            try:
+                data = resp.json()
+            except Exception:
+                data = None
+            if isinstance(data, dict) and "results" in data:
+                payload_cache.store("duckduckgo", query, 0, resp.content)
+                break
+        _forget_vqd(query)
+        data = None
 
+    with timed(PARSE, "duckduckgo"):
+        images = parse_ddg_results(data)
+    if images is None:
+        return ResultList(error=PROVIDER_ERROR)
+    return images
+
+
+def parse_ddg_payload(body: bytes) -> list[ImageResult]:
+    """parse_ddg_results() for a raw i.js body (e.g. from the payload cache)."""
     try:
-        data = resp.json()
-    except Exception:
+        return parse_ddg_results(json.loads(body)) or []
+    except ValueError:
         return []
 
+
+def parse_ddg_results(data) -> list[ImageResult] | None:
+    """ImageResult records from a decoded i.js body; None if it has no results array."""
     results = data.get("results") if isinstance(data, dict) else None
     if not isinstance(results, list):
-        return []
-
-    urls = []
+        return None
+    images = []
     for item in results:
-        if not isinstance(item, dict):
-            continue
-        url = item.get("image")
-        if url:
-            urls.append(url)
-    return urls
+        image = _result_from_item(item)
+        if image:
+            images.append(image)
+    return images
+
+
+def get_ddg_images(query: str) -> list[str]:
+    return [image.url for image in get_ddg_image_results(query)]
+
+
+def _result_from_item(item):
+    if not isinstance(item, dict):
+        return None
+    url = item.get("image")
+    if not url:
+        return None
+    return ImageResult(
+        url,
+        thumb_url=item.get("thumbnail") or None,
+        original_url=url,
+        page_url=item.get("url") or None,
+        width=item.get("width") or 0,
+        height=item.get("height") or 0,
+        provider="duckduckgo",
+    )
+
+
+def iter_ddg_images(query: str):
+    """
+    Streaming variant of get_ddg_image_results(): yields records from the i.js
+    `results` array as each entry is decoded, without waiting for the rest
+    of the body. Returns PROVIDER_ERROR (as the generator's return value)
+    when the request failed before anything was yielded.
+    """
+    query = (query or "").strip()
+    if not query:
+        return
+
+    net = _get_net_settings()
+    timeout_s, max_retries, backoff_base_s = net
+    vqd = _cached_vqd(query, net)
+    if not vqd:
+        return PROVIDER_ERROR
+
+    params = {"q": query, "vqd": vqd, "o": "json"}
+    yielded = False
+    refreshed = False
+    attempt = 0
+    while True:
+        span = stream_span(PROVIDER_HTTP, "duckduckgo")
+        try:
+            with span.measure():
+                response = transport.get(
+                    _DDG_IMAGE_API_URL,
+                    params=params,
+                    headers=_HEADERS,
+                    timeout=timeout_s,
+                    stream=True,
+                )
+            with response as resp:
+                stale = resp.status_code == 403
+                if not stale:
+                    resp.raise_for_status()
+                    body = payload_cache.Tee(span.chunks(resp.iter_content(chunk_size=8192)), "duckduckgo", query)
+                    items = iter_json_array(iter_text(body), "results")
+                    while True:
+                        try:
+                            item = next(items)
+                        except StopIteration as stop:
+                            found = bool(stop.value)
+                            break
+                        image = _result_from_item(item)
+                        if image:
+                            yielded = True
+                            yield image
+                    if found:
+                        body.finish()
+                    # A 200 without a results array means the token is no good
+                    stale = not found and not yielded
+            if not stale:
+                return
+            if refreshed:
+                return PROVIDER_ERROR
+            # Stale token: fetch a fresh one and try again
+            refreshed = True
+            _forget_vqd(query)
+            params["vqd"] = _cached_vqd(query, net, refresh=True)
+            if not params["vqd"]:
+                return PROVIDER_ERROR
+        except requests.exceptions.Timeout:
+            span.finish(ok=False)
+            if not yielded and attempt < max_retries:
+                time.sleep(backoff_base_s * (2 ** attempt))
+                attempt += 1
+                continue
+            return None if yielded else PROVIDER_ERROR
+        except requests.exceptions.RequestException:
+            span.finish(ok=False)
+            return None if yielded else PROVIDER_ERROR
+        finally:
+            span.finish()
 
 
 # Backwards-compatible export name
 getddgimages = get_ddg_images
 
-
-if __name__ == "__main__":
-    keyword = "nebula"
-    print(f"Searching for: {keyword}...")
-    urls = get_ddg_images(keyword)
-    print(f"Found {len(urls)} images. Top 5 URLs:")
-    for url in urls[:5]:
-        print(f"-> {url}")
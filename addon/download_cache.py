@@ -0,0 +1,176 @@
+# download_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Content-addressed store for image bytes fetched ahead of time (e.g. by the
+# pre-search while typing), so the download that follows a click can skip
+# the network. Files are named by the SHA-256 of their content; index.json
+# maps source URLs to those names. File sizes and their total are kept in
+# memory (the folder is read once, with the index), and index.json is
+# rewritten at most every INDEX_SAVE_INTERVAL_S while storing; flush()
+# writes pending changes. No Anki imports here: the folder is passed in by
+# the caller.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+INDEX_SAVE_INTERVAL_S = 5.0
+_INDEX_NAME = "index.json"
+
+
+class DownloadCache:
+    """Bounded on-disk URL -> bytes cache; oldest files are evicted first."""
+
+    def __init__(self, folder: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: dict[str, str] | None = None
+        # File name -> size, least recently stored first, and their total
+        self._sizes: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._dirty = False
+        self._saved_at = None
+
+    # ----- public -----
+    def get(self, url: str) -> bytes | None:
+        if not url:
+            return None
+        with self._lock:
+            digest = self._load_index().get(url)
+        if not digest:
+            return None
+        try:
+            with open(self._path(digest), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                if self._load_index().pop(url, None) is not None:
+                    self._dirty = True
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return None
+        return data
+
+    def __contains__(self, url) -> bool:
+        with self._lock:
+            digest = self._load_index().get(url)
+        return bool(digest) and os.path.exists(self._path(digest))
+
+    def put(self, url: str, data: bytes) -> str | None:
+        """Store data for url; returns its content hash (None if not stored)."""
+        if not url or not data:
+            return None
+        if self.max_bytes and len(data) > self.max_bytes:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                if not os.path.exists(path):
+                    tmp = path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+                else:
+                    os.utime(path, None)
+            except OSError:
+                return None
+            self._load_index()[url] = digest
+            self._bytes += len(data) - self._sizes.pop(digest, 0)
+            self._sizes[digest] = len(data)
+            self._evict()
+            self._save_index_later()
+        return digest
+
+    def flush(self) -> None:
+        """Write index changes still pending from put()."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def items(self):
+        """Yield (url, bytes) for every stored URL whose file is still intact."""
+        with self._lock:
+            urls = list(self._load_index())
+        for url in urls:
+            data = self.get(url)
+            if data is not None:
+                yield url, data
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load_index()
+            return self._bytes
+
+    # ----- internals -----
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.folder, digest)
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            self._sizes = OrderedDict((name, size) for _, size, name in sorted(self._files()))
+            self._bytes = sum(self._sizes.values())
+            self._dirty = False
+            try:
+                with open(os.path.join(self.folder, _INDEX_NAME), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index = {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        path = os.path.join(self.folder, _INDEX_NAME)
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._index or {}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _save_index_later(self) -> None:
+        self._dirty = True
+        if self._saved_at is None or time.monotonic() - self._saved_at >= INDEX_SAVE_INTERVAL_S:
+            self._save_index()
+
+    def _files(self) -> list[tuple[float, int, str]]:
+        out = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return out
+        for name in names:
+            if name == _INDEX_NAME or name.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, name))
+        return out
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        removed = set()
+        while self._bytes > self.max_bytes and self._sizes:
+            name, size = self._sizes.popitem(last=False)
+            try:
+                os.unlink(self._path(name))
+            except OSError:
+                pass
+            self._bytes -= size
+            removed.add(name)
+        if removed:
+            index = self._load_index()
+            for url in [u for u, d in index.items() if d in removed]:
+                del index[url]
+            self._dirty = True
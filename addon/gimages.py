@@ -1,8 +1,19 @@
 # gimages.py
 
+import hashlib
+import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
 import requests
-from aqt import mw
+
+from . import payload_cache, transport
+from .results import PROVIDER_ERROR, ImageResult, ResultList
+from .utils import get_config, user_files_path
+from .streamparse import iter_json_array, iter_text
+from .timing import PARSE, PROVIDER_HTTP, stream_span, timed
 
 def _safe_float(value, default, minimum=None, maximum=None):
     try:
@@ -30,7 +41,7 @@ def _safe_int(value, default, minimum=None, maximum=None):
 
 def _get_net_settings():
     try:
-        cfg = mw.addonManager.getConfig(__name__) or {}
+        cfg = get_config() or {}
     except Exception:
         cfg = {}
     timeout_s = _safe_float(cfg.get("request_timeout_s", 10.0), 10.0, minimum=1.0, maximum=120.0)
@@ -38,24 +49,38 @@ def _get_net_settings():
     backoff_base_s = _safe_float(cfg.get("backoff_base_s", 0.75), 0.75, minimum=0.05, maximum=10.0)
     return timeout_s, max_retries, backoff_base_s
 
+def _get_result_depth():
+    """Number of results to request (google_result_depth), in pages of 10, max 100."""
+    try:
+        cfg = get_config() or {}
+    except Exception:
+        cfg = {}
+    return _safe_int(cfg.get("google_result_depth", 10), 10, minimum=10, maximum=100)
+
+def _get_quota_settings():
+    """(daily_quota, reserve): CSE free tier is 100 requests/day."""
+    try:
+        cfg = get_config() or {}
+    except Exception:
+        cfg = {}
+    daily = _safe_int(cfg.get("google_daily_quota", 100), 100, minimum=1, maximum=100000)
+    reserve = _safe_int(cfg.get("google_quota_reserve", 0), 0, minimum=0, maximum=100000)
+    return daily, reserve
+
 def _get_google_creds():
     try:
-        cfg = mw.addonManager.getConfig(__name__) or {}
+        cfg = get_config() or {}
     except Exception:
         cfg = {}
     return (cfg.get("google_api_key") or "").strip(), (cfg.get("google_cx") or "").strip()
 
-def getgimages(query: str):
-    """
-    Returns a list of direct image URLs using Google Custom Search JSON API.
-    If credentials are missing or a request fails, returns [].
-    """
-    api_key, cx = _get_google_creds()
-    if not api_key or not cx:
-        return []
+_BASE_URL = "https://www.googleapis.com/customsearch/v1"
+
+# Partial response: only the fields _result_from_item() reads
+_FIELDS = "items(link,mime,image(contextLink,width,height,byteSize,thumbnailLink))"
+
 
-    timeout_s, max_retries, backoff_base_s = _get_net_settings()
-    base = "https://www.googleapis.com/customsearch/v1"
+def _search_params(api_key: str, cx: str, query: str, start: int = 1) -> dict:
     params = {
         "key": api_key,
         "cx": cx,
@@ -63,22 +88,292 @@ def getgimages(query: str):
         "searchType": "image",
         "safe": "active",
         "num": 10,  # API limit per request
+        "fields": _FIELDS,
     }
+    if start > 1:
+        params["start"] = start
+    return params
+
+
+def _page_starts(depth: int) -> list[int]:
+    # start=1,11,21,... ; the API never returns results past index 100
+    return list(range(1, min(depth, 100) + 1, 10))
+
+
+# ---- Daily quota accounting ----
+# One counter per API key (stored as a hash, never the key itself) and per
+# quota day. Google resets CSE quotas at midnight Pacific time.
+
+_QUOTA_FILE = "google_quota.json"
+_quota_lock = threading.Lock()
+
+
+def _quota_day() -> str:
+    try:
+        from zoneinfo import ZoneInfo
+
+        now = datetime.now(ZoneInfo("America/Los_Angeles"))
+    except Exception:
+        now = datetime.now(timezone(timedelta(hours=-8)))
+    return now.strftime("%Y-%m-%d")
+
+
+def _key_id(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _load_quota() -> dict:
+    try:
+        with open(user_files_path(_QUOTA_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_quota(data: dict) -> None:
+    try:
+        with open(user_files_path(_QUOTA_FILE), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    except Exception:
+        pass
+
+
+def _used_today(data: dict, api_key: str) -> int:
+    entry = data.get(_key_id(api_key)) or {}
+    if entry.get("day") != _quota_day():
+        return 0
+    return _safe_int(entry.get("used", 0), 0, minimum=0)
+
+
+def _record_quota_use(api_key: str, used: int | None = None) -> None:
+    """Count one request, or set the counter to `used` (e.g. after a 429)."""
+    with _quota_lock:
+        data = _load_quota()
+        count = used if used is not None else _used_today(data, api_key) + 1
+        data[_key_id(api_key)] = {"day": _quota_day(), "used": count}
+        _save_quota(data)
+
+
+def google_quota_status():
+    """Return (used_today, daily_quota) for the configured API key, or None without a key."""
+    api_key, _ = _get_google_creds()
+    if not api_key:
+        return None
+    daily, _ = _get_quota_settings()
+    with _quota_lock:
+        used = _used_today(_load_quota(), api_key)
+    return min(used, daily), daily
+
+
+def google_quota_allows_search() -> bool:
+    """
+    False when today's remaining budget cannot cover one search (all pages
+    of google_result_depth) plus the configured reserve.
+    """
+    status = google_quota_status()
+    if status is None:
+        return True
+    used, daily = status
+    _, reserve = _get_quota_settings()
+    needed = len(_page_starts(_get_result_depth()))
+    return daily - used >= needed + reserve
 
+
+def _is_quota_error(exc) -> bool:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return False
+    if response.status_code == 429:
+        return True
+    if response.status_code == 403:
+        try:
+            reasons = [e.get("reason") for e in response.json()["error"]["errors"]]
+        except Exception:
+            return False
+        return any(r in ("dailyLimitExceeded", "rateLimitExceeded", "quotaExceeded") for r in reasons)
+    return False
+
+
+def _result_from_item(it):
+    if not isinstance(it, dict) or not it.get("link"):
+        return None
+    image = it.get("image") or {}
+    return ImageResult(
+        it["link"],
+        thumb_url=image.get("thumbnailLink") or None,
+        original_url=it["link"],
+        page_url=image.get("contextLink") or None,
+        width=image.get("width") or 0,
+        height=image.get("height") or 0,
+        mime=it.get("mime") or None,
+        byte_size=image.get("byteSize") or 0,
+        provider="google",
+    )
+
+
+def _page_index(params) -> int:
+    """0 for start=1, 1 for start=11, ... (the payload cache's page number)."""
+    return (int(params.get("start", 1)) - 1) // 10
+
+
+def parse_gimages_payload(body: bytes) -> ResultList:
+    """parse_gimages_response() for a raw response body (e.g. from the payload cache)."""
+    try:
+        return parse_gimages_response(json.loads(body))
+    except ValueError:
+        return ResultList()
+
+
+def parse_gimages_response(data) -> ResultList:
+    """ImageResult records from a decoded Custom Search response (no items -> empty)."""
+    items = (data.get("items") if isinstance(data, dict) else None) or []
+    return ResultList(image for image in map(_result_from_item, items) if image)
+
+
+def getgimages(query: str):
+    """
+    Returns a list of direct image URLs using Google Custom Search JSON API.
+    If credentials are missing or a request fails, returns [].
+    """
+    return [image.url for image in getgimage_results(query)]
+
+
+def getgimage_results(query: str):
+    """
+    Same as getgimages() but returns ImageResult records with the size,
+    MIME type, thumbnail and source page reported by the API.
+    With google_result_depth > 10 the extra pages are fetched concurrently
+    and merged in page order.
+    """
+    api_key, cx = _get_google_creds()
+    if not api_key or not cx:
+        return ResultList(error=PROVIDER_ERROR)
+
+    net = _get_net_settings()
+    starts = _page_starts(_get_result_depth())
+    if len(starts) == 1:
+        return _fetch_page(_search_params(api_key, cx, query), *net)
+
+    with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+        pages = list(pool.map(
+            lambda start: _fetch_page(_search_params(api_key, cx, query, start), *net),
+            starts,
+        ))
+    if not pages[0]:
+        return pages[0]
+    merged = ResultList()
+    for page in pages:
+        if not page:
+            break  # later pages cannot continue a gap
+        merged.extend(page)
+    return merged
+
+
+def _fetch_page(params, timeout_s, max_retries, backoff_base_s):
     for attempt in range(max_retries + 1):
         try:
-            r = requests.get(base, params=params, timeout=timeout_s)
-            r.raise_for_status()
-            data = r.json()
-            items = data.get("items") or []
-            return [it.get("link") for it in items if it.get("link")]
+            _record_quota_use(params["key"])
+            with timed(PROVIDER_HTTP, "google"):
+                r = transport.get(_BASE_URL, params=params, timeout=timeout_s)
+                r.raise_for_status()
+                data = r.json()
+            payload_cache.store("google", params["q"], _page_index(params), r.content)
+            with timed(PARSE, "google"):
+                return parse_gimages_response(data)
         except requests.exceptions.Timeout:
             # backoff and retry
             if attempt < max_retries:
                 time.sleep(backoff_base_s * (2 ** attempt))
                 continue
-            return []
-        except Exception:
+            return ResultList(error=PROVIDER_ERROR)
+        except Exception as exc:
+            # quota errors, bad key/cx, etc.
+            if _is_quota_error(exc):
+                _record_quota_use(params["key"], used=_get_quota_settings()[0])
+            return ResultList(error=PROVIDER_ERROR)
+    return ResultList(error=PROVIDER_ERROR)
+
+
+def itergimages(query: str):
+    """
+    Streaming variant of getgimage_results(): yields records from the `items` array
+    while the JSON body is still arriving. Extra pages (google_result_depth)
+    are requested concurrently once the first page has a result, and yielded
+    after it, in order; an empty first page ends the search.
+    Returns PROVIDER_ERROR (as the generator's return value) when the first
+    page failed.
+    """
+    api_key, cx = _get_google_creds()
+    if not api_key or not cx:
+        return PROVIDER_ERROR
+
+    net = _get_net_settings()
+    starts = _page_starts(_get_result_depth())
+    if len(starts) == 1:
+        return (yield from _stream_page(_search_params(api_key, cx, query), *net))
+
+    pool = ThreadPoolExecutor(max_workers=len(starts) - 1)
+    futures = []
+    try:
+        first_page = _stream_page(_search_params(api_key, cx, query), *net)
+        while True:
+            try:
+                image = next(first_page)
+            except StopIteration as stop:
+                error = stop.value
+                break
+            if not futures:
+                # Like getgimage_results(), an empty first page ends the
+                # search, so the extra pages' quota is only spent once it
+                # has a result
+                futures = [
+                    pool.submit(_fetch_page, _search_params(api_key, cx, query, start), *net)
+                    for start in starts[1:]
+                ]
+            yield image
+        if error or not futures:
+            return error
+        for future in futures:
+            page = future.result()
+            if not page:
+                return
+            yield from page
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _stream_page(params, timeout_s, max_retries, backoff_base_s):
+    yielded = False
+
+    for attempt in range(max_retries + 1):
+        span = stream_span(PROVIDER_HTTP, "google")
+        try:
+            _record_quota_use(params["key"])
+            with span.measure():
+                resp = transport.get(_BASE_URL, params=params, timeout=timeout_s, stream=True)
+            with resp as r:
+                r.raise_for_status()
+                chunks = span.chunks(r.iter_content(chunk_size=8192))
+                body = payload_cache.Tee(chunks, "google", params["q"], _page_index(params))
+                for it in iter_json_array(iter_text(body), "items"):
+                    image = _result_from_item(it)
+                    if image:
+                        yielded = True
+                        yield image
+                body.finish()
+            return
+        except requests.exceptions.Timeout:
+            span.finish(ok=False)
+            if not yielded and attempt < max_retries:
+                time.sleep(backoff_base_s * (2 ** attempt))
+                continue
+            return None if yielded else PROVIDER_ERROR
+        except Exception as exc:
+            span.finish(ok=False)
             # quota errors, bad key/cx, etc.
-            return []
-    return []
+            if _is_quota_error(exc):
+                _record_quota_use(params["key"], used=_get_quota_settings()[0])
+            return None if yielded else PROVIDER_ERROR
+        finally:
+            span.finish()
@@ -0,0 +1,310 @@
+# local_images.py
+
+import json
+import os
+import re
+import threading
+import time
+
+# Searchable index of a folder of images on disk (e.g. a licensed collection
+# for a curated deck). Each image is indexed under the words of its file
+# name, of the folders it sits in below the root, and of an optional sidecar
+# text file with tags ("cat.jpg" + "cat.txt" or "cat.jpg.txt"). The inverted
+# index lives in memory; the per-file tokens are saved to a JSON file so a
+# restart only re-reads files whose mtime or size changed.
+# No Anki imports here.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".svg")
+SIDECAR_EXTENSIONS = (".txt", ".tags")
+DEFAULT_REFRESH_INTERVAL_S = 30.0
+MAX_SIDECAR_BYTES = 64 * 1024
+_FORMAT_VERSION = 1
+
+_MIME = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+    ".svg": "image/svg+xml",
+}
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def tokenize(text: str) -> list[str]:
+    """Casefolded words of text; "RedPanda_02" -> ["red", "panda", "02"]."""
+    return [t.casefold() for t in _TOKEN_RE.findall(_CAMEL_RE.sub(" ", text or ""))]
+
+
+def _sidecar(name: str, entries: dict):
+    """DirEntry of the sidecar tag file for image name, from its folder's entries."""
+    stem = os.path.splitext(name)[0]
+    for base in (name, stem):
+        for ext in SIDECAR_EXTENSIONS:
+            entry = entries.get(base + ext)
+            if entry is not None:
+                return entry
+    return None
+
+
+def _file_tokens(rel: str, sidecar: str | None) -> list[str]:
+    parts = rel.replace(os.sep, "/").split("/")
+    words = tokenize(" ".join(parts[:-1]) + " " + os.path.splitext(parts[-1])[0])
+    if sidecar:
+        try:
+            with open(sidecar, "r", encoding="utf-8", errors="replace") as f:
+                words += tokenize(f.read(MAX_SIDECAR_BYTES))
+        except OSError:
+            pass
+    return sorted(set(words))
+
+
+class LocalImageIndex:
+    """
+    Inverted index over one folder. Searches never walk the folder or read
+    the saved index: loading, the first build and every refresh that is due
+    (every refresh_interval_s) are handed to spawn(fn) to run elsewhere,
+    e.g. a background thread, and searches find nothing until the index is
+    ready. Without spawn they run inline.
+    """
+
+    def __init__(self, root: str | None = None, index_path: str | None = None,
+                 refresh_interval_s: float = DEFAULT_REFRESH_INTERVAL_S):
+        self.root = root
+        self.index_path = index_path
+        self.refresh_interval_s = refresh_interval_s
+        self.spawn = None
+        self._lock = threading.Lock()
+        self._files: dict | None = None
+        self._postings: dict[str, set] = {}
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self._queued = False
+
+    def configure(self, root: str | None, index_path: str | None = None, spawn=None) -> None:
+        """Point the index at root (None or "" disables it); spawn(fn) runs refreshes."""
+        root = os.path.abspath(root) if root else None
+        with self._lock:
+            if root != self.root or index_path != self.index_path:
+                self._files = None
+                self._postings = {}
+                self._refreshed_at = 0.0
+            self.root = root
+            self.index_path = index_path
+            self.spawn = spawn
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root) and os.path.isdir(self.root)
+
+    @property
+    def ready(self) -> bool:
+        """True once the saved index is loaded or a build has finished."""
+        with self._lock:
+            return self._files is not None and (bool(self._files) or bool(self._refreshed_at))
+
+    def start(self) -> None:
+        """Load (or first build) the index now, through spawn, e.g. when a profile opens."""
+        if self.enabled:
+            self._refresh_if_due()
+
+    # ----- public -----
+    def refresh(self, force: bool = False) -> int:
+        """
+        Re-index files added, changed (mtime or size, or their sidecar's
+        mtime) or removed since the last refresh. Skipped when the last one
+        was less than refresh_interval_s ago, unless force. The folder is
+        walked without holding the lock, so searches are answered from the
+        current index meanwhile. Returns the number of files (re)indexed or
+        dropped.
+        """
+        if not self.enabled:
+            return 0
+        with self._lock:
+            self._queued = False
+            now = time.monotonic()
+            due = force or not self._refreshed_at or now - self._refreshed_at >= self.refresh_interval_s
+            if not due or self._refreshing:
+                return 0
+            self._refreshing = True
+            root = self.root
+            known = {rel: dict(meta) for rel, meta in self._load().items()}
+        try:
+            updates, seen = {}, set()
+            for rel, stat, sidecar in _walk(root):
+                seen.add(rel)
+                side_mtime = _entry_mtime(sidecar)
+                old = known.get(rel)
+                if (
+                    old is not None
+                    and old.get("mtime") == stat.st_mtime
+                    and old.get("size") == stat.st_size
+                    and old.get("sidecar_mtime") == side_mtime
+                ):
+                    continue
+                updates[rel] = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "sidecar_mtime": side_mtime,
+                    "tokens": _file_tokens(rel, sidecar.path if sidecar else None),
+                }
+            removed = [rel for rel in known if rel not in seen]
+        except Exception:
+            with self._lock:
+                self._refreshing = False
+            raise
+        with self._lock:
+            self._refreshing = False
+            if root != self.root or self._files is None:
+                return 0  # reconfigured meanwhile
+            for rel, meta in updates.items():
+                old = self._files.get(rel)
+                if old is not None:
+                    self._unpost(rel, old["tokens"])
+                self._files[rel] = meta
+                self._post(rel, meta["tokens"])
+            for rel in removed:
+                old = self._files.pop(rel, None)
+                if old is not None:
+                    self._unpost(rel, old["tokens"])
+            self._refreshed_at = time.monotonic()
+            changed = len(updates) + len(removed)
+            if changed:
+                self._save()
+            return changed
+
+    def search(self, query: str, limit: int = 50, require_all: bool = False) -> list[dict]:
+        """
+        Images matching the words of query, best first: more query words
+        matched, then fewer unrelated words in the name (so "cat" ranks
+        cat.jpg above cat_and_dog.jpg). With require_all, only images
+        matching every word. Each is {"path", "byte_size", "mime"}.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self.enabled:
+            return []
+        self._refresh_if_due()
+        if not self.ready:
+            return []
+        with self._lock:
+            matched: dict[str, int] = {}
+            for word in words:
+                for rel in self._postings.get(word, ()):
+                    matched[rel] = matched.get(rel, 0) + 1
+            if require_all:
+                matched = {rel: n for rel, n in matched.items() if n == len(words)}
+            files = self._files or {}
+            ranked = sorted(matched, key=lambda rel: (-matched[rel], len(files[rel]["tokens"]), rel))
+            return [
+                {
+                    "path": os.path.join(self.root, rel),
+                    "byte_size": files[rel].get("size", 0),
+                    "mime": _MIME.get(os.path.splitext(rel)[1].lower()),
+                }
+                for rel in ranked[: max(0, limit)]
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = self._files or {}
+            return {"files": len(files), "tokens": len(self._postings)}
+
+    # ----- internals -----
+    def _refresh_if_due(self) -> None:
+        with self._lock:
+            # Not loaded yet: the saved index is read by the refresh itself
+            due = (
+                self._files is None
+                or not self._refreshed_at
+                or time.monotonic() - self._refreshed_at >= self.refresh_interval_s
+            )
+            spawn = self.spawn
+            if not due or self._refreshing or self._queued:
+                return
+            self._queued = spawn is not None
+        if spawn is None:
+            self.refresh()
+            return
+        try:
+            spawn(self.refresh)
+        except Exception:
+            with self._lock:
+                self._queued = False
+
+    def _post(self, rel: str, tokens) -> None:
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(rel)
+
+    def _unpost(self, rel: str, tokens) -> None:
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(rel)
+                if not postings:
+                    del self._postings[token]
+
+    def _load(self) -> dict:
+        if self._files is None:
+            self._files, self._postings = {}, {}
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get("version") == _FORMAT_VERSION and data.get("root") == self.root:
+                    self._files = {
+                        k: v
+                        for k, v in (data.get("files") or {}).items()
+                        if isinstance(v, dict) and isinstance(v.get("tokens"), list)
+                    }
+            except (OSError, TypeError, ValueError):
+                pass
+            for rel, meta in self._files.items():
+                self._post(rel, meta["tokens"])
+        return self._files
+
+    def _save(self) -> None:
+        if not self.index_path:
+            return
+        data = {"version": _FORMAT_VERSION, "root": self.root, "files": self._files or {}}
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+
+def _walk(root: str):
+    """Yield (relative path, stat, sidecar DirEntry or None) for every image below root."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = {entry.name: entry for entry in os.scandir(folder)}
+        except OSError:
+            continue
+        for name, entry in entries.items():
+            try:
+                if entry.is_dir():
+                    if not name.startswith("."):
+                        stack.append(entry.path)
+                elif name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.relpath(entry.path, root), entry.stat(), _sidecar(name, entries)
+            except OSError:
+                continue
+
+
+def _entry_mtime(entry) -> float | None:
+    if entry is None:
+        return None
+    try:
+        return entry.stat().st_mtime
+    except OSError:
+        return None
+
+
+LOCAL_IMAGES = LocalImageIndex()
@@ -0,0 +1,139 @@
+# media_index.py
+
+import json
+import os
+import threading
+
+# Which media files the add-on already inserted for a query, so the same
+# word on another note can reuse the image in the collection instead of
+# searching and downloading a new copy. Kept as JSON (one file per Anki
+# profile, since media folders are per profile): normalized query -> file
+# names, most recently inserted first. Files deleted from the collection
+# are dropped when a lookup finds them missing.
+# No Anki imports here.
+
+MAX_FILES_PER_QUERY = 8
+_FORMAT_VERSION = 1
+
+
+def normalize(query: str) -> str:
+    return " ".join((query or "").split()).casefold()
+
+
+class MediaIndex:
+    """Thread-safe query -> media file names map, saved after every change."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._queries: dict | None = None
+
+    def configure(self, path: str | None) -> None:
+        """Point the index at path (None disables it)."""
+        with self._lock:
+            if path != self.path:
+                self._queries = None
+            self.path = path
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    # ----- public -----
+    def add(self, query: str, filename: str) -> None:
+        key = normalize(query)
+        if not self.path or not key or not filename:
+            return
+        with self._lock:
+            queries = self._load()
+            files = [f for f in queries.get(key, []) if f != filename]
+            queries[key] = [filename] + files[: MAX_FILES_PER_QUERY - 1]
+            self._save()
+
+    def lookup(self, query: str, exists=None) -> str | None:
+        """
+        Most recently inserted file for query that exists(filename) still
+        confirms (any file when exists is None), or None.
+        """
+        key = normalize(query)
+        if not self.path or not key:
+            return None
+        with self._lock:
+            files = list(self._load().get(key, []))
+        found, missing = None, []
+        for filename in files:
+            if exists is None or exists(filename):
+                found = filename
+                break
+            missing.append(filename)
+        if missing:
+            with self._lock:
+                queries = self._load()
+                kept = [f for f in queries.get(key, []) if f not in missing]
+                if kept:
+                    queries[key] = kept
+                else:
+                    queries.pop(key, None)
+                self._save()
+        return found
+
+    def rebuild(self, pairs) -> int:
+        """
+        Replace the index with (query, filename) pairs, oldest first (later
+        pairs count as more recent). Returns the number of queries indexed.
+        """
+        if not self.path:
+            return 0
+        queries: dict = {}
+        for query, filename in pairs:
+            key = normalize(query)
+            if not key or not filename:
+                continue
+            files = [f for f in queries.get(key, []) if f != filename]
+            queries[key] = [filename] + files[: MAX_FILES_PER_QUERY - 1]
+        with self._lock:
+            self._queries = queries
+            self._save()
+        return len(queries)
+
+    def exists_on_disk(self) -> bool:
+        """False until the index has been saved once (e.g. before a first rebuild)."""
+        return bool(self.path) and os.path.exists(self.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queries = self._load() if self.path else {}
+            return {"queries": len(queries), "files": sum(len(f) for f in queries.values())}
+
+    # ----- internals (lock held) -----
+    def _load(self) -> dict:
+        if self._queries is None:
+            self._queries = {}
+            if not self.path:
+                return self._queries
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get("version") == _FORMAT_VERSION:
+                    self._queries = {
+                        k: [f for f in v if isinstance(f, str)]
+                        for k, v in (data.get("queries") or {}).items()
+                        if isinstance(v, list)
+                    }
+            except (OSError, ValueError):
+                pass
+        return self._queries
+
+    def _save(self) -> None:
+        data = {"version": _FORMAT_VERSION, "queries": self._queries or {}}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+MEDIA_INDEX = MediaIndex()
@@ -0,0 +1,156 @@
+# merge.py
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# URL canonicalization and de-duplication for provider results.
+# Keep this module free of Anki imports so it can be used from tests and
+# background threads.
+
+# Query parameters that only track the click, never select the image
+_TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_ga", "ref_src"}
+_TRACKING_PREFIXES = ("utm_",)
+
+# Thumbnail/redirect proxies whose real target is in a query parameter:
+# host -> parameter names to try, in order
+_PROXY_PARAMS = {
+    "external-content.duckduckgo.com": ("u",),
+    "proxy.duckduckgo.com": ("u",),
+    "www.google.com": ("imgurl", "url"),
+    "images.google.com": ("imgurl", "url"),
+    "www.bing.com": ("mediaurl",),
+}
+
+# WordPress-style resized copies: name-300x200.jpg -> name.jpg
+_SIZE_SUFFIX_RE = re.compile(r"-\d{2,5}x\d{2,5}(?=\.[A-Za-z0-9]{2,5}$)")
+
+# Wikimedia thumbnails: /thumb/a/ab/File.jpg/220px-File.jpg -> /a/ab/File.jpg
+_WIKIMEDIA_THUMB_RE = re.compile(r"/thumb(/[0-9a-f]/[0-9a-f]{2}/[^/]+)/[^/]+$")
+
+_MAX_UNWRAP = 3
+
+
+def _unwrap(parts):
+    host = (parts.hostname or "").lower()
+    names = _PROXY_PARAMS.get(host)
+    if not names:
+        return None
+    params = dict(parse_qsl(parts.query, keep_blank_values=True))
+    for name in names:
+        target = params.get(name)
+        if target and target.lower().startswith(("http://", "https://", "//")):
+            return target
+    return None
+
+
+def canonical_url(url: str) -> str:
+    """
+    Comparison key for an image URL. Two URLs with the same key are taken to
+    be the same picture; the key itself is never downloaded.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    if url.startswith("//"):
+        url = "https:" + url
+
+    for _ in range(_MAX_UNWRAP):
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return url
+        target = _unwrap(parts)
+        if not target:
+            break
+        url = "https:" + target if target.startswith("//") else target
+    else:
+        parts = urlsplit(url)
+
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    path = _WIKIMEDIA_THUMB_RE.sub(r"\1", parts.path or "/")
+    path = _SIZE_SUFFIX_RE.sub("", path)
+
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith(_TRACKING_PREFIXES)
+    ]
+    query.sort()
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _keys(result) -> set:
+    keys = set()
+    for url in (result.url, result.original_url):
+        key = canonical_url(url) if url else ""
+        if key:
+            keys.add(key)
+    return keys
+
+
+def _fill_missing(kept, dup) -> None:
+    """Copy metadata the kept record lacks from a duplicate of it."""
+    for name in ("thumb_url", "original_url", "page_url", "mime"):
+        if not getattr(kept, name) and getattr(dup, name):
+            setattr(kept, name, getattr(dup, name))
+    if not (kept.width and kept.height) and dup.width and dup.height:
+        kept.width, kept.height = dup.width, dup.height
+    if not kept.byte_size and dup.byte_size:
+        kept.byte_size = dup.byte_size
+
+
+class Deduper:
+    """
+    Stateful filter for a result stream: accept() returns False for a record
+    that is the same picture as one already accepted (and merges its
+    metadata into the earlier record).
+    """
+
+    __slots__ = ("_seen",)
+
+    def __init__(self):
+        self._seen: dict = {}
+
+    def accept(self, result) -> bool:
+        keys = _keys(result)
+        for key in keys:
+            kept = self._seen.get(key)
+            if kept is not None:
+                _fill_missing(kept, result)
+                for other in keys:
+                    self._seen.setdefault(other, kept)
+                return False
+        for key in keys:
+            self._seen[key] = result
+        return True
+
+
+def dedupe(results) -> list:
+    """Drop later records that canonicalize to an earlier one, keeping order."""
+    deduper = Deduper()
+    return [result for result in results if deduper.accept(result)]
+
+
+def interleave(*lists) -> list:
+    """Round-robin merge (first of each list, then second of each, ...), de-duplicated."""
+    merged = []
+    iterators = [iter(items) for items in lists if items]
+    while iterators:
+        alive = []
+        for iterator in iterators:
+            for item in iterator:
+                merged.append(item)
+                alive.append(iterator)
+                break
+        iterators = alive
+    return dedupe(merged)
@@ -0,0 +1,273 @@
+# payload_cache.py
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Optional on-disk store of raw provider responses (the JSON bodies as they
+# came over the wire), gzip-compressed and keyed by (provider, query, page).
+# When a parser is fixed or tuned, results can be rebuilt from these at disk
+# speed instead of refetching every query. The providers hand their bodies
+# to store() or Tee; nothing is kept until configure() is given a folder.
+# File sizes and their running total are kept in memory (the folder is read
+# once, when the index is loaded), and index.json is rewritten at most every
+# INDEX_SAVE_INTERVAL_S while storing; flush() writes pending changes.
+# No Anki imports here.
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+INDEX_SAVE_INTERVAL_S = 5.0
+_INDEX_NAME = "index.json"
+_FORMAT_VERSION = 1
+
+
+def _key(provider: str, query: str, page: int) -> str:
+    return f"{provider}\x1f{int(page)}\x1f{(query or '').strip().casefold()}"
+
+
+class PayloadCache:
+    """Bounded folder of gzip files plus index.json; oldest files are evicted first."""
+
+    def __init__(self, folder: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: dict | None = None
+        self._stamp = ""
+        # File name -> size, oldest first, and their total
+        self._sizes: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._dirty = False
+        self._saved_at = None
+
+    def configure(self, folder: str | None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Point the cache at folder (None disables it)."""
+        with self._lock:
+            if folder != self.folder:
+                if self._dirty and self.folder:
+                    self._save_index()
+                self._index = None
+            self.folder = folder
+            self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.folder)
+
+    # ----- public -----
+    def put(self, provider: str, query: str, page: int, body: bytes) -> bool:
+        if not self.folder or not provider or not body:
+            return False
+        data = gzip.compress(body)
+        if self.max_bytes and len(data) > self.max_bytes:
+            return False
+        key = _key(provider, query, page)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".gz"
+        with self._lock:
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                path = os.path.join(self.folder, name)
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                return False
+            self._load_index()[key] = {
+                "file": name,
+                "provider": provider,
+                "query": query,
+                "page": int(page),
+                "stored_at": time.time(),
+            }
+            self._bytes += len(data) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(data)
+            self._evict()
+            self._save_index_later()
+        return True
+
+    def flush(self) -> None:
+        """Write index changes still pending from put()."""
+        with self._lock:
+            if self._dirty and self.folder:
+                self._save_index()
+
+    def get(self, provider: str, query: str, page: int = 0):
+        """(body, stored_at) for the key, or None."""
+        if not self.folder:
+            return None
+        key = _key(provider, query, page)
+        with self._lock:
+            meta = self._load_index().get(key)
+        if not meta:
+            return None
+        try:
+            with open(os.path.join(self.folder, meta["file"]), "rb") as f:
+                return gzip.decompress(f.read()), meta.get("stored_at", 0.0)
+        except (OSError, EOFError, gzip.BadGzipFile):
+            with self._lock:
+                if self._load_index().pop(key, None) is not None:
+                    self._dirty = True
+            return None
+
+    def pages(self, provider: str, query: str, max_age_s: float = 0.0) -> list[bytes]:
+        """Bodies of pages 0, 1, ... up to the first missing (or older than max_age_s) one."""
+        bodies = []
+        now = time.time()
+        while True:
+            found = self.get(provider, query, len(bodies))
+            if found is None or (max_age_s and now - found[1] >= max_age_s):
+                return bodies
+            bodies.append(found[0])
+
+    def queries(self) -> list[tuple[str, str]]:
+        """(provider, query) of every stored first page."""
+        with self._lock:
+            return [
+                (meta["provider"], meta["query"])
+                for meta in self._load_index().values()
+                if meta.get("page") == 0
+            ]
+
+    def stamp(self) -> str:
+        """Marker saved with the index (e.g. the add-on version that last re-parsed)."""
+        with self._lock:
+            self._load_index()
+            return self._stamp
+
+    def set_stamp(self, stamp: str) -> None:
+        with self._lock:
+            self._load_index()
+            self._stamp = stamp
+            self._save_index()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._load_index()) if self.folder else 0
+        return {"entries": entries, "bytes": self.total_bytes(), "max_bytes": self.max_bytes}
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            if not self.folder:
+                return 0
+            self._load_index()
+            return self._bytes
+
+    # ----- internals -----
+    def _load_index(self) -> dict:
+        if self._index is None:
+            self._index, self._stamp = {}, ""
+            self._sizes = OrderedDict((name, size) for _, size, name in sorted(self._files()))
+            self._bytes = sum(self._sizes.values())
+            self._dirty = False
+            if not self.folder:
+                return self._index
+            try:
+                with open(os.path.join(self.folder, _INDEX_NAME), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get("version") == _FORMAT_VERSION:
+                    self._index = {k: v for k, v in (data.get("entries") or {}).items() if isinstance(v, dict)}
+                    self._stamp = str(data.get("stamp") or "")
+            except (OSError, ValueError):
+                pass
+        return self._index
+
+    def _save_index(self) -> None:
+        path = os.path.join(self.folder, _INDEX_NAME)
+        data = {"version": _FORMAT_VERSION, "stamp": self._stamp, "entries": self._index or {}}
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _save_index_later(self) -> None:
+        self._dirty = True
+        if self._saved_at is None or time.monotonic() - self._saved_at >= INDEX_SAVE_INTERVAL_S:
+            self._save_index()
+
+    def _files(self) -> list[tuple[float, int, str]]:
+        out = []
+        if not self.folder:
+            return out
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return out
+        for name in names:
+            if not name.endswith(".gz"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, name))
+        return out
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        removed = set()
+        while self._bytes > self.max_bytes and self._sizes:
+            name, size = self._sizes.popitem(last=False)
+            try:
+                os.unlink(os.path.join(self.folder, name))
+            except OSError:
+                pass
+            self._bytes -= size
+            removed.add(name)
+        if removed:
+            index = self._load_index()
+            for key in [k for k, meta in index.items() if meta.get("file") in removed]:
+                del index[key]
+            self._dirty = True
+
+
+PAYLOADS = PayloadCache()
+
+
+def store(provider: str, query: str, page: int, body: bytes) -> None:
+    """Keep body in the shared cache if it is configured; never raises."""
+    if not PAYLOADS.enabled:
+        return
+    try:
+        PAYLOADS.put(provider, query, page, body)
+    except Exception:
+        pass
+
+
+class Tee:
+    """
+    Byte chunks passed through while a copy is kept (only if the shared
+    cache is configured). Call finish() once the parser is done: it reads
+    whatever the parser left unread and stores the whole body. A body that
+    is abandoned half way is never stored.
+    """
+
+    def __init__(self, chunks, provider: str, query: str, page: int = 0):
+        self._chunks = iter(chunks)
+        self._key = (provider, query, page)
+        self._seen = [] if PAYLOADS.enabled else None
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self._seen is not None:
+                self._seen.append(chunk)
+            yield chunk
+
+    def finish(self) -> None:
+        if self._seen is None:
+            return
+        try:
+            self._seen.extend(self._chunks)
+        except Exception:
+            return
+        store(*self._key, b"".join(self._seen))
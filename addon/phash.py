@@ -0,0 +1,98 @@
+# phash.py
+
+import threading
+from collections import OrderedDict
+
+# Perceptual (difference) hashes of fetched images, used to skip candidates
+# that look the same as one already shown. Qt is only imported when bytes
+# are actually decoded, so the hashing math and the cache work without Anki.
+
+HASH_W = 9
+HASH_H = 8
+DEFAULT_MAX_DISTANCE = 6
+
+
+def dhash_from_pixels(rows) -> int:
+    """
+    64-bit dHash from an 8-row x 9-column grid of grayscale values: each bit
+    says whether a pixel is brighter than its right-hand neighbour.
+    """
+    value = 0
+    for row in rows:
+        for x in range(HASH_W - 1):
+            value = (value << 1) | (1 if row[x] > row[x + 1] else 0)
+    return value
+
+
+def dhash_bytes(data: bytes) -> int | None:
+    """dHash of an encoded image (JPEG/PNG/...), or None if it cannot be decoded."""
+    if not data:
+        return None
+    try:
+        from aqt.qt import QImage, Qt
+    except Exception:
+        return None
+    try:
+        image = QImage.fromData(data)
+        if image.isNull():
+            return None
+        small = image.scaled(
+            HASH_W,
+            HASH_H,
+            Qt.AspectRatioMode.IgnoreAspectRatio,
+            Qt.TransformationMode.SmoothTransformation,
+        ).convertToFormat(QImage.Format.Format_Grayscale8)
+        rows = [[small.pixelColor(x, y).value() for x in range(HASH_W)] for y in range(HASH_H)]
+        return dhash_from_pixels(rows)
+    except Exception:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_near(value: int, others, max_distance: int = DEFAULT_MAX_DISTANCE) -> bool:
+    return any(hamming(value, other) <= max_distance for other in others)
+
+
+class PHashCache:
+    """Bounded, thread-safe URL -> hash map (oldest entries dropped first)."""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._hashes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+    def get(self, url):
+        if not url:
+            return None
+        with self._lock:
+            return self._hashes.get(url)
+
+    def put(self, url, value) -> None:
+        if not url or value is None:
+            return
+        with self._lock:
+            self._hashes.pop(url, None)
+            self._hashes[url] = value
+            while len(self._hashes) > max(1, self.max_entries):
+                self._hashes.popitem(last=False)
+
+    def record(self, data: bytes, *urls) -> int | None:
+        """Hash downloaded bytes and remember the hash under every given URL."""
+        value = dhash_bytes(data)
+        for url in urls:
+            self.put(url, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hashes.clear()
+
+
+PHASHES = PHashCache()
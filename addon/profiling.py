@@ -0,0 +1,136 @@
+# profiling.py
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# One-shot profiling of a single user action: once armed, the next wrapped
+# call runs under cProfile and tracemalloc and leaves a .prof file plus a
+# text summary (top allocations, top functions) in the given folder.
+# Before Python 3.12 cProfile only records the thread it was enabled on, so
+# the summary says which threads the profile covers.
+# No Anki imports here.
+
+DEFAULT_TOP_N = 25
+
+# From 3.12 cProfile hooks sys.monitoring, which sees every thread
+_PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+_armed = False
+_lock = threading.Lock()
+
+
+def arm() -> None:
+    global _armed
+    with _lock:
+        _armed = True
+
+
+def disarm() -> None:
+    global _armed
+    with _lock:
+        _armed = False
+
+
+def is_armed() -> bool:
+    with _lock:
+        return _armed
+
+
+def take_armed() -> bool:
+    """Return True (and disarm) if profiling was armed; atomic."""
+    global _armed
+    with _lock:
+        armed, _armed = _armed, False
+        return armed
+
+
+def _summary(label: str, elapsed: float, stats, coverage: str, snapshot, peak: int, top_n: int) -> str:
+    out = io.StringIO()
+    out.write(f"Profile of {label} ({time.strftime('%Y-%m-%d %H:%M:%S')})\n")
+    out.write(f"Wall time: {elapsed * 1000:.1f} ms\n")
+    out.write(f"Threads profiled: {coverage}\n")
+    out.write(f"Peak traced memory: {peak / 1024:.1f} KB\n\n")
+
+    out.write(f"Top {top_n} allocations by line:\n")
+    for stat in snapshot.statistics("lineno")[:top_n]:
+        out.write(f"  {stat}\n")
+
+    out.write(f"\nTop {top_n} functions by cumulative time:\n")
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(top_n)
+    return out.getvalue()
+
+
+def run_profiled(fn, folder: str, label: str = "search", top_n: int = DEFAULT_TOP_N, threads: bool = False):
+    """
+    Call fn() under cProfile and tracemalloc.
+    With threads, threads started during the call (e.g. a worker pool fn
+    creates) are profiled as well and merged into the same stats; threads
+    already running, such as the scheduler's, are not.
+    Returns (fn's result, path of the .prof file, path of the summary).
+    Exceptions from fn propagate after the files are written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.join(folder, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}")
+    prof_path = stem + ".prof"
+    summary_path = stem + "-summary.txt"
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    workers: list = []
+    hook = _thread_hook(workers) if threads and not _PROFILES_ALL_THREADS else None
+    start = time.monotonic()
+    try:
+        if hook:
+            threading.setprofile(hook)
+        profiler.enable()
+        try:
+            result = fn()
+        finally:
+            profiler.disable()
+            if hook:
+                threading.setprofile(None)
+    finally:
+        elapsed = time.monotonic() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+        stats = pstats.Stats(profiler)
+        for worker in workers:
+            stats.add(worker)
+        stats.dump_stats(prof_path)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(_summary(label, elapsed, stats, _coverage(hook, workers), snapshot, peak, top_n))
+    return result, prof_path, summary_path
+
+
+def _thread_hook(workers: list):
+    """threading.setprofile hook: each new thread enables its own profiler."""
+
+    def hook(frame, event, arg):
+        worker = cProfile.Profile()
+        with _lock:
+            workers.append(worker)
+        # Replaces this hook for the rest of the thread
+        worker.enable()
+
+    return hook
+
+
+def _coverage(hook, workers: list) -> str:
+    if _PROFILES_ALL_THREADS:
+        return "all threads"
+    if hook:
+        return f"the calling thread and {len(workers)} thread(s) started during the call"
+    return "the calling thread only (work handed to background threads is not included)"
@@ -0,0 +1,125 @@
+# ranking.py
+
+import math
+from urllib.parse import urlsplit
+
+# Metadata-based ordering of results before anything is downloaded.
+# Keep this module free of Anki imports so it can be used from tests and
+# background threads.
+
+# Defaults for the "ranking" config block
+DEFAULT_RANKING = {
+    "enabled": True,
+    "target_long_side_px": 1024,
+    "min_side_px": 100,
+    "aspect_ratio": 0,
+    "formats": ["jpeg", "png", "webp", "gif"],
+    "max_bytes": 5 * 1024 * 1024,
+}
+
+# A longest side within this factor of the target costs nothing
+_SIZE_TOLERANCE = 2.0
+# An aspect ratio within this factor of the wanted one costs nothing
+_ASPECT_TOLERANCE = 1.5
+
+_EXT_FORMATS = {
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".jpe": "jpeg",
+    ".png": "png",
+    ".webp": "webp",
+    ".gif": "gif",
+    ".bmp": "bmp",
+    ".svg": "svg",
+    ".avif": "avif",
+    ".tif": "tiff",
+    ".tiff": "tiff",
+}
+
+
+def _num(value, default, minimum=0.0):
+    try:
+        return max(minimum, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class RankingPrefs:
+    """Parsed "ranking" config block; 0 / empty means "no preference"."""
+
+    __slots__ = ("enabled", "target_long_side", "min_side", "aspect_ratio", "formats", "max_bytes")
+
+    def __init__(self, block=None):
+        values = dict(DEFAULT_RANKING)
+        if isinstance(block, dict):
+            values.update(block)
+        self.enabled = bool(values["enabled"])
+        self.target_long_side = _num(values["target_long_side_px"], 0.0)
+        self.min_side = _num(values["min_side_px"], 0.0)
+        self.aspect_ratio = _num(values["aspect_ratio"], 0.0)
+        formats = values["formats"] if isinstance(values["formats"], list) else []
+        self.formats = {_normalize_format(f) for f in formats if isinstance(f, str)}
+        self.max_bytes = int(_num(values["max_bytes"], 0.0))
+
+
+def _normalize_format(name: str) -> str:
+    name = name.strip().lower().lstrip(".")
+    if name.startswith("image/"):
+        name = name[len("image/"):]
+    if name in ("jpg", "jpe", "pjpeg"):
+        return "jpeg"
+    if name == "svg+xml":
+        return "svg"
+    return name
+
+
+def image_format(result) -> str | None:
+    """Format from the MIME type, else from the URL's extension; None if unknown."""
+    if result.mime:
+        return _normalize_format(result.mime)
+    for url in (result.original_url, result.url):
+        if not url:
+            continue
+        try:
+            path = urlsplit(url).path.lower()
+        except ValueError:
+            continue
+        dot = path.rfind(".")
+        if dot >= 0 and path[dot:] in _EXT_FORMATS:
+            return _EXT_FORMATS[path[dot:]]
+    return None
+
+
+def penalty(result, prefs: RankingPrefs) -> tuple[int, int]:
+    """
+    (hard, soft) sort key; lower is better. `hard` counts violated limits
+    (format, byte size, minimum side) and pushes a result behind every
+    acceptable one; `soft` grows with the distance from the target size and
+    aspect ratio. Metadata a provider did not report costs nothing.
+    """
+    hard = 0
+    fmt = image_format(result)
+    if prefs.formats and fmt and fmt not in prefs.formats:
+        hard += 1
+    if prefs.max_bytes and result.byte_size > prefs.max_bytes:
+        hard += 1
+
+    soft = 0
+    w, h = result.width, result.height
+    if w and h:
+        if prefs.min_side and min(w, h) < prefs.min_side:
+            hard += 1
+        if prefs.target_long_side:
+            ratio = max(w, h) / prefs.target_long_side
+            soft += int(abs(math.log(ratio, _SIZE_TOLERANCE)))
+        if prefs.aspect_ratio:
+            ratio = (w / h) / prefs.aspect_ratio
+            soft += int(abs(math.log(ratio, _ASPECT_TOLERANCE)))
+    return hard, soft
+
+
+def rank(results, prefs: RankingPrefs) -> list:
+    """Stable reorder by penalty(); nothing is dropped."""
+    if not prefs.enabled or len(results) < 2:
+        return list(results)
+    return sorted(results, key=lambda result: penalty(result, prefs))
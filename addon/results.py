@@ -0,0 +1,147 @@
+# results.py
+
+# Compact result record shared by all providers.
+# Keep this module free of Anki imports so it can be used from tests and
+# background threads.
+
+# Per-notetype image size profiles ("image_size_profile" in the config)
+SIZE_PROFILES = ("default", "thumbnail", "medium", "original")
+
+# "medium" accepts the original when its longest side is at most this size
+MEDIUM_MAX_SIDE_PX = 1280
+
+# Why a search came back empty (negative cache reason codes)
+NO_RESULTS = "no_results"
+PROVIDER_ERROR = "provider_error"
+OFFLINE = "offline"
+
+
+def _int_or_zero(value) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ImageResult:
+    """
+    One image candidate returned by a provider.
+
+    `url` is the URL the add-on downloads by default (what providers used to
+    return as a bare string). The other fields are optional metadata; sizes
+    are 0 and strings are None when the provider did not report them.
+    width, height and byte_size describe `original_url` (`url` when there is
+    none), which may be larger than a thumbnail `url`.
+    """
+
+    __slots__ = (
+        "url",
+        "thumb_url",
+        "original_url",
+        "page_url",
+        "width",
+        "height",
+        "mime",
+        "byte_size",
+        "provider",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        thumb_url: str | None = None,
+        original_url: str | None = None,
+        page_url: str | None = None,
+        width=0,
+        height=0,
+        mime: str | None = None,
+        byte_size=0,
+        provider: str | None = None,
+    ):
+        self.url = url
+        self.thumb_url = thumb_url
+        self.original_url = original_url
+        self.page_url = page_url
+        self.width = _int_or_zero(width)
+        self.height = _int_or_zero(height)
+        self.mime = mime
+        self.byte_size = _int_or_zero(byte_size)
+        self.provider = provider
+
+    def __repr__(self) -> str:
+        size = f" {self.width}x{self.height}" if self.width and self.height else ""
+        return f"<ImageResult {self.url!r}{size}>"
+
+    def candidate_urls(self, profile: str = "default", max_bytes: int = 0) -> list[str]:
+        """
+        URLs to try for the given size profile, most preferred first.
+        The reported sizes belong to the original: originals known to
+        exceed max_bytes are skipped up front, and "medium" takes the
+        original only when its longest side is small enough. The downloader
+        enforces the limit for sizes it could not know.
+        """
+        original = self.original_url or self.url
+        thumb = self.thumb_url
+        original_fits = not (max_bytes and self.byte_size and self.byte_size > max_bytes)
+
+        if profile == "thumbnail":
+            order = [thumb, self.url, original]
+        elif profile == "original":
+            order = [original if original_fits else None, self.url, thumb]
+        elif profile == "medium":
+            longest = max(self.width, self.height)
+            if original_fits and longest and longest <= MEDIUM_MAX_SIDE_PX:
+                order = [original, self.url, thumb]
+            else:
+                order = [thumb, self.url, original]
+        else:
+            order = [self.url, thumb]
+
+        out = []
+        for url in order:
+            if url and url not in out:
+                if url == original and not original_fits and thumb:
+                    continue
+                out.append(url)
+        return out
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**{name: data.get(name) for name in cls.__slots__ if name in data})
+
+
+class ResultList(list):
+    """
+    A plain list of results that can also say why it is empty: `error` is
+    PROVIDER_ERROR when the request failed, None when the provider simply
+    had nothing to return.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, items=(), error: str | None = None):
+        super().__init__(items)
+        self.error = error
+
+
+def coerce(item, provider: str | None = None) -> ImageResult | None:
+    """Accept an ImageResult or a bare URL string; return an ImageResult or None."""
+    if isinstance(item, ImageResult):
+        if provider and not item.provider:
+            item.provider = provider
+        return item
+    if isinstance(item, str) and item:
+        return ImageResult(item, provider=provider)
+    return None
+
+
+def coerce_all(items, provider: str | None = None) -> ResultList:
+    out = ResultList(error=getattr(items, "error", None))
+    for item in items or []:
+        result = coerce(item, provider)
+        if result is not None:
+            out.append(result)
+    return out
@@ -0,0 +1,123 @@
+# scheduler.py
+
+import heapq
+import itertools
+import threading
+
+# One place for all of the add-on's background work, so prefetching and
+# warming never pile up threads or compete with Anki's own sync and
+# collection I/O. No Anki imports here; warming.py wires the pause/resume
+# calls to Anki's sync and profile hooks.
+
+# Priority lanes, most urgent first
+INTERACTIVE = 0  # finishing a search the user asked for (e.g. streaming drain)
+PREFETCH = 1  # speculative work for the editor (pre-search, hashing, refresh)
+WARMING = 2  # idle-time cache warming
+
+LANE_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch", WARMING: "warming"}
+
+DEFAULT_MAX_WORKERS = 2
+
+# Idle worker threads exit after this long without work
+_IDLE_EXIT_S = 30.0
+
+
+class Scheduler:
+    """
+    Priority queue of callables run by at most max_workers daemon threads.
+    While paused, only INTERACTIVE jobs start; queued jobs in other lanes
+    wait for resume(). Exceptions raised by jobs are swallowed.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._paused = False
+        self._threads = 0
+        self._idle = 0
+        self._running = 0
+
+    def submit(self, fn, lane: int = INTERACTIVE) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (lane, next(self._seq), fn))
+            if len(self._heap) > self._idle and self._threads < max(1, self.max_workers):
+                self._threads += 1
+                threading.Thread(target=self._work, daemon=True, name="imgsearch-bg").start()
+            self._cond.notify_all()
+
+    def pause(self) -> None:
+        with self._cond:
+            self._paused = True
+
+    def resume(self) -> None:
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    @property
+    def paused(self) -> bool:
+        with self._cond:
+            return self._paused
+
+    def clear(self, min_lane: int = PREFETCH) -> int:
+        """Drop queued (not yet started) jobs in min_lane and lower-priority lanes."""
+        with self._cond:
+            kept = [job for job in self._heap if job[0] < min_lane]
+            dropped = len(self._heap) - len(kept)
+            heapq.heapify(kept)
+            self._heap = kept
+            return dropped
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {name: 0 for name in LANE_NAMES.values()}
+            for lane, _, _ in self._heap:
+                name = LANE_NAMES.get(lane, str(lane))
+                queued[name] = queued.get(name, 0) + 1
+            return {
+                "queued": queued,
+                "running": self._running,
+                "threads": self._threads,
+                "paused": self._paused,
+            }
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until nothing is queued or running (queued paused jobs count)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._heap and not self._running, timeout)
+
+    # ----- internals -----
+    def _take(self):
+        """Pop the next job allowed to start, or None (lock held)."""
+        if not self._heap:
+            return None
+        if self._paused and self._heap[0][0] != INTERACTIVE:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                fn = self._take()
+                while fn is None:
+                    self._idle += 1
+                    woke = self._cond.wait(_IDLE_EXIT_S)
+                    self._idle -= 1
+                    fn = self._take()
+                    if fn is None and not woke and not self._heap:
+                        self._threads -= 1
+                        return
+                self._running += 1
+            try:
+                fn()
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+
+SCHEDULER = Scheduler()
@@ -1,7 +1,42 @@
 # search.py
 
-from anki.utils import strip_html_media
+import html
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from anki.utils import strip_html_media
+except ImportError:  # headless use (see cli.py)
+    _MEDIA_RE = re.compile(r"\[sound:[^]]+\]|<img[^>]*>", re.IGNORECASE)
+    _TAG_RE = re.compile(r"<[^>]+>")
+
+    def strip_html_media(text: str) -> str:
+        return html.unescape(_TAG_RE.sub("", _MEDIA_RE.sub(" ", text or "")))
+
 from . import utils
+from .bundle import export_bundle as export_bundle_file
+from .cache import QueryCache
+from .local_images import LOCAL_IMAGES
+from .media_index import MEDIA_INDEX
+from .merge import Deduper, dedupe, interleave
+from .payload_cache import DEFAULT_MAX_BYTES as DEFAULT_PAYLOAD_CACHE_MAX_BYTES, PAYLOADS
+from .phash import DEFAULT_MAX_DISTANCE, PHASHES, is_near
+from .ranking import RankingPrefs, rank
+from .scheduler import DEFAULT_MAX_WORKERS, INTERACTIVE, PREFETCH, SCHEDULER, WARMING
+from .timing import FIRST_RESULT, SEARCH, TIMINGS
+from .results import (
+    NO_RESULTS,
+    OFFLINE,
+    PROVIDER_ERROR,
+    ImageResult,
+    ResultList,
+    coerce,
+    coerce_all,
+)
 
 # Yandex provider: support either export name
 try:
@@ -21,112 +56,975 @@ try:
 except Exception:
     _get_ddg = None
 
-# Cache of image URL lists per query
-RESULTS: dict[str, list[str]] = {}
+# Google daily quota check (skip Google before spending a doomed request)
+try:
+    from .gimages import google_quota_allows_search
+except Exception:
+    google_quota_allows_search = None
+
+# Record variants (ImageResult with size/thumbnail/source metadata)
+try:
+    from .yimages import get_yimage_results as _get_yandex_results
+except Exception:
+    _get_yandex_results = None
+
+try:
+    from .gimages import getgimage_results
+except Exception:
+    getgimage_results = None
+
+try:
+    from .ddg_hidden_test import get_ddg_image_results as _get_ddg_results
+except Exception:
+    _get_ddg_results = None
+
+# Streaming variants (yield records while the response is still arriving)
+try:
+    from .yimages import iter_yimages as _iter_yandex
+except Exception:
+    _iter_yandex = None
+
+try:
+    from .gimages import itergimages
+except Exception:
+    itergimages = None
+
+try:
+    from .ddg_hidden_test import iter_ddg_images as _iter_ddg
+except Exception:
+    _iter_ddg = None
 
-# Current index per query
-INDICES: dict[str, int] = {}
+# Raw-body parsers, for rebuilding results from the payload cache
+try:
+    from .yimages import parse_yimages_payload
+except Exception:
+    parse_yimages_payload = None
 
-# Provider label per query
-PROVIDERS: dict[str, str] = {}
+try:
+    from .gimages import parse_gimages_payload
+except Exception:
+    parse_gimages_payload = None
+
+try:
+    from .ddg_hidden_test import parse_ddg_payload
+except Exception:
+    parse_ddg_payload = None
+
+# Caches are keyed by (provider id, normalized query); see _cache_key().
+CacheKey = tuple[str, str]
 
 MAX_CACHED_QUERIES = 100
+DEFAULT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Results, current index, provider label and negative outcomes per key,
+# in one lock-protected LRU (see cache.QueryCache).
+CACHE = QueryCache(max_entries=MAX_CACHED_QUERIES, max_bytes=DEFAULT_CACHE_MAX_BYTES)
+
+# Empty outcomes are kept as entries with a reason and served for
+# negative_cache_ttl_s so repeated misses skip the provider chain.
+DEFAULT_NEGATIVE_TTL_S = 60.0
+
+# Stale-while-revalidate: entries older than the soft TTL are served and
+# refreshed in the background; entries older than the hard TTL are refetched
+# before answering. 0 disables either limit.
+DEFAULT_SOFT_TTL_S = 3600.0
+DEFAULT_HARD_TTL_S = 86400.0
+
+# Keys with a background refresh in flight
+_REFRESHING: set = set()
+_refresh_lock = threading.Lock()
+
+# Near-duplicate skipping: how many upcoming candidates to pre-hash (from
+# their thumbnails) when phash_prefetch is on, and the largest thumbnail read.
+PHASH_PREFETCH_COUNT = 3
+PHASH_PREFETCH_MAX_BYTES = 512 * 1024
+
+# URLs being hashed in the background
+_HASHING: set = set()
+_hashing_lock = threading.Lock()
+
+# Keys being fetched right now (e.g. by a pre-search); a second caller for
+# the same key waits up to FETCH_WAIT_S for that fetch instead of repeating it.
+_FETCHING: dict = {}
+_fetching_lock = threading.Lock()
+FETCH_WAIT_S = 15.0
+
+# Streaming: how many results are read and ranked before the first one is
+# returned (about one provider page); the rest is drained in the background.
+STREAM_RANK_WINDOW = 10
+
+
+_CLOZE_RE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL)
+_WS_RE = re.compile(r"\s+")
 
 
 def _clean_query(query: str) -> str:
-    return strip_html_media(query)
+    """Text sent to providers: HTML/media and cloze markup removed, whitespace collapsed."""
+    text = strip_html_media(query or "")
+    text = _CLOZE_RE.sub(r"\1", text)
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _normalize_provider(provider) -> str:
+    provider = str(provider or "yandex").lower()
+    if provider in ("duckduckgo", "ddg"):
+        return "duckduckgo"
+    if provider == "google":
+        return "google"
+    if provider == "local":
+        return "local"
+    return "yandex"
+
+
+def _merge_provider_ids() -> list[str]:
+    """
+    Providers listed in merge_providers (deduplicated, in order). Merging is
+    only active with two or more; otherwise the single "provider" is used.
+    """
+    cfg = utils.get_config() or {}
+    wanted = cfg.get("merge_providers") or []
+    if not isinstance(wanted, list):
+        return []
+    ids = []
+    for provider in wanted:
+        pid = _normalize_provider(provider)
+        if pid not in ids:
+            ids.append(pid)
+    return ids if len(ids) > 1 else []
+
+
+def uses_quota_limited_provider() -> bool:
+    """True when a search may spend the Google Custom Search daily quota."""
+    cfg = utils.get_config() or {}
+    ids = _merge_provider_ids() or [_normalize_provider(cfg.get("provider"))]
+    return "google" in ids
+
+
+def _provider_id() -> str:
+    merged = _merge_provider_ids()
+    if merged:
+        return "+".join(merged)
+    cfg = utils.get_config() or {}
+    return _normalize_provider(cfg.get("provider"))
+
+
+def _cache_key(query: str, provider: str | None = None) -> CacheKey:
+    """
+    Cache key for a raw query: the configured provider plus the cleaned,
+    casefolded query, so equivalent spellings share one entry and results
+    from different providers never mix.
+    """
+    return (provider or _provider_id(), _clean_query(query).casefold())
+
+
+def _provider_label_from_id(provider: str) -> str:
+    if "+" in provider:
+        return " + ".join(_provider_label_from_id(p) for p in provider.split("+"))
+    return {"duckduckgo": "DuckDuckGo", "google": "Google", "local": _LOCAL_LABEL}.get(provider, "Yandex")
 
 
 def _provider_label_from_config() -> str:
+    return _provider_label_from_id(_provider_id())
+
+
+def _apply_cache_limits() -> None:
+    cfg = utils.get_config() or {}
+    try:
+        if "cache_max_entries" in cfg:
+            CACHE.max_entries = max(1, int(cfg["cache_max_entries"]))
+        if "cache_max_bytes" in cfg:
+            CACHE.max_bytes = max(0, int(cfg["cache_max_bytes"]))
+    except (TypeError, ValueError):
+        pass
+    _apply_payload_cache()
+
+
+def _apply_payload_cache() -> None:
+    """Enable/disable and size the raw payload cache from payload_cache_* config."""
+    cfg = utils.get_config() or {}
+    if not cfg.get("payload_cache_enabled", False):
+        PAYLOADS.configure(None)
+        return
+    try:
+        max_bytes = max(0, int(cfg.get("payload_cache_max_bytes", DEFAULT_PAYLOAD_CACHE_MAX_BYTES)))
+    except (TypeError, ValueError):
+        max_bytes = DEFAULT_PAYLOAD_CACHE_MAX_BYTES
+    PAYLOADS.configure(utils.user_files_path(PAYLOAD_CACHE_DIR), max_bytes)
+
+
+def _current_result(key: CacheKey) -> ImageResult | None:
+    entry = CACHE.peek(key)
+    return entry.current() if entry else None
+
+
+def _current_url(key: CacheKey) -> str | None:
+    result = _current_result(key)
+    return result.url if result else None
+
+
+def _ttl(name: str, default: float) -> float:
+    cfg = utils.get_config() or {}
+    try:
+        return max(0.0, float(cfg.get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _negative_ttl() -> float:
+    return _ttl("negative_cache_ttl_s", DEFAULT_NEGATIVE_TTL_S)
+
+
+def _is_fresh_negative(entry) -> bool:
+    return bool(entry.reason) and not entry.results and entry.age() < _negative_ttl()
+
+
+def _is_usable(entry) -> bool:
+    if entry.results:
+        hard = _ttl("cache_hard_ttl_s", DEFAULT_HARD_TTL_S)
+        return not hard or entry.age() < hard
+    return _is_fresh_negative(entry)
+
+
+def _is_stale(entry) -> bool:
+    soft = _ttl("cache_soft_ttl_s", DEFAULT_SOFT_TTL_S)
+    return bool(soft) and bool(entry.results) and entry.age() >= soft
+
+
+def _refresh_in_background(key: CacheKey, q: str) -> None:
+    with _refresh_lock:
+        if key in _REFRESHING:
+            return
+        _REFRESHING.add(key)
+
+    def job():
+        try:
+            results, label = _merged_results_and_label(q)
+            # Keep serving the stale list if the refresh came back empty
+            if results:
+                CACHE.replace_results(key, list(results), label)
+        except Exception:
+            pass
+        finally:
+            with _refresh_lock:
+                _REFRESHING.discard(key)
+
+    _start_background(job, PREFETCH)
+
+
+def _failure_reason(error: str | None) -> str:
+    if error != PROVIDER_ERROR:
+        return NO_RESULTS
+    check = getattr(utils, "_network_available", None)
+    try:
+        if check is not None and not check():
+            return OFFLINE
+    except Exception:
+        pass
+    return PROVIDER_ERROR
+
+
+def _payload_parser(provider: str):
+    return {
+        "yandex": parse_yimages_payload,
+        "duckduckgo": parse_ddg_payload,
+        "google": parse_gimages_payload,
+    }.get(provider)
+
+
+def _payload_results(provider: str, q: str, max_age_s: float = 0.0) -> ResultList | None:
+    """Results re-parsed from stored raw responses (all stored pages), or None."""
+    parse = _payload_parser(provider)
+    if parse is None or not PAYLOADS.enabled:
+        return None
+    results = ResultList()
+    for body in PAYLOADS.pages(provider, q, max_age_s):
+        results.extend(coerce_all(parse(body), provider))
+    return results or None
+
+
+def _provider_results(records_fn, list_fn, q: str, provider: str) -> ResultList:
+    # A raw response younger than the soft TTL is as good as a new request
+    stored = _payload_results(provider, q, _ttl("cache_soft_ttl_s", DEFAULT_SOFT_TTL_S))
+    if stored:
+        return stored
+    if records_fn:
+        return coerce_all(records_fn(q), provider)
+    if list_fn:
+        return coerce_all(list_fn(q), provider)
+    return ResultList()
+
+
+_LOCAL_LABEL = "Local library"
+LOCAL_INDEX_FILE = "local_images_index.json"
+
+
+def _configure_local_images() -> None:
+    cfg = utils.get_config() or {}
+    folder = str(cfg.get("local_images_dir") or "").strip()
+    LOCAL_IMAGES.configure(
+        folder or None,
+        utils.user_files_path(LOCAL_INDEX_FILE) if folder else None,
+        spawn=lambda fn: _start_background(fn, PREFETCH),
+    )
+
+
+def start_local_index(wait: bool = False) -> None:
+    """
+    Load or first build the local_images_dir index in the background (e.g.
+    on profile open); with wait, on the calling thread instead.
+    """
+    _configure_local_images()
+    if wait:
+        LOCAL_IMAGES.refresh()
+    else:
+        LOCAL_IMAGES.start()
+
+
+def _local_results(q: str, require_all: bool = False) -> ResultList:
+    """
+    Images from the local_images_dir folder whose file name, folder or
+    sidecar tags match q (every word of it with require_all), as file://
+    results. Empty when no folder is set, and until the index is ready:
+    loading, building and refreshing it run in the PREFETCH lane, never on
+    the searching thread.
+    """
+    _configure_local_images()
+    try:
+        matches = LOCAL_IMAGES.search(q, require_all=require_all)
+    except Exception:
+        return ResultList()
+    return ResultList(
+        ImageResult(Path(m["path"]).as_uri(), mime=m["mime"], byte_size=m["byte_size"], provider="local")
+        for m in matches
+    )
+
+
+def _local_tier(q: str, cfg: dict):
+    """
+    (results, label) when the local folder settles this search: provider
+    "local" (unless it is empty and local_fallback_to_yandex is on), or any
+    provider with local_images_first and a local image matching every word
+    of the query ("red apple" is not settled by red_car.jpg). None otherwise.
+    """
+    primary = str(cfg.get("provider") or "").lower() == "local"
+    if not primary and not cfg.get("local_images_first", False):
+        return None
+    results = _local_results(q, require_all=not primary)
+    if results or (primary and not cfg.get("local_fallback_to_yandex", True)):
+        return results, _LOCAL_LABEL
+    return None
+
+
+def _cached_yandex(q: str) -> list[ImageResult] | None:
+    """
+    Fresh Yandex results already cached for this query, reused when Yandex
+    is the fallback for another provider. None while the Yandex entry itself
+    is being fetched, so its TTLs apply like any provider's.
+    """
+    key = _cache_key(q, "yandex")
+    if key == _cache_key(q):
+        return None
+    entry = CACHE.peek(key)
+    if not entry or not entry.results or not _is_usable(entry) or _is_stale(entry):
+        return None
+    return list(entry.results)
+
+
+def _yandex_results(q: str) -> ResultList:
+    cached = _cached_yandex(q)
+    if cached:
+        return ResultList(cached)
+    return _provider_results(_get_yandex_results, _get_yandex, q, "yandex")
+
+
+_GOOGLE_QUOTA_LABEL = "Yandex (Google daily quota used up)"
+
+
+def _google_quota_exhausted() -> bool:
+    if not google_quota_allows_search:
+        return False
+    try:
+        return not google_quota_allows_search()
+    except Exception:
+        return False
+
+
+def _provider_results_and_label(q: str) -> tuple[ResultList, str]:
     cfg = utils.get_config() or {}
     provider = (cfg.get("provider") or "yandex").lower()
+    fallback_on = bool(cfg.get("google_fallback_to_yandex", True))
+
+    local = _local_tier(q, cfg)
+    if local is not None:
+        return local
+
     if provider in ("duckduckgo", "ddg"):
-        return "DuckDuckGo"
+        if _get_ddg or _get_ddg_results:
+            results = _provider_results(_get_ddg_results, _get_ddg, q, "duckduckgo")
+            if results:
+                return results, "DuckDuckGo"
+        # Fallback to Yandex when DDG is empty/unavailable
+        return _yandex_results(q), "Yandex (fallback from DuckDuckGo)"
+
     if provider == "google":
-        return "Google"
-    return "Yandex"
+        if _google_quota_exhausted():
+            if fallback_on:
+                return _yandex_results(q), _GOOGLE_QUOTA_LABEL
+            return ResultList(error=PROVIDER_ERROR), "Google"
+        if not (getgimages or getgimage_results):
+            if fallback_on:
+                return _yandex_results(q), "Yandex (fallback from Google)"
+            return ResultList(error=PROVIDER_ERROR), "Google"
+        results = _provider_results(getgimage_results, getgimages, q, "google")
+        if results:
+            return results, "Google"
+        if fallback_on:
+            return _yandex_results(q), "Yandex (fallback from Google)"
+        return results, "Google"
 
+    if provider == "local":
+        return _yandex_results(q), "Yandex (fallback from Local library)"
+    return _yandex_results(q), "Yandex"
 
-def _current_url(q: str) -> str | None:
-    if q not in RESULTS or not RESULTS[q]:
-        return None
-    idx = INDICES.get(q, 0)
-    if idx < 0 or idx >= len(RESULTS[q]):
-        return None
-    return RESULTS[q][idx]
 
+def _single_provider_results(provider: str, q: str) -> ResultList:
+    """One provider's results with no fallback (used when merging)."""
+    if provider == "local":
+        return _local_results(q)
+    if provider == "duckduckgo":
+        return _provider_results(_get_ddg_results, _get_ddg, q, "duckduckgo")
+    if provider == "google":
+        if _google_quota_exhausted():
+            return ResultList(error=PROVIDER_ERROR)
+        return _provider_results(getgimage_results, getgimages, q, "google")
+    return _yandex_results(q)
+
+
+def _ranking_prefs() -> RankingPrefs:
+    cfg = utils.get_config() or {}
+    return RankingPrefs(cfg.get("ranking"))
+
+
+def _ranked(results) -> list:
+    return rank(results, _ranking_prefs())
+
+
+def _merged_results_and_label(q: str) -> tuple[ResultList, str]:
+    """
+    Provider results followed by the merge stage (the same picture reached
+    through different URLs is kept once) and the ranking stage (see
+    ranking.py). With merge_providers set, the listed providers are queried
+    together and their lists interleaved.
+    """
+    ids = _merge_provider_ids()
+    if not ids:
+        results, label = _provider_results_and_label(q)
+        return ResultList(_ranked(dedupe(results)), error=getattr(results, "error", None)), label
+
+    with ThreadPoolExecutor(max_workers=len(ids)) as pool:
+        lists = list(pool.map(lambda pid: _single_provider_results(pid, q), ids))
+    merged = ResultList(_ranked(interleave(*lists)))
+    if not merged and any(getattr(r, "error", None) for r in lists):
+        merged.error = PROVIDER_ERROR
+    return merged, _provider_label_from_id("+".join(ids))
 
-def _touch_query(q: str) -> None:
-    if q in RESULTS:
-        RESULTS[q] = RESULTS.pop(q)
-    if q in INDICES:
-        INDICES[q] = INDICES.pop(q)
-    if q in PROVIDERS:
-        PROVIDERS[q] = PROVIDERS.pop(q)
+
+def _provider_iter(stream_fn, list_fn, q: str, provider: str):
+    """Yield coerced results; the return value is the provider's error code."""
+    error = None
+    stored = _payload_results(provider, q, _ttl("cache_soft_ttl_s", DEFAULT_SOFT_TTL_S))
+    if stored:
+        yield from stored
+        return None
+    if stream_fn:
+        items = stream_fn(q)
+    else:
+        items = list_fn(q) if list_fn else ()
+        error = getattr(items, "error", None)
+    iterator = iter(items or ())
+    while True:
+        try:
+            item = next(iterator)
+        except StopIteration as stop:
+            return stop.value or error
+        result = coerce(item, provider)
+        if result is not None:
+            yield result
 
 
-def _evict_cache_if_needed() -> None:
-    while len(RESULTS) > MAX_CACHED_QUERIES:
-        oldest_query = next(iter(RESULTS))
-        RESULTS.pop(oldest_query, None)
-        INDICES.pop(oldest_query, None)
-        PROVIDERS.pop(oldest_query, None)
+def _first_and_rest(iterator):
+    """Return (first, iterator, None), or (None, None, error) when empty."""
+    try:
+        first = next(iterator)
+    except StopIteration as stop:
+        return None, None, stop.value
+    return first, iterator, None
 
 
-def _provider_results_and_label(q: str) -> tuple[list[str], str]:
+def _provider_stream_and_label(q: str):
+    """
+    Streaming counterpart of _provider_results_and_label().
+    Returns (first_result, rest_iterator, label, error); the iterator still
+    has to be drained to collect the remaining results.
+    """
     cfg = utils.get_config() or {}
     provider = (cfg.get("provider") or "yandex").lower()
     fallback_on = bool(cfg.get("google_fallback_to_yandex", True))
 
+    def yandex(label):
+        cached = _cached_yandex(q)
+        if cached:
+            return cached[0], iter(list(cached[1:])), label, None
+        first, rest, error = _first_and_rest(_provider_iter(_iter_yandex, _get_yandex, q, "yandex"))
+        return first, rest, label, error
+
+    local = _local_tier(q, cfg)
+    if local is not None:
+        results, label = local
+        if not results:
+            return None, None, label, None
+        return results[0], iter(list(results[1:])), label, None
+
     if provider in ("duckduckgo", "ddg"):
-        if _get_ddg:
-            urls = _get_ddg(q)
-            if urls:
-                return urls, "DuckDuckGo"
+        if _get_ddg or _iter_ddg:
+            first, rest, _ = _first_and_rest(_provider_iter(_iter_ddg, _get_ddg, q, "duckduckgo"))
+            if first:
+                return first, rest, "DuckDuckGo", None
         # Fallback to Yandex when DDG is empty/unavailable
-        return _get_yandex(q), "Yandex (fallback from DuckDuckGo)"
+        return yandex("Yandex (fallback from DuckDuckGo)")
 
     if provider == "google":
-        if not getgimages:
+        if _google_quota_exhausted():
             if fallback_on:
-                return _get_yandex(q), "Yandex (fallback from Google)"
-            return [], "Google"
-        urls = getgimages(q)
-        if urls:
-            return urls, "Google"
+                return yandex(_GOOGLE_QUOTA_LABEL)
+            return None, None, "Google", PROVIDER_ERROR
+        error = PROVIDER_ERROR
+        if getgimages or itergimages:
+            first, rest, error = _first_and_rest(_provider_iter(itergimages, getgimages, q, "google"))
+            if first:
+                return first, rest, "Google", None
         if fallback_on:
-            return _get_yandex(q), "Yandex (fallback from Google)"
-        return [], "Google"
+            return yandex("Yandex (fallback from Google)")
+        return None, None, "Google", error
+
+    if provider == "local":
+        return yandex("Yandex (fallback from Local library)")
+    return yandex("Yandex")
+
+
+def _stream_enabled() -> bool:
+    cfg = utils.get_config() or {}
+    return (
+        bool(cfg.get("stream_results", True))
+        and _iter_yandex is not None
+        and not _merge_provider_ids()
+    )
+
+
+def _start_background(fn, lane: int = INTERACTIVE) -> None:
+    """Queue fn on the shared background scheduler (see scheduler.py)."""
+    cfg = utils.get_config() or {}
+    try:
+        SCHEDULER.max_workers = max(1, min(8, int(cfg.get("background_max_workers", DEFAULT_MAX_WORKERS))))
+    except (TypeError, ValueError):
+        SCHEDULER.max_workers = DEFAULT_MAX_WORKERS
+    SCHEDULER.submit(fn, lane)
 
-    return _get_yandex(q), "Yandex"
+
+def _drain_into(entry, rest, deduper=None) -> None:
+    try:
+        for result in rest:
+            if deduper is None or deduper.accept(result):
+                CACHE.append(entry, result)
+    except Exception:
+        pass
+    # The first result was shown before the rest arrived; rank what is
+    # still ahead of the user.
+    prefs = _ranking_prefs()
+    CACHE.reorder_tail(entry, lambda tail: rank(tail, prefs))
+
+
+def _phash_settings() -> tuple[bool, int]:
+    cfg = utils.get_config() or {}
+    enabled = bool(cfg.get("phash_dedupe", True))
+    try:
+        max_distance = max(0, min(32, int(cfg.get("phash_max_distance", DEFAULT_MAX_DISTANCE))))
+    except (TypeError, ValueError):
+        max_distance = DEFAULT_MAX_DISTANCE
+    return enabled, max_distance
+
+
+def _mark_shown(entry) -> None:
+    result = entry.current()
+    if result is None:
+        return
+    value = PHASHES.get(result.url)
+    if value is not None:
+        entry.shown[result.url] = value
+
+
+def _near_shown(entry, max_distance: int):
+    """skip() predicate for CACHE.step: looks like an image already shown."""
+
+    def skip(result) -> bool:
+        value = PHASHES.get(result.url)
+        if value is None:
+            return False
+        others = [h for url, h in entry.shown.items() if url != result.url]
+        return is_near(value, others, max_distance)
+
+    return skip
+
+
+def _prefetch_hashes(key: CacheKey) -> None:
+    """
+    Hash the next few candidates' thumbnails in the background, so ➡ can
+    tell a near-duplicate before downloading it (on by default whenever
+    near-duplicate skipping is).
+    """
+    cfg = utils.get_config() or {}
+    download = getattr(utils, "_download_bytes", None)
+    entry = CACHE.peek(key)
+    enabled, _ = _phash_settings()
+    if not enabled or not cfg.get("phash_prefetch", True) or download is None or entry is None:
+        return
+    upcoming = entry.results[entry.index + 1 : entry.index + 1 + PHASH_PREFETCH_COUNT]
+    todo = []
+    with _hashing_lock:
+        for result in upcoming:
+            if PHASHES.get(result.url) is None and result.url not in _HASHING:
+                _HASHING.add(result.url)
+                todo.append(result)
+    if not todo:
+        return
+
+    def job():
+        for result in todo:
+            try:
+                data = download(result.thumb_url or result.url, max_bytes=PHASH_PREFETCH_MAX_BYTES)
+                PHASHES.record(data, result.url)
+            except Exception:
+                pass
+            finally:
+                with _hashing_lock:
+                    _HASHING.discard(result.url)
+
+    _start_background(job, PREFETCH)
 
 
 def get_provider_label(query: str) -> str:
+    entry = CACHE.peek(_cache_key(query))
+    return entry.provider if entry else _provider_label_from_config()
+
+
+def get_failure_reason(query: str) -> str | None:
+    """
+    Why the last search for this query came back empty: NO_RESULTS,
+    PROVIDER_ERROR or OFFLINE; None if it has results or was never run.
+    """
+    entry = CACHE.peek(_cache_key(query))
+    return entry.reason if entry and _is_fresh_negative(entry) else None
+
+
+def get_cache_stats() -> dict:
+    return CACHE.stats()
+
+
+CACHE_FILE_NAME = "result_cache.json"
+PAYLOAD_CACHE_DIR = "payload_cache"
+MEDIA_INDEX_DIR = "media_index"
+
+
+def _cache_file() -> str:
+    return utils.user_files_path(CACHE_FILE_NAME)
+
+
+def save_cache(path: str | None = None) -> int:
+    """
+    Persist the result cache (user_files/result_cache.json by default), and
+    the index changes the payload and download caches still hold back.
+    """
+    PAYLOADS.flush()
+    download_cache = getattr(utils, "download_cache", None)
+    if download_cache is not None:
+        download_cache().flush()
+    try:
+        return CACHE.save(path or _cache_file(), ImageResult.to_dict)
+    except OSError:
+        return 0
+
+
+def load_cache(path: str | None = None) -> int:
+    """Load a cache written by save_cache(); TTLs apply from the original fetch time."""
+    _apply_cache_limits()
+    return CACHE.load(path or _cache_file(), ImageResult.from_dict)
+
+
+def export_bundle(path: str) -> dict:
+    """
+    Write the cached results (and the prefetched image bytes) to a bundle
+    file that import_bundle() on another machine can pre-seed from.
+    Returns counts of what was written.
+    """
+    entries = [e for e in CACHE.export_entries(ImageResult.to_dict) if isinstance(e["key"], list)]
+    meta = {"addon_version": utils.addon_version()}
+    return export_bundle_file(path, entries, utils.download_cache().items(), meta)
+
+
+def import_bundle(path: str) -> dict:
+    """
+    Add a bundle written by export_bundle(). Its queries answer cache misses
+    before any provider is asked, and its images are used instead of
+    downloading. Raises ValueError for files that are not bundles.
+    """
+    return utils.bundles().install(path)
+
+
+def _bundle_results(key: CacheKey) -> bool:
+    """Fill the cache for key from an imported bundle; True on a hit."""
+    shelf = getattr(utils, "bundles", None)
+    if shelf is None:
+        return False
+    try:
+        hit = shelf().lookup(*key)
+    except Exception:
+        return False
+    if hit is None:
+        return False
+    label, fetched_at, items = hit
+    try:
+        fetched_at = float(fetched_at) if fetched_at is not None else None
+    except (TypeError, ValueError):
+        fetched_at = None
+    # A bundle row ages like any cache entry: past the hard TTL it is not used
+    hard = _ttl("cache_hard_ttl_s", DEFAULT_HARD_TTL_S)
+    if fetched_at is not None and hard and time.time() - fetched_at >= hard:
+        return False
+    results = []
+    for item in items:
+        try:
+            results.append(ImageResult.from_dict(item))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not results:
+        return False
+    CACHE.put(key, results, label or _provider_label_from_id(key[0]), fetched_at=fetched_at)
+    return True
+
+
+def _media_index():
+    """The collection media index of the current profile (user_files/media_index)."""
+    profile_name = getattr(utils, "profile_name", None)
+    profile = (profile_name() if profile_name else "") or "default"
+    MEDIA_INDEX.configure(utils.user_files_path(MEDIA_INDEX_DIR, f"{profile}.json"))
+    return MEDIA_INDEX
+
+
+def reuse_media_mode() -> str:
+    """reuse_existing_media: "off", "offer" (ask first) or "auto" (the default)."""
+    cfg = utils.get_config() or {}
+    mode = str(cfg.get("reuse_existing_media", "auto")).lower()
+    return mode if mode in ("off", "offer", "auto") else "auto"
+
+
+def remember_media(query: str, filename: str) -> None:
+    """Note that filename was inserted into a note for query."""
+    try:
+        _media_index().add(_clean_query(query), filename)
+    except Exception:
+        pass
+
+
+def reusable_media(query: str, exists=None) -> str | None:
+    """
+    A media file the add-on already inserted for this query (the most
+    recent one exists(filename) confirms), or None. No network involved.
+    """
     q = _clean_query(query)
-    return PROVIDERS.get(q) or _provider_label_from_config()
+    if not q:
+        return None
+    try:
+        return _media_index().lookup(q, exists)
+    except Exception:
+        return None
+
+
+def rebuild_media_index(pairs) -> int:
+    """Rebuild the media index from (query, filename) pairs found in the collection."""
+    return _media_index().rebuild((_clean_query(q), f) for q, f in pairs)
+
+
+def media_index_needs_build() -> bool:
+    return not _media_index().exists_on_disk()
+
+
+def reparse_payloads() -> int:
+    """
+    Rebuild cached results from the stored raw responses by parsing them
+    again (e.g. after a parser fix), without the network. Only queries still
+    in the result cache are rebuilt; others are re-parsed when next searched.
+    Returns the number of queries rebuilt.
+    """
+    _apply_cache_limits()
+    rebuilt = 0
+    for provider, query in PAYLOADS.queries():
+        key = _cache_key(query, provider)
+        if CACHE.peek(key) is None:
+            continue
+        results = _payload_results(provider, query)
+        if not results:
+            continue
+        CACHE.replace_results(key, _ranked(dedupe(results)), _provider_label_from_id(provider))
+        rebuilt += 1
+    PAYLOADS.set_stamp(utils.addon_version())
+    return rebuilt
+
+
+def payloads_need_reparse() -> bool:
+    """True when stored responses were last parsed by another add-on version."""
+    _apply_cache_limits()
+    return PAYLOADS.enabled and bool(PAYLOADS.queries()) and PAYLOADS.stamp() != utils.addon_version()
+
+
+def is_cached(query: str) -> bool:
+    """True when getresultbyquery(query) would be answered from the cache."""
+    entry = CACHE.peek(_cache_key(query))
+    return entry is not None and _is_usable(entry)
+
+
+def cache_has_room() -> bool:
+    """
+    True while a search can be cached without evicting anything (idle-time
+    warming stops here, so it never pushes out the user's own results). A
+    fallback answer is also filed under its own provider's key, so one
+    search may take two entries.
+    """
+    _apply_cache_limits()
+    return CACHE.free_slots() >= 2
+
+
+def _fetch_uncoalesced(key: CacheKey, q: str, lane: int = INTERACTIVE) -> None:
+    """
+    Query the provider(s) and store the outcome (results or reason) under
+    key. The rest of a streamed list is read in the caller's scheduler lane,
+    so speculative fetches stay paused during a sync.
+    """
+    if _bundle_results(key):
+        return
+    rest = None
+    deduper = Deduper()
+    started = time.monotonic()
+    if _stream_enabled():
+        # Return once the first window of results is decoded and ranked, so
+        # the image downloaded first is the best of that window; the rest
+        # keeps arriving in the background and extends the cache.
+        first, rest, label, error = _provider_stream_and_label(q)
+        results = [first] if first and deduper.accept(first) else []
+        try:
+            for result in itertools.islice(rest or (), STREAM_RANK_WINDOW - 1):
+                if deduper.accept(result):
+                    results.append(result)
+        except Exception:
+            rest = None
+        results = _ranked(results)
+        stage = FIRST_RESULT
+    else:
+        results, label = _merged_results_and_label(q)
+        error = getattr(results, "error", None)
+        results = list(results)
+        stage = SEARCH
+    TIMINGS.record(stage, time.monotonic() - started, label, ok=error != PROVIDER_ERROR)
+
+    if results:
+        # A fallback answer is also a valid answer for its own provider
+        source = results[0].provider
+        source_key = (source, key[1])
+        # Merged lists mix providers, so they are never filed under one
+        if source and source_key != key and "+" not in key[0]:
+            source_entry = CACHE.peek(source_key)
+            if source_entry is None or not source_entry.results:
+                CACHE.put(source_key, results, _provider_label_from_id(source))
+
+    reason = None if results else _failure_reason(error)
+    entry = CACHE.put(key, results, label, reason=reason)
+    if rest is not None:
+        _start_background(lambda: _drain_into(entry, rest, deduper), lane)
+    _prefetch_hashes(key)
+
+
+def _fetch_into_cache(key: CacheKey, q: str, lane: int = INTERACTIVE) -> None:
+    """_fetch_uncoalesced(), unless another thread is already fetching key."""
+    with _fetching_lock:
+        pending = _FETCHING.get(key)
+        if pending is None:
+            _FETCHING[key] = threading.Event()
+    if pending is not None:
+        pending.wait(FETCH_WAIT_S)
+        entry = CACHE.peek(key)
+        if entry is not None and _is_usable(entry):
+            return
+        _fetch_uncoalesced(key, q, lane)
+        return
+    try:
+        _fetch_uncoalesced(key, q, lane)
+    finally:
+        with _fetching_lock:
+            _FETCHING.pop(key).set()
 
 
 def getresultbyquery(query: str) -> str | None:
+    _apply_cache_limits()
     q = _clean_query(query)
-    if q not in RESULTS or not RESULTS[q]:
-        urls, label = _provider_results_and_label(q)
-        RESULTS[q] = urls
-        INDICES[q] = 0 if urls else -1
-        PROVIDERS[q] = label
-    _touch_query(q)
-    _evict_cache_if_needed()
-    return _current_url(q)
+    key = _cache_key(query)
+    entry = CACHE.get(key, valid=_is_usable)
+    if entry is not None and _is_stale(entry):
+        _refresh_in_background(key, q)
+    if entry is None:
+        _fetch_into_cache(key, q)
+    return _current_url(key)
 
 
-def getnextresultbyquery(query: str) -> str | None:
+def prewarm(query: str, lane: int = PREFETCH) -> ImageResult | None:
+    """
+    Run the search for query ahead of time (e.g. while the user is typing)
+    so the later getresultbyquery() is a cache hit. Does not count towards
+    the hit/miss statistics. Follow-up work runs in lane (PREFETCH, or
+    WARMING for idle-time warming). Returns the first result, if any.
+    """
     q = _clean_query(query)
-    if q in RESULTS and INDICES.get(q, -1) < len(RESULTS[q]) - 1:
-        INDICES[q] += 1
-    return _current_url(q)
+    if not q:
+        return None
+    _apply_cache_limits()
+    key = _cache_key(query)
+    entry = CACHE.peek(key)
+    if entry is None or not _is_usable(entry):
+        _fetch_into_cache(key, q, lane)
+    return _current_result(key)
+
+
+def get_current_result(query: str) -> ImageResult | None:
+    """Return the full record (with metadata) behind the current URL."""
+    return _current_result(_cache_key(query))
+
+
+def getnextresultbyquery(query: str) -> str | None:
+    """
+    Step to the next candidate, passing over ones whose image hash is close
+    to an image already shown for this query (when the hash is known).
+    """
+    key = _cache_key(query)
+    entry = CACHE.peek(key)
+    skip = None
+    enabled, max_distance = _phash_settings()
+    if entry is not None and enabled:
+        _mark_shown(entry)
+        skip = _near_shown(entry, max_distance)
+    result = CACHE.step(key, 1, skip=skip)
+    if result is not None:
+        _prefetch_hashes(key)
+    return result.url if result else None
 
 
 def getprevresultbyquery(query: str) -> str | None:
-    q = _clean_query(query)
-    if q in RESULTS and INDICES.get(q, -1) > 0:
-        INDICES[q] -= 1
-    return _current_url(q)
+    result = CACHE.step(_cache_key(query), -1)
+    return result.url if result else None
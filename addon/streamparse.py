@@ -0,0 +1,102 @@
+# streamparse.py
+
+import codecs
+import json
+
+# Incremental parsing helpers for provider responses.
+# Everything here works on an iterable of raw byte chunks (e.g. requests'
+# iter_content) and yields items as soon as they are complete, so callers can
+# stop reading the body once they have what they need.
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+
+
+def iter_text(byte_chunks, encoding: str = "utf-8"):
+    """Decode byte chunks into text chunks without splitting multibyte chars."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in byte_chunks:
+        if not chunk:
+            continue
+        if isinstance(chunk, str):
+            yield chunk
+            continue
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(text_chunks, key: str):
+    """
+    Yield the elements of the first JSON array stored under `key`, one by one,
+    as soon as each element has been fully received.
+    Stops at the closing bracket; malformed input simply ends the iteration.
+    The generator's return value is True when the array was found at all
+    (so a missing key can be told apart from an empty array).
+    """
+    marker = f'"{key}"'
+    buf = ""
+    pos = -1  # index just past the opening '[' once found
+    for chunk in text_chunks:
+        buf += chunk
+        if pos < 0:
+            start = buf.find(marker)
+            if start < 0:
+                # Keep a short tail in case the marker straddles two chunks
+                buf = buf[-len(marker):]
+                continue
+            bracket = buf.find("[", start + len(marker))
+            if bracket < 0:
+                continue
+            between = buf[start + len(marker):bracket].strip(_WS)
+            if between != ":":
+                return False
+            buf = buf[bracket + 1:]
+            pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WS + ",":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                return True
+            try:
+                item, end = _DECODER.raw_decode(buf, pos)
+            except ValueError:
+                break  # incomplete element, wait for more data
+            if end >= len(buf) and not isinstance(item, (dict, list, str)):
+                break  # a bare number may still be growing
+            yield item
+            buf = buf[end:]
+            pos = 0
+    return pos >= 0
+
+
+def iter_quoted_attr(text_chunks, attr: str):
+    """
+    Yield the values of a single-quoted HTML attribute (attr='...') found in a
+    JSON-encoded HTML string, unescaped back to plain text.
+    """
+    marker = f"{attr}='"
+    buf = ""
+    for chunk in text_chunks:
+        buf += chunk
+        while True:
+            start = buf.find(marker)
+            if start < 0:
+                buf = buf[-len(marker):]
+                break
+            end = buf.find("'", start + len(marker))
+            if end < 0:
+                buf = buf[start:]
+                break
+            raw = buf[start + len(marker):end]
+            buf = buf[end + 1:]
+            try:
+                yield json.loads('"' + raw + '"')
+            except ValueError:
+                continue
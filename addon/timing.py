@@ -0,0 +1,156 @@
+# timing.py
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Per-stage timings of recent operations (network check, provider HTTP,
+# parsing, download, media import, editor reload), kept in a ring buffer so
+# the Diagnostics tab can show where the time goes. No Anki imports here.
+
+DEFAULT_CAPACITY = 1000
+
+# Stage names used across the add-on
+NETWORK_CHECK = "network_check"
+PROVIDER_HTTP = "provider_http"
+PARSE = "parse"
+SEARCH = "search"
+FIRST_RESULT = "first_result"
+DOWNLOAD = "download"
+MEDIA_ADD = "media_add"
+LOAD_NOTE = "load_note"
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Timings:
+    """Thread-safe ring buffer of (stage, provider, seconds, ok, wall time) samples."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self._samples: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def record(self, stage: str, seconds: float, provider: str | None = None, ok: bool = True) -> None:
+        with self._lock:
+            self._samples.append((stage, provider or "", max(0.0, seconds), ok, time.time()))
+
+    @contextmanager
+    def timed(self, stage: str, provider: str | None = None):
+        """Time the with-block; an exception is recorded as a failed sample and re-raised."""
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.record(stage, time.monotonic() - start, provider, ok=False)
+            raise
+        self.record(stage, time.monotonic() - start, provider)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def samples(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def summary(self) -> list[dict]:
+        """One row per (stage, provider): count, errors, p50/p95/max in milliseconds."""
+        groups: dict = {}
+        for stage, provider, seconds, ok, _ in self.samples():
+            group = groups.setdefault((stage, provider), [[], 0])
+            group[0].append(seconds)
+            if not ok:
+                group[1] += 1
+        rows = []
+        for (stage, provider), (values, errors) in sorted(groups.items()):
+            values.sort()
+            rows.append(
+                {
+                    "stage": stage,
+                    "provider": provider,
+                    "count": len(values),
+                    "errors": errors,
+                    "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                    "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                    "max_ms": round(values[-1] * 1000, 1),
+                }
+            )
+        return rows
+
+    def export_json(self, extra: dict | None = None) -> str:
+        """Summary plus raw recent samples, for attaching to bug reports."""
+        data = {
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "summary": self.summary(),
+            "samples": [
+                {"stage": s, "provider": p, "ms": round(sec * 1000, 2), "ok": ok, "at": round(at, 3)}
+                for s, p, sec, ok, at in self.samples()
+            ],
+        }
+        if extra:
+            data.update(extra)
+        return json.dumps(data, indent=2)
+
+
+class StreamSpan:
+    """
+    Timing of a streamed response: the request plus every wait for the next
+    body chunk, but not the time the consumer spends between results (a
+    with-block around a generator would count that too). Recorded once, by
+    the first finish().
+    """
+
+    def __init__(self, timings: Timings, stage: str, provider: str | None = None):
+        self._timings = timings
+        self.stage = stage
+        self.provider = provider
+        self.seconds = 0.0
+        self._done = False
+
+    @contextmanager
+    def measure(self):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds += time.monotonic() - start
+
+    def chunks(self, iterable):
+        """Pass the chunks of iterable through, timing each wait."""
+        iterator = iter(iterable)
+        while True:
+            with self.measure():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            yield chunk
+
+    def finish(self, ok: bool = True) -> None:
+        if not self._done:
+            self._done = True
+            self._timings.record(self.stage, self.seconds, self.provider, ok=ok)
+
+
+TIMINGS = Timings()
+
+
+def timed(stage: str, provider: str | None = None):
+    return TIMINGS.timed(stage, provider)
+
+
+def stream_span(stage: str, provider: str | None = None) -> StreamSpan:
+    return StreamSpan(TIMINGS, stage, provider)
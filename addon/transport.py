@@ -0,0 +1,178 @@
+# transport.py
+
+import base64
+import gzip
+import json
+import os
+import threading
+import urllib.parse
+from contextlib import contextmanager
+
+import requests
+
+# The HTTP layer under the provider requests. Normally a thin pass-through to
+# requests.get; with a cassette active it can record every response to a
+# gzip-compressed JSON file, or replay recorded responses without touching
+# the network (deterministic tests and parser regression timing).
+# No Anki imports here.
+
+RECORD = "record"
+REPLAY = "replay"
+
+CASSETTE_VERSION = 1
+
+# Credentials are never written to a cassette and are ignored when matching
+_REDACTED_PARAMS = frozenset({"key", "cx"})
+_KEPT_HEADERS = ("content-type",)
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def request_key(url: str, params=None) -> str:
+    """Canonical 'GET <url>' for matching: params merged in, sorted, credentials dropped."""
+    prepared = requests.Request("GET", url, params=params).prepare().url
+    parts = urllib.parse.urlsplit(prepared)
+    query = sorted(
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _REDACTED_PARAMS
+    )
+    canonical = parts._replace(query=urllib.parse.urlencode(query), fragment="")
+    return "GET " + urllib.parse.urlunsplit(canonical)
+
+
+def _build_response(url: str, status: int, headers: dict, body: bytes) -> requests.Response:
+    """A fully-read requests.Response, so callers can use .json(), .text or iter_content()."""
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = url
+    resp.headers.update(headers or {})
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    resp._content = body
+    resp._content_consumed = True
+    return resp
+
+
+def _encode_body(body: bytes) -> dict:
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode_body(data: dict) -> bytes:
+    if "base64" in data:
+        return base64.b64decode(data["base64"])
+    return (data.get("text") or "").encode("utf-8")
+
+
+class MissingRecording(requests.exceptions.ConnectionError):
+    """Raised in replay mode for a request the cassette has no response for."""
+
+
+class Cassette:
+    """
+    Recorded responses keyed by request_key(). Thread-safe; the file is
+    written on save() (use_cassette() saves on exit in record mode).
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._interactions: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            self.load()
+        elif mode == REPLAY:
+            raise FileNotFoundError(path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._interactions)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._interactions)
+
+    def load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"unsupported cassette: {self.path}")
+        with self._lock:
+            self._interactions = {
+                item["request"]: item for item in data.get("interactions") or [] if "request" in item
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "interactions": list(self._interactions.values())}
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def add(self, url: str, params=None, status: int = 200, headers=None, body: bytes = b"") -> None:
+        kept = {k: v for k, v in (headers or {}).items() if k.lower() in _KEPT_HEADERS}
+        item = {"request": request_key(url, params), "status": status, "headers": kept}
+        item.update(_encode_body(body))
+        with self._lock:
+            self._interactions[item["request"]] = item
+
+    def response_for(self, url: str, params=None) -> requests.Response:
+        key = request_key(url, params)
+        with self._lock:
+            item = self._interactions.get(key)
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if item is None:
+            raise MissingRecording(f"no recorded response for {key}")
+        return _build_response(key[4:], item.get("status", 200), item.get("headers"), _decode_body(item))
+
+
+def activate(cassette: Cassette | None) -> None:
+    """Route provider requests through cassette (None restores live requests)."""
+    global _active
+    with _active_lock:
+        _active = cassette
+
+
+def active() -> Cassette | None:
+    with _active_lock:
+        return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = REPLAY):
+    cassette = Cassette(path, mode)
+    previous = active()
+    activate(cassette)
+    try:
+        yield cassette
+    finally:
+        activate(previous)
+        if mode == RECORD:
+            cassette.save()
+
+
+def get(url: str, params=None, headers=None, timeout=None, stream: bool = False) -> requests.Response:
+    """requests.get() through the active cassette, if any."""
+    cassette = active()
+    if cassette is None:
+        return requests.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+    if cassette.mode == REPLAY:
+        return cassette.response_for(url, params)
+    # Record: read the whole body so it can be stored; iter_content() still works
+    resp = requests.get(url, params=params, headers=headers, timeout=timeout)
+    cassette.add(url, params, resp.status_code, dict(resp.headers), resp.content)
+    return resp
@@ -1,10 +1,16 @@
 # ui_editor.py
 
 import re
+import time
+import weakref
 from aqt import mw
+from aqt.utils import askUser
 from anki.hooks import addHook
 from . import utils
 from . import search
+from . import profiling
+from .scheduler import PREFETCH
+from .timing import LOAD_NOTE, timed
 
 try:
     from aqt import gui_hooks
@@ -12,9 +18,21 @@ except Exception:
     gui_hooks = None
 
 last_query = None
+# Query whose last 🖼 reused an existing image: its first ➡ shows the
+# current result instead of stepping past it
+_reused_query = None
 _HOOKS_INSTALLED = False
 _MW_HOOK_FLAG = "_imgsearchv3_editor_hooks_installed"
 
+# Pre-search while typing, per editor: note, query wanted, query last
+# pre-searched, debounce deadline, whether a pre-search is in flight / a
+# timer is pending. At most one pre-search per editor is in flight, and at
+# most _PRESEARCH_MAX_EDITORS editors are tracked; closed editors drop out.
+_EDITORS = weakref.WeakSet()
+_PRESEARCH = weakref.WeakKeyDictionary()
+_PRESEARCH_MAX_EDITORS = 8
+_PRESEARCH_MIN_CHARS = 2
+
 
 def _replace_last_imgsearch_tag(html: str, new_img_tag: str):
     pattern = r'(<img[^>]*\bclass="[^"]*\bimgsearch\b[^"]*"[^>]*>)'
@@ -48,7 +66,42 @@ def display_image(editor, img_filename, image_dest_field_index):
         else:
             editor.note.fields[image_dest_field_index] = img_tag
 
-    editor.loadNote()
+    with timed(LOAD_NOTE):
+        editor.loadNote()
+
+
+def _insert_and_remember(editor, query, img_filename, idx):
+    display_image(editor, img_filename, idx)
+    search.remember_media(query, img_filename)
+
+
+def _reuse_existing_media(editor, query) -> bool:
+    """
+    Put an image the add-on already inserted for this query on another note
+    into the field (no search, no download, no new media file). Returns
+    True when the search is settled that way; ➡ then goes to the provider.
+    With "offer" the user is asked first (a modal dialog, so it is opt-in).
+    """
+    global _reused_query
+    mode = search.reuse_media_mode()
+    if mode == "off":
+        return False
+    filename = search.reusable_media(query, utils.media_file_exists)
+    if not filename:
+        return False
+    idx = utils.get_note_image_field_index(editor.note, quiet=True)
+    if idx is None or filename in utils.imgsearch_files(editor.note.fields[idx]):
+        return False
+    if mode == "offer" and not askUser(
+        f"An image already used for \"{search._clean_query(query)}\" is in your collection "
+        f"({filename}).\n\nUse it again? Choose No to search {search.get_provider_label(query)}.",
+        parent=editor.parentWindow,
+    ):
+        return False
+    display_image(editor, filename, idx)
+    utils.notify("Reused an image already in the collection. ➡ searches the provider.")
+    _reused_query = query
+    return True
 
 
 def _show_download_error(code: str):
@@ -56,12 +109,52 @@ def _show_download_error(code: str):
         utils.report("No internet connection. Unable to download image. Please reconnect and try again.")
     elif code == "network":
         utils.report("Network error while downloading image. Please try again in a moment.")
+    elif code == "too_large":
+        utils.report("The image is larger than the size limit set for this note type. Try the next image.")
     else:
         utils.report("Could not save image to media collection.")
 
 
+def _profile_requested() -> bool:
+    """Armed from the Tools menu, or profile_next_search set in the config (one-shot)."""
+    if profiling.take_armed():
+        return True
+    cfg = utils.get_config() or {}
+    if not cfg.get("profile_next_search"):
+        return False
+    cfg["profile_next_search"] = False
+    try:
+        mw.addonManager.writeConfig(__name__, cfg)
+    except Exception:
+        pass
+    return True
+
+
 def on_search(editor):
-    global last_query
+    if not _profile_requested():
+        _search_and_insert(editor)
+        return
+
+    cfg = utils.get_config() or {}
+    try:
+        top_n = max(5, min(200, int(cfg.get("profile_top_n", profiling.DEFAULT_TOP_N))))
+    except (TypeError, ValueError):
+        top_n = profiling.DEFAULT_TOP_N
+    try:
+        _, prof_path, summary_path = profiling.run_profiled(
+            lambda: _search_and_insert(editor),
+            utils.user_files_path("profiles"),
+            "search",
+            top_n,
+        )
+    except Exception as e:
+        utils.report(f"Could not profile the search:\n{e!r}")
+        return
+    utils.notify(f"Profile saved:<br>{prof_path}<br>{summary_path}", 6000)
+
+
+def _search_and_insert(editor):
+    global last_query, _reused_query
     query = editor.web.selectedText() if editor.web else ""
     if not query:
         query = utils.get_note_query(editor.note)
@@ -70,11 +163,20 @@ def on_search(editor):
         return
 
     last_query = query
+    _reused_query = None
+    if _reuse_existing_media(editor, query):
+        return
     image_url = search.getresultbyquery(query)
     provider_label = search.get_provider_label(query)
     utils.notify(f"Provider: {provider_label}")
     if not image_url:
-        utils.report(f"No images found for the query (provider: {provider_label}).")
+        reason = search.get_failure_reason(query)
+        if reason == "offline":
+            utils.report("No internet connection. Unable to search for images. Please reconnect and try again.")
+        elif reason == "provider_error":
+            utils.report(f"The image provider could not be reached or returned an error (provider: {provider_label}).")
+        else:
+            utils.report(f"No images found for the query (provider: {provider_label}).")
         return
 
     idx = utils.get_note_image_field_index(editor.note)
@@ -82,12 +184,13 @@ def on_search(editor):
         utils.report("No destination field found on this note type.")
         return
 
-    img_filename, err = utils.save_image_to_library(editor, image_url)
+    image = search.get_current_result(query) or image_url
+    img_filename, err = utils.save_image_to_library(editor, image)
     if err or not img_filename:
         _show_download_error(err or "unexpected")
         return
 
-    display_image(editor, img_filename, idx)
+    _insert_and_remember(editor, query, img_filename, idx)
 
 
 def on_previous(editor):
@@ -103,19 +206,27 @@ def on_previous(editor):
     if idx is None:
         utils.report("No destination field found on this note type.")
         return
-    img_filename, err = utils.save_image_to_library(editor, url)
+    image = search.get_current_result(last_query) or url
+    img_filename, err = utils.save_image_to_library(editor, image)
     if err or not img_filename:
         _show_download_error(err or "unexpected")
         return
-    display_image(editor, img_filename, idx)
+    _insert_and_remember(editor, last_query, img_filename, idx)
 
 
 def on_next(editor):
-    global last_query
+    global last_query, _reused_query
     if not last_query:
         utils.report("No previous image search in this session.")
         return
-    url = search.getnextresultbyquery(last_query)
+    if last_query == _reused_query or search.get_current_result(last_query) is None:
+        # An existing image was reused (or nothing searched yet): show the
+        # current result, even if pre-search already cached the list
+        _reused_query = None
+        url = search.getresultbyquery(last_query)
+        utils.notify(f"Provider: {search.get_provider_label(last_query)}")
+    else:
+        url = search.getnextresultbyquery(last_query)
     if not url:
         utils.report("No next image available for this query.")
         return
@@ -123,13 +234,129 @@ def on_next(editor):
     if idx is None:
         utils.report("No destination field found on this note type.")
         return
-    img_filename, err = utils.save_image_to_library(editor, url)
+    image = search.get_current_result(last_query) or url
+    img_filename, err = utils.save_image_to_library(editor, image)
     if err or not img_filename:
         _show_download_error(err or "unexpected")
         return
-    display_image(editor, img_filename, idx)
+    _insert_and_remember(editor, last_query, img_filename, idx)
+
+def _presearch_settings():
+    cfg = utils.get_config() or {}
+    enabled = bool(cfg.get("presearch_while_typing", True))
+    try:
+        debounce_ms = max(0, min(10000, int(cfg.get("presearch_debounce_ms", 800))))
+    except (TypeError, ValueError):
+        debounce_ms = 800
+    prefetch = bool(cfg.get("presearch_prefetch_image", False))
+    return enabled, debounce_ms, prefetch
+
+
+def _single_shot(delay_ms, fn):
+    progress = mw.progress
+    if hasattr(progress, "single_shot"):
+        progress.single_shot(delay_ms, fn, False)
+    else:
+        progress.timer(delay_ms, fn, False)
+
+
+def _on_typing_timer(note):
+    """Editor typing pause: pre-search the note's query so 🖼 is a cache hit."""
+    enabled, debounce_ms, _ = _presearch_settings()
+    if not enabled or note is None:
+        return
+    # Half-typed words must not spend the Google daily quota
+    if search.uses_quota_limited_provider():
+        return
+    editor = next((e for e in list(_EDITORS) if getattr(e, "note", None) is note), None)
+    if editor is None:
+        return
+    try:
+        query = search._clean_query(utils.get_note_query(note, quiet=True))
+    except Exception:
+        return
+    if len(query) < _PRESEARCH_MIN_CHARS:
+        return
+
+    key = editor
+    state = _PRESEARCH.get(key)
+    if state is None:
+        if len(_PRESEARCH) >= _PRESEARCH_MAX_EDITORS:
+            for old_key in [k for k, s in list(_PRESEARCH.items()) if not s["busy"] and not s["timer"]]:
+                _PRESEARCH.pop(old_key, None)
+            if len(_PRESEARCH) >= _PRESEARCH_MAX_EDITORS:
+                return
+        state = _PRESEARCH[key] = {
+            "note": note,
+            "wanted": None,
+            "done": None,
+            "due": 0.0,
+            "busy": False,
+            "timer": False,
+        }
+    if query in (state["wanted"], state["done"]):
+        return
+    state["note"] = note
+    state["wanted"] = query
+    state["due"] = time.monotonic() + debounce_ms / 1000.0
+    if not state["timer"]:
+        state["timer"] = True
+        _single_shot(debounce_ms, lambda: _presearch_due(key))
+
+
+def _presearch_due(key):
+    state = _PRESEARCH.get(key)
+    if state is None:
+        return
+    remaining_ms = int((state["due"] - time.monotonic()) * 1000)
+    if remaining_ms > 0:
+        # More typing since the timer was set: wait out the rest
+        _single_shot(remaining_ms, lambda: _presearch_due(key))
+        return
+    state["timer"] = False
+    _presearch_start(key)
+
+
+def _presearch_start(key):
+    state = _PRESEARCH.get(key)
+    if state is None or state["busy"] or state["wanted"] in (None, state["done"]):
+        return
+    query = state["wanted"]
+    state["busy"] = True
+    _, _, prefetch = _presearch_settings()
+    profile = None
+    if prefetch:
+        try:
+            profile = utils.get_note_image_profile(state["note"])
+        except Exception:
+            profile = ("default", 0)
+
+    def job():
+        try:
+            result = search.prewarm(query)
+            if result is not None and profile is not None:
+                utils.prefetch_image(result, *profile)
+        except Exception:
+            pass
+        finally:
+            mw.taskman.run_on_main(lambda: _presearch_done(key, query))
+
+    search._start_background(job, PREFETCH)
+
+
+def _presearch_done(key, query):
+    state = _PRESEARCH.get(key)
+    if state is None:
+        return
+    state["busy"] = False
+    state["done"] = query
+    # The query changed while this one was in flight
+    if not state["timer"] and state["wanted"] != query:
+        _presearch_start(key)
+
 
 def add_editor_buttons(buttons, editor):
+    _EDITORS.add(editor)
     # Emoji toolbar labels (icon assets removed)
     icon_search = ""
     icon_prev = ""
@@ -204,6 +431,8 @@ def init_editor():
         return
     addHook("setupEditorButtons", add_editor_buttons)
     add_editor_context_menu_install()
+    if gui_hooks and hasattr(gui_hooks, "editor_did_fire_typing_timer"):
+        gui_hooks.editor_did_fire_typing_timer.append(_on_typing_timer)
     _HOOKS_INSTALLED = True
     if mw:
         setattr(mw, _MW_HOOK_FLAG, True)
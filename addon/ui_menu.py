@@ -4,6 +4,7 @@ from aqt.utils import qconnect, openLink
 from aqt.webview import AnkiWebView
 from aqt.qt import *
 from . import utils
+from .timing import TIMINGS
 
 _MENU_INSTALLED = False
 _MW_MENU_FLAG = "_imgsearchv3_menu_installed"
@@ -23,6 +24,19 @@ def _safe_int(value, default):
         return int(default)
 
 
+def _google_quota_text() -> str:
+    try:
+        from .gimages import google_quota_status
+
+        status = google_quota_status()
+    except Exception:
+        status = None
+    if status is None:
+        return "No API key configured."
+    used, daily = status
+    return f"{daily - used} of {daily} requests left (used {used})"
+
+
 class SettingsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -85,6 +99,24 @@ class SettingsDialog(QDialog):
         self.placement_combo.currentIndexChanged.connect(self.mark_nt_dirty)
         self.right_layout.addWidget(self.placement_combo)
 
+        # Image size profile (which URL variant to download)
+        self.right_layout.addWidget(QLabel("Image Size:", right_side))
+        self.size_profile_combo = QComboBox(right_side)
+        self.size_profile_combo.addItem("Provider default", "default")
+        self.size_profile_combo.addItem("Thumbnail (smallest files)", "thumbnail")
+        self.size_profile_combo.addItem("Medium (original up to 1280 px, else thumbnail)", "medium")
+        self.size_profile_combo.addItem("Original (full resolution)", "original")
+        self.size_profile_combo.currentIndexChanged.connect(self.mark_nt_dirty)
+        self.right_layout.addWidget(self.size_profile_combo)
+
+        self.right_layout.addWidget(QLabel("Max image size (MB, 0 = no limit):", right_side))
+        self.max_mb_spin = QDoubleSpinBox(right_side)
+        self.max_mb_spin.setRange(0.0, 100.0)
+        self.max_mb_spin.setSingleStep(0.5)
+        self.max_mb_spin.setDecimals(1)
+        self.max_mb_spin.valueChanged.connect(self.mark_nt_dirty)
+        self.right_layout.addWidget(self.max_mb_spin)
+
         # Reset per-note-type defaults button
         nt_buttons_row = QHBoxLayout()
         self.reset_nt_button = QPushButton("Reset Note-Type Defaults", right_side)
@@ -108,6 +140,7 @@ class SettingsDialog(QDialog):
         self.provider_combo.addItem("Yandex", "yandex")
         self.provider_combo.addItem("DuckDuckGo (hidden API)", "duckduckgo")
         self.provider_combo.addItem("Google (Custom Search)", "google")
+        self.provider_combo.addItem("Local image folder", "local")
         self.provider_combo.currentIndexChanged.connect(self.mark_net_dirty)
         curr_provider = (self.config.get("provider") or "yandex")
         if curr_provider == "ddg":
@@ -136,18 +169,80 @@ class SettingsDialog(QDialog):
         self.google_fallback_chk.toggled.connect(self.mark_net_dirty)
         prov_form.addRow("Google fallback:", self.google_fallback_chk)
 
+        # Result depth: pages of 10 fetched concurrently
+        self.google_depth_spin = QSpinBox(prov_group)
+        self.google_depth_spin.setRange(10, 100)
+        self.google_depth_spin.setSingleStep(10)
+        self.google_depth_spin.setValue(_safe_int(self.config.get("google_result_depth", 10), 10))
+        self.google_depth_spin.valueChanged.connect(self.mark_net_dirty)
+        prov_form.addRow("Google results per search:", self.google_depth_spin)
+
+        # Daily quota (CSE free tier: 100 requests/day)
+        self.google_quota_spin = QSpinBox(prov_group)
+        self.google_quota_spin.setRange(1, 100000)
+        self.google_quota_spin.setValue(_safe_int(self.config.get("google_daily_quota", 100), 100))
+        self.google_quota_spin.valueChanged.connect(self.mark_net_dirty)
+        prov_form.addRow("Google daily quota:", self.google_quota_spin)
+
+        self.google_quota_label = QLabel(_google_quota_text(), prov_group)
+        prov_form.addRow("Google quota today:", self.google_quota_label)
+
         def _update_google_fields_enabled():
             use_google = self.provider_combo.currentData() == "google"
             self.google_key_edit.setEnabled(use_google)
             self.google_cx_edit.setEnabled(use_google)
             # NEW:
             self.google_fallback_chk.setEnabled(use_google)
+            self.google_depth_spin.setEnabled(use_google)
+            self.google_quota_spin.setEnabled(use_google)
 
         _update_google_fields_enabled()
         self.provider_combo.currentIndexChanged.connect(lambda _=None: _update_google_fields_enabled())
 
         net_v.addWidget(prov_group)
 
+        # Local image folder (searched by file name, folder and sidecar tags)
+        local_group = QGroupBox("Local image folder", self.net_tab)
+        local_form = QFormLayout(local_group)
+
+        local_dir_row = QHBoxLayout()
+        self.local_dir_edit = QLineEdit(local_group)
+        self.local_dir_edit.setPlaceholderText("Folder of images, e.g. a licensed collection")
+        self.local_dir_edit.setText(self.config.get("local_images_dir", ""))
+        self.local_dir_edit.textChanged.connect(self.mark_net_dirty)
+        local_dir_row.addWidget(self.local_dir_edit, 1)
+        local_browse = QPushButton("Browse…", local_group)
+        local_browse.clicked.connect(self.choose_local_dir)
+        local_dir_row.addWidget(local_browse)
+        local_form.addRow("Folder:", local_dir_row)
+
+        self.local_first_chk = QCheckBox(local_group)
+        self.local_first_chk.setText("Search this folder first, before the provider above")
+        self.local_first_chk.setChecked(bool(self.config.get("local_images_first", False)))
+        self.local_first_chk.toggled.connect(self.mark_net_dirty)
+        local_form.addRow("Local first:", self.local_first_chk)
+
+        self.local_fallback_chk = QCheckBox(local_group)
+        self.local_fallback_chk.setText("Fallback to Yandex when the folder has no match")
+        self.local_fallback_chk.setChecked(bool(self.config.get("local_fallback_to_yandex", True)))
+        self.local_fallback_chk.toggled.connect(self.mark_net_dirty)
+        local_form.addRow("Local fallback:", self.local_fallback_chk)
+
+        net_v.addWidget(local_group)
+
+        # Images the add-on already put into other notes
+        reuse_group = QGroupBox("Images already in the collection", self.net_tab)
+        reuse_form = QFormLayout(reuse_group)
+        self.reuse_combo = QComboBox(reuse_group)
+        self.reuse_combo.addItem("Ask before reusing", "offer")
+        self.reuse_combo.addItem("Reuse automatically", "auto")
+        self.reuse_combo.addItem("Always search", "off")
+        idx = self.reuse_combo.findData(str(self.config.get("reuse_existing_media", "auto")).lower())
+        self.reuse_combo.setCurrentIndex(max(0, idx))
+        self.reuse_combo.currentIndexChanged.connect(self.mark_net_dirty)
+        reuse_form.addRow("Same query as another note:", self.reuse_combo)
+        net_v.addWidget(reuse_group)
+
         # Network group (timeouts/retries/backoff)
         net_group = QGroupBox("Request settings", self.net_tab)
         net_form = QFormLayout(net_group)
@@ -187,7 +282,53 @@ class SettingsDialog(QDialog):
         net_v.addLayout(net_buttons_row)
 
         # =========================
-        # Tab 3: Support
+        # Tab 3: Diagnostics (timings of recent operations)
+        # =========================
+        self.diag_tab = QWidget(self)
+        self.tabs.addTab(self.diag_tab, "Diagnostics")
+        diag_v = QVBoxLayout(self.diag_tab)
+
+        diag_intro = QLabel(
+            "Time spent per stage over recent operations (this session). "
+            "Export the report and attach it when reporting slow searches.",
+            self.diag_tab,
+        )
+        diag_intro.setWordWrap(True)
+        diag_v.addWidget(diag_intro)
+
+        self.timings_table = QTableWidget(0, 7, self.diag_tab)
+        self.timings_table.setHorizontalHeaderLabels(
+            ["Stage", "Provider", "Count", "Errors", "p50 (ms)", "p95 (ms)", "Max (ms)"]
+        )
+        self.timings_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.timings_table.verticalHeader().setVisible(False)
+        self.timings_table.horizontalHeader().setStretchLastSection(True)
+        diag_v.addWidget(self.timings_table)
+
+        self.diag_stats_label = QLabel("", self.diag_tab)
+        self.diag_stats_label.setWordWrap(True)
+        diag_v.addWidget(self.diag_stats_label)
+
+        diag_buttons_row = QHBoxLayout()
+        refresh_btn = QPushButton("Refresh", self.diag_tab)
+        refresh_btn.clicked.connect(self.refresh_diagnostics)
+        diag_buttons_row.addWidget(refresh_btn)
+        clear_btn = QPushButton("Clear", self.diag_tab)
+        clear_btn.clicked.connect(self.clear_diagnostics)
+        diag_buttons_row.addWidget(clear_btn)
+        export_btn = QPushButton("Export JSON…", self.diag_tab)
+        export_btn.clicked.connect(self.export_diagnostics)
+        diag_buttons_row.addWidget(export_btn)
+        diag_buttons_row.addStretch()
+        diag_v.addLayout(diag_buttons_row)
+
+        self.refresh_diagnostics()
+        self.tabs.currentChanged.connect(
+            lambda index: self.refresh_diagnostics() if self.tabs.widget(index) is self.diag_tab else None
+        )
+
+        # =========================
+        # Tab 4: Support
         # =========================
         self.support_tab = QWidget(self)
         self.tabs.addTab(self.support_tab, "Support")
@@ -336,6 +477,8 @@ class SettingsDialog(QDialog):
         self.query_fields_list.blockSignals(True)
         self.image_field_combo.blockSignals(True)
         self.placement_combo.blockSignals(True)
+        self.size_profile_combo.blockSignals(True)
+        self.max_mb_spin.blockSignals(True)
 
         field_names = [f["name"] for f in note_type["flds"]]
         nt_id = str(note_type["id"])
@@ -370,6 +513,12 @@ class SettingsDialog(QDialog):
             index = self.placement_combo.findData(placement)
             if index != -1:
                 self.placement_combo.setCurrentIndex(index)
+
+            # Size profile
+            index = self.size_profile_combo.findData(nt_config.get("image_size_profile", "default"))
+            self.size_profile_combo.setCurrentIndex(max(0, index))
+            max_bytes = _safe_int(nt_config.get("max_image_bytes", 0), 0)
+            self.max_mb_spin.setValue(max(0, max_bytes) / (1024 * 1024))
         else:
             # Defaults
             if self.query_fields_list.count() > 0:
@@ -377,11 +526,15 @@ class SettingsDialog(QDialog):
             if self.image_field_combo.count() > 0:
                 self.image_field_combo.setCurrentIndex(self.image_field_combo.count() - 1)
             self.placement_combo.setCurrentIndex(0)  # 'replace'
+            self.size_profile_combo.setCurrentIndex(0)  # 'default'
+            self.max_mb_spin.setValue(0.0)
 
         # Unblock
         self.query_fields_list.blockSignals(False)
         self.image_field_combo.blockSignals(False)
         self.placement_combo.blockSignals(False)
+        self.size_profile_combo.blockSignals(False)
+        self.max_mb_spin.blockSignals(False)
 
     def save_note_type_config(self, note_type):
         nt_id = str(note_type["id"])
@@ -396,6 +549,8 @@ class SettingsDialog(QDialog):
             "query_fields": query_fields,
             "image_field": image_field,
             "image_placement": placement,
+            "image_size_profile": self.size_profile_combo.currentData(),
+            "max_image_bytes": int(self.max_mb_spin.value() * 1024 * 1024),
         }
         self.nt_dirty = False
 
@@ -404,6 +559,8 @@ class SettingsDialog(QDialog):
         self.query_fields_list.blockSignals(True)
         self.image_field_combo.blockSignals(True)
         self.placement_combo.blockSignals(True)
+        self.size_profile_combo.blockSignals(True)
+        self.max_mb_spin.blockSignals(True)
 
         self.query_fields_list.clearSelection()
         if self.query_fields_list.count() > 0:
@@ -413,11 +570,15 @@ class SettingsDialog(QDialog):
             self.image_field_combo.setCurrentIndex(self.image_field_combo.count() - 1)
 
         self.placement_combo.setCurrentIndex(0)
+        self.size_profile_combo.setCurrentIndex(0)
+        self.max_mb_spin.setValue(0.0)
 
         # Unblock
         self.query_fields_list.blockSignals(False)
         self.image_field_combo.blockSignals(False)
         self.placement_combo.blockSignals(False)
+        self.size_profile_combo.blockSignals(False)
+        self.max_mb_spin.blockSignals(False)
 
         self.mark_nt_dirty()
 
@@ -430,9 +591,111 @@ class SettingsDialog(QDialog):
         self.retries_spin.setValue(5)
         self.backoff_spin.setValue(0.75)
         self.google_fallback_chk.setChecked(True)
+        self.google_depth_spin.setValue(10)
+        self.google_quota_spin.setValue(100)
+        self.local_dir_edit.setText("")
+        self.local_first_chk.setChecked(False)
+        self.local_fallback_chk.setChecked(True)
+        self.reuse_combo.setCurrentIndex(self.reuse_combo.findData("auto"))
         self.mark_net_dirty()
 
+    def choose_local_dir(self):
+        folder = QFileDialog.getExistingDirectory(self, "Local Image Folder", self.local_dir_edit.text())
+        if folder:
+            self.local_dir_edit.setText(folder)
+
     # ----- Common -----
+    # ----- Diagnostics tab logic -----
+    def _diagnostics_extra(self) -> dict:
+        extra = {}
+        try:
+            from . import search
+
+            extra["cache"] = search.get_cache_stats()
+        except Exception:
+            pass
+        try:
+            from .scheduler import SCHEDULER
+
+            extra["scheduler"] = SCHEDULER.stats()
+        except Exception:
+            pass
+        try:
+            extra["bundles"] = utils.bundles().stats()
+        except Exception:
+            pass
+        try:
+            from .local_images import LOCAL_IMAGES
+
+            if LOCAL_IMAGES.enabled:
+                extra["local_images"] = LOCAL_IMAGES.stats()
+        except Exception:
+            pass
+        return extra
+
+    def refresh_diagnostics(self):
+        rows = TIMINGS.summary()
+        self.timings_table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            values = [
+                row["stage"],
+                row["provider"] or "–",
+                row["count"],
+                row["errors"],
+                row["p50_ms"],
+                row["p95_ms"],
+                row["max_ms"],
+            ]
+            for c, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if c >= 2:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.timings_table.setItem(r, c, item)
+        self.timings_table.resizeColumnsToContents()
+
+        extra = self._diagnostics_extra()
+        parts = []
+        cache = extra.get("cache")
+        if cache:
+            parts.append(
+                f"Result cache: {cache['entries']} queries, ~{cache['approx_bytes'] // 1024} KB, "
+                f"{cache['hits']} hits / {cache['misses']} misses"
+            )
+        sched = extra.get("scheduler")
+        if sched:
+            queued = sum(sched["queued"].values())
+            state = "paused" if sched["paused"] else "running"
+            parts.append(f"Background tasks: {sched['running']} running, {queued} queued ({state})")
+        shelf = extra.get("bundles")
+        if shelf and shelf["bundles"]:
+            parts.append(
+                f"Imported bundles: {shelf['bundles']} ({shelf['queries']} queries, {shelf['images']} images)"
+            )
+        local = extra.get("local_images")
+        if local:
+            parts.append(f"Local image folder: {local['files']} images indexed")
+        if not rows:
+            parts.insert(0, "No operations timed yet.")
+        self.diag_stats_label.setText("\n".join(parts))
+
+    def clear_diagnostics(self):
+        TIMINGS.clear()
+        self.refresh_diagnostics()
+
+    def export_diagnostics(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Diagnostics", "imgsearch-diagnostics.json", "JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(TIMINGS.export_json(self._diagnostics_extra()))
+        except OSError as e:
+            utils.report(f"Could not write diagnostics file:\n{e}")
+            return
+        self.status_label.setText(f"Diagnostics exported to {path}.")
+
     def clear_status(self):
         # Defensive guard in case initialization was interrupted.
         if hasattr(self, "status_label") and self.status_label:
@@ -460,6 +723,12 @@ class SettingsDialog(QDialog):
         self.config["max_retries"] = int(self.retries_spin.value())
         self.config["backoff_base_s"] = float(self.backoff_spin.value())
         self.config["google_fallback_to_yandex"] = bool(self.google_fallback_chk.isChecked())
+        self.config["google_result_depth"] = int(self.google_depth_spin.value())
+        self.config["google_daily_quota"] = int(self.google_quota_spin.value())
+        self.config["local_images_dir"] = self.local_dir_edit.text().strip()
+        self.config["local_images_first"] = bool(self.local_first_chk.isChecked())
+        self.config["local_fallback_to_yandex"] = bool(self.local_fallback_chk.isChecked())
+        self.config["reuse_existing_media"] = self.reuse_combo.currentData()
 
         # Clean legacy root-level keys if present
         self.config.pop("query_fields", None)
@@ -471,6 +740,7 @@ class SettingsDialog(QDialog):
             mw.addonManager.writeConfig(__name__, self.config)
             if hasattr(self, "status_label") and self.status_label:
                 self.status_label.setText("Saved.")
+            self.google_quota_label.setText(_google_quota_text())
             self.nt_dirty = False
             self.net_dirty = False
         except Exception:
@@ -487,6 +757,45 @@ def settings_dialog():
     dlg.exec()
 
 
+def arm_profiler():
+    from . import profiling
+
+    profiling.arm()
+    utils.notify("The next image search will be profiled (results go to user_files/profiles).", 4000)
+
+
+def export_cache_bundle():
+    from . import search
+
+    path, _ = QFileDialog.getSaveFileName(
+        mw, "Export Cache Bundle", "imgsearch.imgsearch-bundle", "Image Search bundle (*.imgsearch-bundle)"
+    )
+    if not path:
+        return
+    try:
+        counts = search.export_bundle(path)
+    except Exception as e:
+        utils.report(f"Could not write cache bundle:\n{e}")
+        return
+    utils.notify(f"Exported {counts['queries']} queries and {counts['images']} images.", 4000)
+
+
+def import_cache_bundle():
+    from . import search
+
+    path, _ = QFileDialog.getOpenFileName(
+        mw, "Import Cache Bundle", "", "Image Search bundle (*.imgsearch-bundle);;All files (*)"
+    )
+    if not path:
+        return
+    try:
+        counts = search.import_bundle(path)
+    except (OSError, ValueError) as e:
+        utils.report(f"Could not import cache bundle:\n{e}")
+        return
+    utils.notify(f"Imported {counts['queries']} queries and {counts['images']} images.", 4000)
+
+
 def init_menu():
     global _MENU_INSTALLED
     if _MENU_INSTALLED or (mw and getattr(mw, _MW_MENU_FLAG, False)):
@@ -503,6 +812,18 @@ def init_menu():
     action.setObjectName("imgsearchv3_settings_action")
     qconnect(action.triggered, settings_dialog)
     mw.form.menuTools.addAction(action)
+    profile_action = QAction("Image Search v3: Profile Next Search", mw)
+    profile_action.setObjectName("imgsearchv3_profile_action")
+    qconnect(profile_action.triggered, arm_profiler)
+    mw.form.menuTools.addAction(profile_action)
+    for text, name, handler in (
+        ("Image Search v3: Export Cache Bundle…", "imgsearchv3_export_bundle_action", export_cache_bundle),
+        ("Image Search v3: Import Cache Bundle…", "imgsearchv3_import_bundle_action", import_cache_bundle),
+    ):
+        bundle_action = QAction(text, mw)
+        bundle_action.setObjectName(name)
+        qconnect(bundle_action.triggered, handler)
+        mw.form.menuTools.addAction(bundle_action)
     _MENU_INSTALLED = True
     if mw:
         setattr(mw, _MW_MENU_FLAG, True)
@@ -1,13 +1,26 @@
 # utils.py
 
+import html
+import json
 import os
+import re
 import socket
 import urllib.request
 import urllib.error
 from os.path import dirname, abspath, realpath
 from tempfile import mkstemp
 
-from aqt import mw
+try:
+    from aqt import mw
+except ImportError:  # headless use (see cli.py)
+    mw = None
+
+from .bundle import BundleShelf
+from .download_cache import DownloadCache
+from .phash import PHASHES
+from .results import SIZE_PROFILES, ImageResult
+from .scheduler import PREFETCH, SCHEDULER
+from .timing import DOWNLOAD, MEDIA_ADD, NETWORK_CHECK, timed
 
 CURRENT_DIR = dirname(abspath(realpath(__file__)))
 
@@ -28,8 +41,127 @@ def path_to(*args):
     return os.path.join(CURRENT_DIR, *args)
 
 
+def user_files_path(*args):
+    """
+    Path inside the add-on's user_files folder, which Anki keeps across
+    add-on updates. The folder is created on first use.
+    """
+    folder = path_to("user_files")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, *args)
+
+
+# Config used when the add-on runs outside Anki (see cli.py)
+_STANDALONE_CONFIG = None
+
+
+def default_config() -> dict:
+    """The defaults shipped in config.json."""
+    try:
+        with open(path_to("config.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def set_standalone_config(config: dict | None) -> None:
+    """Config returned by get_config() when Anki's add-on manager is not available."""
+    global _STANDALONE_CONFIG
+    _STANDALONE_CONFIG = config
+
+
 def get_config():
-    return mw.addonManager.getConfig(__name__)
+    global _STANDALONE_CONFIG
+    manager = getattr(mw, "addonManager", None)
+    if manager is not None:
+        return manager.getConfig(__name__)
+    if _STANDALONE_CONFIG is None:
+        _STANDALONE_CONFIG = default_config()
+    return _STANDALONE_CONFIG
+
+
+def addon_version() -> str:
+    """Version from manifest.json ("" when it cannot be read)."""
+    try:
+        with open(path_to("manifest.json"), "r", encoding="utf-8") as f:
+            return str(json.load(f).get("version") or "")
+    except (OSError, ValueError, AttributeError):
+        return ""
+
+
+_DOWNLOAD_CACHE = None
+
+
+def download_cache() -> DownloadCache:
+    """Shared store of image bytes fetched ahead of time (user_files/download_cache)."""
+    global _DOWNLOAD_CACHE
+    if _DOWNLOAD_CACHE is None:
+        _DOWNLOAD_CACHE = DownloadCache(user_files_path("download_cache"))
+    return _DOWNLOAD_CACHE
+
+
+_BUNDLES = None
+
+
+def bundles() -> BundleShelf:
+    """Imported cache bundles (user_files/bundles), newest first."""
+    global _BUNDLES
+    if _BUNDLES is None:
+        _BUNDLES = BundleShelf(user_files_path("bundles"))
+    return _BUNDLES
+
+
+def profile_name() -> str:
+    """Name of the open Anki profile ("" outside Anki)."""
+    try:
+        return mw.pm.name or ""
+    except Exception:
+        return ""
+
+
+def media_file_exists(filename: str) -> bool:
+    try:
+        return os.path.isfile(os.path.join(mw.col.media.dir(), filename))
+    except Exception:
+        return False
+
+
+_IMGSEARCH_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_CLASS_RE = re.compile(r'\bclass="[^"]*\bimgsearch\b[^"]*"', re.IGNORECASE)
+_SRC_RE = re.compile(r'\bsrc="([^"]+)"', re.IGNORECASE)
+
+
+def imgsearch_files(field_html: str) -> list[str]:
+    """Media file names of the add-on's own images (class="imgsearch") in a field."""
+    files = []
+    for tag in _IMGSEARCH_TAG_RE.findall(field_html or ""):
+        if _CLASS_RE.search(tag):
+            src = _SRC_RE.search(tag)
+            if src:
+                files.append(html.unescape(src.group(1)))
+    return files
+
+
+def collection_media_pairs(col) -> list[tuple[str, str]]:
+    """
+    (query, media file name) for every add-on image already in col, using
+    each note's configured query and image fields.
+    """
+    pairs = []
+    for nid in col.find_notes("imgsearch"):
+        try:
+            note = col.get_note(nid)
+            idx = get_note_image_field_index(note, quiet=True)
+            if idx is None:
+                continue
+            query = get_note_query(note, quiet=True)
+        except Exception:
+            continue
+        if not query:
+            continue
+        for filename in imgsearch_files(note.fields[idx]):
+            pairs.append((query, filename))
+    return pairs
 
 
 def report(text: str):
@@ -62,10 +194,11 @@ def notify(text: str, period_ms: int = 2500):
         print(text)
 
 
-def get_note_query(note):
+def get_note_query(note, quiet=False):
     """
     Return the text to search for this note, using per‑notetype config first,
     then global config, with Cloze‑aware and case‑insensitive matching.
+    quiet=True skips the misconfiguration warning (for background callers).
     """
     field_names = mw.col.models.fieldNames(note.model())
     config = get_config()
@@ -113,7 +246,7 @@ def get_note_query(note):
         return note.fields[field_names.index(field_lookup["text"])]
 
     # 4) If config specified fields but none matched, warn once, then fall back
-    if query_fields:
+    if query_fields and not quiet:
         report(
             "Could not find any of the configured query fields in the current note type.\n"
             f"Note Type: {note.model()['name']}\n"
@@ -128,7 +261,7 @@ def get_note_query(note):
     return ""
 
 
-def get_note_image_field_index(note):
+def get_note_image_field_index(note, quiet=False):
     field_names = mw.col.models.fieldNames(note.model())
     config = get_config()
     nt_id = str(note.model()["id"])
@@ -145,18 +278,20 @@ def get_note_image_field_index(note):
             return field_names.index(image_field)
         except ValueError:
             if field_names:
-                report(
-                    f"Could not find the configured image field ('{image_field}') in "
-                    f"the current note type ('{note.model()['name']}').\n"
-                    f"Available fields: {', '.join(field_names)}\n"
-                    f"Falling back to the last field: '{field_names[-1]}'."
-                )
+                if not quiet:
+                    report(
+                        f"Could not find the configured image field ('{image_field}') in "
+                        f"the current note type ('{note.model()['name']}').\n"
+                        f"Available fields: {', '.join(field_names)}\n"
+                        f"Falling back to the last field: '{field_names[-1]}'."
+                    )
                 return len(field_names) - 1
 
-            report(
-                f"Could not find the configured image field ('{image_field}') in the current "
-                f"note type ('{note.model()['name']}'), and no fields are available."
-            )
+            if not quiet:
+                report(
+                    f"Could not find the configured image field ('{image_field}') in the current "
+                    f"note type ('{note.model()['name']}'), and no fields are available."
+                )
             return None
 
     if field_names:
@@ -164,7 +299,31 @@ def get_note_image_field_index(note):
     return None
 
 
+def get_note_image_profile(note):
+    """
+    Return (size_profile, max_bytes) for this note's type.
+    size_profile is one of results.SIZE_PROFILES; max_bytes 0 means no limit.
+    """
+    config = get_config() or {}
+    nt_id = str(note.model()["id"])
+    nt_config = config.get("configs_by_notetype_id", {}).get(nt_id, {})
+
+    profile = (nt_config.get("image_size_profile") or "default").lower()
+    if profile not in SIZE_PROFILES:
+        profile = "default"
+    try:
+        max_bytes = max(0, int(nt_config.get("max_image_bytes", 0) or 0))
+    except (TypeError, ValueError):
+        max_bytes = 0
+    return profile, max_bytes
+
+
 def _network_available() -> bool:
+    with timed(NETWORK_CHECK):
+        return _probe_network()
+
+
+def _probe_network() -> bool:
     original_timeout = socket.getdefaulttimeout()
     try:
         socket.setdefaulttimeout(_NET_CHECK_TIMEOUT_S)
@@ -195,9 +354,14 @@ def _infer_suffix_from_url(url: str) -> str:
     return ".jpg"
 
 
-def _download_bytes(image_url: str, timeout_s: float = 10.0) -> bytes:
+class ImageTooLarge(Exception):
+    pass
+
+
+def _download_bytes(image_url: str, timeout_s: float = 10.0, max_bytes: int = 0) -> bytes:
     """
     Download bytes from image_url using a browser-like header set to avoid 403/blocks.
+    Raises ImageTooLarge when max_bytes > 0 and the body is bigger than that.
     """
     # Build a Request with headers commonly accepted by image CDNs/sites
     req = urllib.request.Request(
@@ -210,27 +374,69 @@ def _download_bytes(image_url: str, timeout_s: float = 10.0) -> bytes:
             "Connection": "keep-alive",
         },
     )
-    with urllib.request.urlopen(req, timeout=timeout_s) as response:
-        return response.read()
+    with timed(DOWNLOAD), urllib.request.urlopen(req, timeout=timeout_s) as response:
+        if not max_bytes:
+            return response.read()
+        try:
+            declared = int(response.headers.get("Content-Length") or 0)
+        except (TypeError, ValueError):
+            declared = 0
+        if declared > max_bytes:
+            raise ImageTooLarge(declared)
+        data = response.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise ImageTooLarge(len(data))
+        return data
+
+
+def _remember_hash(data: bytes, *urls) -> None:
+    """
+    File the image hash under every URL for near-duplicate skipping. A hash
+    already known for one of them (e.g. its thumbnail, hashed ahead of time)
+    is reused; otherwise the full image is decoded in the background.
+    """
+    known = next((value for value in map(PHASHES.get, urls) if value is not None), None)
+    if known is not None:
+        for url in urls:
+            PHASHES.put(url, known)
+        return
+    SCHEDULER.submit(lambda: PHASHES.record(data, *urls), PREFETCH)
 
 
-def save_file_to_library(editor, image_url, prefix, suffix):
+def save_file_to_library(editor, image_url, prefix, suffix, max_bytes=0, hash_urls=()):
     """
     Download image_url to a temp file and add it to Anki media.
+    When near-duplicate skipping is on, the image hash is remembered under
+    image_url and every URL in hash_urls (see _remember_hash()).
     Returns (media_filename, error_code) where error_code is one of:
     - None (success)
     - 'offline' (clear offline case)
     - 'network' (timeout/URLError/HTTPError)
+    - 'too_large' (body exceeds max_bytes)
     - 'unexpected' (any other exception)
     """
-    if not _network_available():
+    # Bytes prefetched in the background (see prefetch_image) skip the network
+    image_binary = None
+    try:
+        image_binary = download_cache().get(image_url)
+        if image_binary is None:
+            image_binary = bundles().image(image_url)
+    except Exception:
+        pass
+    if image_binary is not None and max_bytes and len(image_binary) > max_bytes:
+        return None, "too_large"
+
+    # Images from the local library (file:// URLs) need no network
+    if image_binary is None and not image_url.startswith("file:") and not _network_available():
         return None, "offline"
 
     # Allow the network timeout to be configurable via add-on config, default 10 s
     timeout_s = 10.0
+    hash_images = True
     try:
         cfg = get_config() or {}
         timeout_s = max(1.0, min(120.0, float(cfg.get("request_timeout_s", 10.0))))
+        hash_images = bool(cfg.get("phash_dedupe", True))
     except Exception:
         pass
 
@@ -238,14 +444,22 @@ def save_file_to_library(editor, image_url, prefix, suffix):
     try:
         (i_file, temp_path) = mkstemp(prefix=prefix, suffix=suffix)
         try:
-            image_binary = _download_bytes(image_url, timeout_s=timeout_s)
+            if image_binary is None:
+                image_binary = _download_bytes(image_url, timeout_s=timeout_s, max_bytes=max_bytes)
             os.write(i_file, image_binary)
         finally:
             os.close(i_file)
 
-        result_filename = editor.mw.col.media.addFile(temp_path)
+        if hash_images:
+            _remember_hash(image_binary, image_url, *hash_urls)
+
+        with timed(MEDIA_ADD):
+            result_filename = editor.mw.col.media.addFile(temp_path)
         return result_filename, None
 
+    except ImageTooLarge:
+        return None, "too_large"
+
     except (urllib.error.URLError, urllib.error.HTTPError, socket.timeout):
         return None, "network"
 
@@ -260,23 +474,75 @@ def save_file_to_library(editor, image_url, prefix, suffix):
                 pass
 
 
-def save_image_to_library(editor, image_url):
+def save_image_to_library(editor, image):
     """
+    Save a search result (ImageResult or bare URL) to the media folder.
+    The URL variant is chosen by the note type's image size profile; when a
+    variant is too large or fails to download, the next one is tried.
     Derive a stable filename prefix when possible and pick an extension from the URL.
     Returns (media_filename, error_code) as described in save_file_to_library().
     """
-    if not image_url:
+    if not image:
         return None, "network"
 
-    prefix = "img_"
+    profile, max_bytes = "default", 0
     try:
-        if "id=" in image_url:
-            prefix = image_url.split("id=")[1].split("&")[0] + "_"
+        profile, max_bytes = get_note_image_profile(editor.note)
     except Exception:
         pass
 
-    suffix = _infer_suffix_from_url(image_url)
-    return save_file_to_library(editor, image_url, prefix, suffix)
+    if isinstance(image, ImageResult):
+        candidates = image.candidate_urls(profile, max_bytes)
+        hash_urls = (image.url,)
+    else:
+        candidates = [image]
+        hash_urls = ()
+
+    err = "network"
+    for image_url in candidates:
+        prefix = "img_"
+        try:
+            if "id=" in image_url:
+                prefix = image_url.split("id=")[1].split("&")[0] + "_"
+        except Exception:
+            pass
+
+        suffix = _infer_suffix_from_url(image_url)
+        filename, err = save_file_to_library(
+            editor, image_url, prefix, suffix, max_bytes=max_bytes, hash_urls=hash_urls
+        )
+        if filename or err not in ("too_large", "network"):
+            return filename, err
+    return None, err
+
+
+def prefetch_image(image, profile: str = "default", max_bytes: int = 0) -> bool:
+    """
+    Download the URL save_image_to_library() would try first into the
+    download cache. Safe to call from a background thread; never reports.
+    """
+    if isinstance(image, ImageResult):
+        candidates = image.candidate_urls(profile, max_bytes)
+    else:
+        candidates = [image] if image else []
+    if not candidates:
+        return False
+    url = candidates[0]
+    if url.startswith("file:"):
+        return True
+    cache = download_cache()
+    if url in cache:
+        return True
+    try:
+        cfg = get_config() or {}
+        timeout_s = max(1.0, min(120.0, float(cfg.get("request_timeout_s", 10.0))))
+    except Exception:
+        timeout_s = 10.0
+    try:
+        data = _download_bytes(url, timeout_s=timeout_s, max_bytes=max_bytes)
+    except Exception:
+        return False
+    return cache.put(url, data) is not None
 
 
 def image_tag(image_src):
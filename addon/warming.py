@@ -0,0 +1,223 @@
+# warming.py
+
+import time
+
+from aqt import mw
+
+from . import search
+from . import utils
+from .scheduler import SCHEDULER, WARMING
+
+try:
+    from aqt import gui_hooks
+except Exception:
+    gui_hooks = None
+
+try:
+    from aqt.operations import QueryOp
+except Exception:
+    QueryOp = None
+
+# Idle-time cache warming: while Anki sits on the deck list or a deck
+# overview (not reviewing, not syncing), resolve the queries of notes in the
+# chosen decks that have no add-on image yet, one note per tick, so opening
+# them later in the editor finds their results already cached. The result
+# cache is saved to user_files when the profile closes and loaded again when
+# it opens (then, after an add-on update, rebuilt from the raw payload cache
+# if that is enabled). On the first open of a profile, the index of images
+# the add-on already inserted (see media_index.py) is built from the
+# collection; every open also starts loading (or building) the
+# local_images_dir index in the background. The same hooks pause the shared
+# background scheduler during a sync and while the profile is closed. Warming only fills free
+# room in the result cache; it never evicts entries to make space.
+
+_IDLE_STATES = ("deckBrowser", "overview")
+
+# How long a finished scan is trusted before the decks are searched again
+_RESCAN_AFTER_S = 15 * 60
+
+_INSTALLED = False
+_MW_FLAG = "_imgsearchv3_warming_installed"
+
+_timer = None
+_syncing = False
+_busy = False
+_queue: list = []
+_scanned_at = None
+
+
+def _settings():
+    cfg = utils.get_config() or {}
+    enabled = bool(cfg.get("warm_enabled", False))
+    decks = [d for d in (cfg.get("warm_decks") or []) if isinstance(d, str) and d.strip()]
+    try:
+        rate = max(0.1, min(60.0, float(cfg.get("warm_rate_per_min", 6))))
+    except (TypeError, ValueError):
+        rate = 6.0
+    prefetch = bool(cfg.get("warm_prefetch_images", False))
+    return enabled, decks, rate, prefetch
+
+
+def _is_idle() -> bool:
+    return (
+        not _syncing
+        and getattr(mw, "col", None) is not None
+        and getattr(mw, "state", None) in _IDLE_STATES
+    )
+
+
+def _has_addon_image(note) -> bool:
+    idx = utils.get_note_image_field_index(note, quiet=True)
+    if idx is None:
+        return True  # nowhere to put one; nothing to warm
+    return 'class="imgsearch"' in note.fields[idx]
+
+
+def _scan(decks) -> None:
+    global _queue, _scanned_at
+    _scanned_at = time.monotonic()
+    search_text = " or ".join(f'"deck:{deck}"' for deck in decks)
+    try:
+        _queue = list(mw.col.find_notes(f"({search_text})"))
+    except Exception:
+        _queue = []
+
+
+def _next_query():
+    """Pop notes until one needs warming; return (query, note) or (None, None)."""
+    while _queue:
+        nid = _queue.pop(0)
+        try:
+            note = mw.col.get_note(nid)
+            if _has_addon_image(note):
+                continue
+            query = utils.get_note_query(note, quiet=True)
+        except Exception:
+            continue
+        if search._clean_query(query) and not search.is_cached(query):
+            return query, note
+    return None, None
+
+
+def _tick() -> None:
+    global _busy
+    enabled, decks, _, prefetch = _settings()
+    if not enabled or not decks or _busy or not _is_idle():
+        return
+    # A full cache would evict the user's results to make room for warmed ones
+    if not search.cache_has_room():
+        return
+    if not _queue and (_scanned_at is None or time.monotonic() - _scanned_at > _RESCAN_AFTER_S):
+        _scan(decks)
+    query, note = _next_query()
+    if query is None:
+        return
+
+    profile = None
+    if prefetch:
+        try:
+            profile = utils.get_note_image_profile(note)
+        except Exception:
+            profile = ("default", 0)
+
+    def job():
+        try:
+            result = search.prewarm(query, WARMING)
+            if result is not None and profile is not None:
+                utils.prefetch_image(result, *profile)
+        except Exception:
+            pass
+        finally:
+            mw.taskman.run_on_main(_done)
+
+    _busy = True
+    search._start_background(job, WARMING)
+
+
+def _done() -> None:
+    global _busy
+    _busy = False
+
+
+def restart_timer() -> None:
+    """(Re)start the warming timer at the configured rate; stop it when disabled."""
+    global _timer
+    if _timer is not None:
+        _timer.stop()
+        _timer = None
+    enabled, _, rate, _ = _settings()
+    if not enabled:
+        return
+    _timer = mw.progress.timer(int(60000 / rate), _tick, True, False, parent=mw)
+
+
+def _on_sync_start() -> None:
+    global _syncing
+    _syncing = True
+    SCHEDULER.pause()
+
+
+def _on_sync_finish() -> None:
+    global _syncing
+    _syncing = False
+    SCHEDULER.resume()
+
+
+def _build_media_index() -> None:
+    """
+    Read the collection through Anki's collection op (or on the main thread
+    on versions without it); only the index write goes to the scheduler.
+    """
+    def write(pairs):
+        search._start_background(lambda: search.rebuild_media_index(pairs), WARMING)
+
+    if QueryOp is None:
+        try:
+            write(utils.collection_media_pairs(mw.col))
+        except Exception:
+            pass
+        return
+    QueryOp(parent=mw, op=utils.collection_media_pairs, success=write).failure(lambda _exc: None).run_in_background()
+
+
+def _on_profile_open() -> None:
+    global _queue, _scanned_at, _busy
+    _queue, _scanned_at, _busy = [], None, False
+    SCHEDULER.resume()
+    try:
+        search.load_cache()
+        # After an add-on update, rebuild cached results with the new parsers
+        if search.payloads_need_reparse():
+            search._start_background(search.reparse_payloads, WARMING)
+        if search.reuse_media_mode() != "off" and search.media_index_needs_build():
+            _build_media_index()
+        search.start_local_index()
+    except Exception:
+        pass
+    restart_timer()
+
+
+def _on_profile_close() -> None:
+    global _timer
+    if _timer is not None:
+        _timer.stop()
+        _timer = None
+    # Queued prefetch/warming work would touch a closing collection
+    SCHEDULER.pause()
+    SCHEDULER.clear()
+    search.save_cache()
+
+
+def init_warming():
+    global _INSTALLED
+    if _INSTALLED or (mw and getattr(mw, _MW_FLAG, False)) or not gui_hooks:
+        return
+    gui_hooks.profile_did_open.append(_on_profile_open)
+    gui_hooks.profile_will_close.append(_on_profile_close)
+    gui_hooks.sync_will_start.append(_on_sync_start)
+    gui_hooks.sync_did_finish.append(_on_sync_finish)
+    # Pick up warm_* changes made in Anki's config editor
+    mw.addonManager.setConfigUpdatedAction(__name__, lambda _config: restart_timer())
+    _INSTALLED = True
+    if mw:
+        setattr(mw, _MW_FLAG, True)
@@ -3,7 +3,12 @@ import json
 import time
 import requests
 import urllib.parse
-from aqt import mw
+
+from . import payload_cache, transport
+from .results import PROVIDER_ERROR, ImageResult, ResultList
+from .streamparse import iter_quoted_attr, iter_text
+from .timing import PARSE, PROVIDER_HTTP, stream_span, timed
+from .utils import get_config
 
 # No UI or dialogs here; let the caller decide how/when to notify.
 
@@ -55,7 +60,7 @@ def _get_net_settings():
       - backoff_base_s (float, seconds)
     """
     try:
-        cfg = mw.addonManager.getConfig(__name__) or {}
+        cfg = get_config() or {}
     except Exception:
         cfg = {}
     timeout_s = _safe_float(cfg.get("request_timeout_s", 10.0), 10.0, minimum=1.0, maximum=120.0)
@@ -76,9 +81,12 @@ def get_yimages_response(query: str):
 
     for attempt in range(max_retries + 1):
         try:
-            r = requests.get(url, headers=headers, timeout=timeout_s)
-            r.raise_for_status()
-            return r.json()
+            with timed(PROVIDER_HTTP, "yandex"):
+                r = transport.get(url, headers=headers, timeout=timeout_s)
+                r.raise_for_status()
+                data = r.json()
+            payload_cache.store("yandex", query, 0, r.content)
+            return data
         except requests.exceptions.Timeout:
             # retry on timeout with exponential backoff
             if attempt < max_retries:
@@ -95,9 +103,9 @@ def get_yimages_response(query: str):
 
     return None
 
-def parse_yimages_response(response):
+def parse_yimages_results(response):
     """
-    Returns a list of image URLs on success, or an empty list if
+    Returns a list of ImageResult records on success, or an empty list if
     response is invalid, empty, or cannot be parsed.
     Never shows UI notifications; callers decide how/when to notify.
     """
@@ -121,19 +129,116 @@ def parse_yimages_response(response):
     # Extract URLs from inline JSON in data-bem attributes
     found = re.findall(r"data-bem='{.*?serp-item.*?:(.*?)}'", html)
     for item in (found or []):
+        image = _result_from_serp_item(item)
+        if image:
+            result.append(image)
+
+    return result
+
+def parse_yimages_response(response):
+    """
+    Returns a list of image URLs on success, or an empty list if
+    response is invalid, empty, or cannot be parsed.
+    Never shows UI notifications; callers decide how/when to notify.
+    """
+    return [image.url for image in parse_yimages_results(response)]
+
+def _with_scheme(url):
+    if not url or not isinstance(url, str):
+        return None
+    if url.startswith("//"):
+        return "https:" + url
+    return url
+
+def _result_from_serp_item(item: str):
+    try:
+        item_json = json.loads(item)
+        thumb = item_json.get("thumb") or {}
+        url = thumb.get("url")
+        if not url:
+            return None
+        thumb_url = "https:" + url
+
+        # Sizes are only reported for preview/dup entries, so the largest of
+        # them is the original variant: width, height and byte_size describe
+        # original_url. Without one, img_href is used and its size is unknown.
+        previews = [
+            p for p in (item_json.get("preview") or []) + (item_json.get("dups") or [])
+            if isinstance(p, dict) and _with_scheme(p.get("url"))
+        ]
+        best = max(previews, key=lambda p: (p.get("w") or 0) * (p.get("h") or 0), default={})
+        original_url = _with_scheme(best.get("url")) or _with_scheme(item_json.get("img_href"))
+        snippet = item_json.get("snippet") or {}
+        return ImageResult(
+            thumb_url,
+            thumb_url=thumb_url,
+            original_url=original_url,
+            page_url=_with_scheme(snippet.get("url")),
+            width=best.get("w") or 0,
+            height=best.get("h") or 0,
+            byte_size=best.get("fileSizeInBytes") or 0,
+            provider="yandex",
+        )
+    except Exception:
+        return None
+
+_SERP_ITEM_RE = re.compile(r"^{.*?serp-item.*?:(.*?)}$", re.DOTALL)
+
+def iter_yimages(query: str):
+    """
+    Streaming variant of get_yimage_results(): yields records while the response
+    body is still being downloaded, so the first result is available early.
+    Retries only happen before anything has been yielded; errors end the
+    iteration quietly; the generator's return value is PROVIDER_ERROR when
+    the request failed before anything was yielded.
+    """
+    timeout_s, max_retries, backoff_base_s = _get_net_settings()
+    url = make_yimages_url(query)
+    yielded = False
+
+    for attempt in range(max_retries + 1):
+        span = stream_span(PROVIDER_HTTP, "yandex")
         try:
-            item_json = json.loads(item)
-            thumb = item_json.get("thumb") or {}
-            url = thumb.get("url")
-            if not url:
+            with span.measure():
+                resp = transport.get(url, headers=headers, timeout=timeout_s, stream=True)
+            with resp as r:
+                r.raise_for_status()
+                body = payload_cache.Tee(span.chunks(r.iter_content(chunk_size=8192)), "yandex", query)
+                for bem in iter_quoted_attr(iter_text(body), "data-bem"):
+                    match = _SERP_ITEM_RE.match(bem)
+                    if not match:
+                        continue
+                    image = _result_from_serp_item(match.group(1))
+                    if image:
+                        yielded = True
+                        yield image
+                body.finish()
+            return
+        except requests.exceptions.Timeout:
+            span.finish(ok=False)
+            if not yielded and attempt < max_retries:
+                time.sleep(backoff_base_s * (2 ** attempt))
                 continue
-            image_url = "https:" + url
-            result.append(image_url)
-        except Exception:
-            continue
+            return None if yielded else PROVIDER_ERROR
+        except requests.exceptions.RequestException:
+            span.finish(ok=False)
+            return None if yielded else PROVIDER_ERROR
+        finally:
+            span.finish()
+
+def get_yimage_results(query: str):
+    response = get_yimages_response(query)
+    if response is None:
+        return ResultList(error=PROVIDER_ERROR)
+    with timed(PARSE, "yandex"):
+        return parse_yimages_results(response)
 
-    return result
+def parse_yimages_payload(body: bytes):
+    """parse_yimages_results() for a raw response body (e.g. from the payload cache)."""
+    try:
+        return parse_yimages_results(json.loads(body))
+    except ValueError:
+        return []
 
 def get_yimages(query: str):
-    response = get_yimages_response(query)
-    return parse_yimages_response(response)
+    return [image.url for image in get_yimage_results(query)]
@@ -0,0 +1,112 @@
+# harness.py
+
+import json
+import re
+import shutil
+import sys
+import types
+from pathlib import Path
+
+# Loads the add-on modules outside Anki for benchmarking: anki.utils and
+# aqt.mw are replaced by minimal stand-ins (the same approach as
+# tests/test_search.py), the add-on package is imported without running
+# its __init__.py, and provider endpoints are pointed at a StandInServer.
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+ADDON_DIR = REPO_ROOT / "addon"
+PACKAGE = "addon"
+
+
+class _AddonManager:
+    def __init__(self, config: dict):
+        self.config = config
+
+    def getConfig(self, module):
+        return self.config
+
+    def writeConfig(self, module, config):
+        self.config = config
+
+
+class _Media:
+    """col.media stand-in: addFile() copies into a scratch folder."""
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        folder.mkdir(parents=True, exist_ok=True)
+
+    def addFile(self, path):
+        target = self.folder / Path(path).name
+        shutil.copyfile(path, target)
+        return target.name
+
+
+class FakeEditor:
+    def __init__(self, media_folder: Path):
+        self.mw = types.SimpleNamespace(col=types.SimpleNamespace(media=_Media(media_folder)))
+        self.note = None
+
+
+def _strip_html_media(text: str) -> str:
+    return re.sub(r"<[^>]+>", " ", text or "")
+
+
+def default_config() -> dict:
+    with open(ADDON_DIR / "config.json", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg.update(
+        {
+            "google_api_key": "bench-key",
+            "google_cx": "bench-cx",
+            "google_daily_quota": 100000,
+            "max_retries": 0,
+            "presearch_while_typing": False,
+            "warm_enabled": False,
+            "phash_prefetch": False,
+        }
+    )
+    return cfg
+
+
+def load_addon(config: dict, user_files: Path):
+    """Import search/utils/providers with Anki stand-ins; returns a namespace of modules."""
+    for name in [n for n in sys.modules if n == PACKAGE or n.startswith(PACKAGE + ".")]:
+        del sys.modules[name]
+    anki_utils = types.ModuleType("anki.utils")
+    anki_utils.strip_html_media = _strip_html_media
+    anki = types.ModuleType("anki")
+    anki.utils = anki_utils
+    aqt = types.ModuleType("aqt")
+    aqt.mw = types.SimpleNamespace(addonManager=_AddonManager(config))
+    sys.modules.update({"anki": anki, "anki.utils": anki_utils, "aqt": aqt})
+
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(ADDON_DIR)]
+    sys.modules[PACKAGE] = package
+
+    import importlib
+
+    utils = importlib.import_module(PACKAGE + ".utils")
+    utils.CURRENT_DIR = str(user_files.parent)
+    user_files.mkdir(parents=True, exist_ok=True)
+    modules = {
+        "utils": utils,
+        "search": importlib.import_module(PACKAGE + ".search"),
+        "yimages": importlib.import_module(PACKAGE + ".yimages"),
+        "ddg": importlib.import_module(PACKAGE + ".ddg_hidden_test"),
+        "gimages": importlib.import_module(PACKAGE + ".gimages"),
+        "timing": importlib.import_module(PACKAGE + ".timing"),
+        "transport": importlib.import_module(PACKAGE + ".transport"),
+        "scheduler": importlib.import_module(PACKAGE + ".scheduler"),
+    }
+    return types.SimpleNamespace(**modules)
+
+
+def point_at(addon, base_url: str) -> None:
+    """Send every provider request to the stand-in server."""
+    addon.yimages.BASE_URL = addon.yimages.BASE_URL.replace("https://yandex.ru", base_url + "/yandex")
+    addon.ddg._DDG_SEARCH_URL = base_url + "/ddg/"
+    addon.ddg._DDG_IMAGE_API_URL = base_url + "/ddg/i.js"
+    addon.gimages._BASE_URL = base_url + "/google/customsearch/v1"
+    # The connectivity probe resolves public hosts; keep it local
+    addon.utils._NET_CHECK_HOSTS = ("localhost",)
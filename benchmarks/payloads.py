@@ -0,0 +1,95 @@
+# payloads.py
+
+import json
+import zlib
+
+# Synthetic provider responses shaped like the live ones (the fields each
+# provider parser reads, in the same nesting and encoding), generated
+# deterministically from the query so runs are repeatable.
+
+
+def _seed(query: str) -> int:
+    return zlib.crc32(query.encode("utf-8"))
+
+
+def _dims(seed: int, i: int) -> tuple[int, int]:
+    w = 200 + (seed + i * 97) % 1600
+    h = 150 + (seed + i * 53) % 1200
+    return w, h
+
+
+def image_path(query: str, i: int) -> str:
+    return f"/img/{_seed(query):08x}/{i}.jpg"
+
+
+def yandex(query: str, base: str, count: int) -> bytes:
+    """JSON envelope with serp-item data-bem attributes in blocks[0].html."""
+    seed = _seed(query)
+    host = base.split("://", 1)[1]
+    items = []
+    for i in range(count):
+        w, h = _dims(seed, i)
+        item = {
+            "serp-item": {
+                "thumb": {"url": f"//{host}/thumb/{seed:08x}/{i}.jpg"},
+                "img_href": base + image_path(query, i),
+                "preview": [
+                    {"url": base + image_path(query, i), "w": w, "h": h, "fileSizeInBytes": w * h // 8},
+                ],
+                "dups": [],
+                "snippet": {"url": f"{base}/page/{seed:08x}/{i}"},
+            }
+        }
+        items.append(f"<div class=\"serp-item\" data-bem='{json.dumps(item)}'></div>")
+    body = {"blocks": [{"name": {"block": "serp-list_infinite_yes"}, "html": "".join(items)}]}
+    return json.dumps(body).encode("utf-8")
+
+
+def ddg_html(query: str) -> bytes:
+    return f'<html><script>vqd="4-{_seed(query)}";</script></html>'.encode("utf-8")
+
+
+def ddg_results(query: str, base: str, count: int) -> bytes:
+    seed = _seed(query)
+    results = []
+    for i in range(count):
+        w, h = _dims(seed, i)
+        results.append(
+            {
+                "image": base + image_path(query, i),
+                "thumbnail": f"{base}/thumb/{seed:08x}/{i}.jpg",
+                "url": f"{base}/page/{seed:08x}/{i}",
+                "width": w,
+                "height": h,
+                "title": f"{query} {i}",
+                "source": "Bing",
+            }
+        )
+    return json.dumps({"query": query, "results": results, "next": "i.js?s=100"}).encode("utf-8")
+
+
+def google(query: str, base: str, start: int, count: int) -> bytes:
+    seed = _seed(query)
+    items = []
+    for i in range(start - 1, min(start - 1 + 10, count)):
+        w, h = _dims(seed, i)
+        items.append(
+            {
+                "link": base + image_path(query, i),
+                "mime": "image/jpeg",
+                "image": {
+                    "contextLink": f"{base}/page/{seed:08x}/{i}",
+                    "width": w,
+                    "height": h,
+                    "byteSize": w * h // 8,
+                    "thumbnailLink": f"{base}/thumb/{seed:08x}/{i}.jpg",
+                },
+            }
+        )
+    return json.dumps({"items": items} if items else {}).encode("utf-8")
+
+
+def image_bytes(size: int) -> bytes:
+    """A JPEG-looking body of the requested size (SOI marker, filler, EOI)."""
+    size = max(4, size)
+    return b"\xff\xd8" + b"\x00" * (size - 4) + b"\xff\xd9"
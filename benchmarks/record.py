@@ -0,0 +1,77 @@
+# record.py
+"""
+Record provider responses into gzip cassettes for tests/cassettes (replayed
+by tests/test_parsers.py and transport.use_cassette()).
+
+    python -m benchmarks.record --provider yandex --out tests/cassettes/yandex-live.json.gz cat "red panda"
+    python -m benchmarks.record --provider google --google-key KEY --google-cx CX --out ... cat
+    python -m benchmarks.record --synthetic --out tests/cassettes/synthetic.json.gz cat
+
+--synthetic writes the stand-in server's payloads under the real endpoint
+URLs instead of touching the network. API keys are never stored.
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from . import harness, payloads
+
+_SYNTHETIC_BASE = "https://images.example.com"
+_JSON = {"Content-Type": "application/json; charset=utf-8"}
+_HTML = {"Content-Type": "text/html; charset=utf-8"}
+
+
+def _record_live(addon, provider: str, queries) -> None:
+    fetch = {
+        "yandex": addon.yimages.get_yimage_results,
+        "duckduckgo": addon.ddg.get_ddg_image_results,
+        "google": addon.gimages.getgimage_results,
+    }[provider]
+    for query in queries:
+        results = fetch(query)
+        status = "error" if getattr(results, "error", None) else f"{len(results)} results"
+        print(f"{provider}: {query!r}: {status}")
+
+
+def _record_synthetic(addon, cassette, queries, count: int) -> None:
+    ddg, gimages = addon.ddg, addon.gimages
+    for query in queries:
+        cassette.add(addon.yimages.make_yimages_url(query), None, 200, _JSON,
+                     payloads.yandex(query, _SYNTHETIC_BASE, count))
+        cassette.add(ddg._DDG_SEARCH_URL, {"q": query}, 200, _HTML, payloads.ddg_html(query))
+        vqd = payloads.ddg_html(query).decode().split('vqd="', 1)[1].split('"', 1)[0]
+        cassette.add(ddg._DDG_IMAGE_API_URL, {"q": query, "vqd": vqd, "o": "json"}, 200, _JSON,
+                     payloads.ddg_results(query, _SYNTHETIC_BASE, count))
+        for start in gimages._page_starts(count):
+            cassette.add(gimages._BASE_URL, gimages._search_params("", "", query, start), 200, _JSON,
+                         payloads.google(query, _SYNTHETIC_BASE, start, count))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--out", required=True, help="cassette path (.json.gz); appended to if it exists")
+    parser.add_argument("--provider", default="yandex", choices=["yandex", "duckduckgo", "google"])
+    parser.add_argument("--google-key", default="")
+    parser.add_argument("--google-cx", default="")
+    parser.add_argument("--synthetic", action="store_true", help="write stand-in payloads, no network")
+    parser.add_argument("--results", type=int, default=30, help="results per synthetic response")
+    args = parser.parse_args(argv)
+
+    config = harness.default_config()
+    config.update({"google_api_key": args.google_key, "google_cx": args.google_cx, "stream_results": False})
+    addon = harness.load_addon(config, Path(tempfile.mkdtemp(prefix="imgsearch-record-")) / "user_files")
+    transport = addon.transport
+
+    with transport.use_cassette(args.out, transport.RECORD) as cassette:
+        if args.synthetic:
+            _record_synthetic(addon, cassette, args.queries, args.results)
+        else:
+            _record_live(addon, args.provider, args.queries)
+    print(f"{len(cassette)} responses in {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
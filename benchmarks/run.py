@@ -0,0 +1,189 @@
+# run.py
+"""
+Offline end-to-end benchmark of the search, download and bulk (pre-warm)
+paths against a local stand-in server.
+
+    python -m benchmarks.run --provider yandex --searches 200 --concurrency 4 \
+        --latency-ms 40 --error-rate 0.02 --bandwidth-kbps 2048 --json result.json
+    python -m benchmarks.run --compare result.json     # same run, diffed against a baseline
+
+Needs `requests` (as the add-on does); Anki is not required.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import harness
+from .server import Faults, StandInServer
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(min(rank, len(ordered))) - 1]
+
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+def _phase(name, fn, items, concurrency):
+    latencies, failures = [], 0
+
+    def one(item):
+        start = time.perf_counter()
+        ok = fn(item)
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, ok in pool.map(one, items):
+            latencies.append(seconds)
+            failures += 0 if ok else 1
+    wall = time.perf_counter() - start
+    return {
+        "phase": name,
+        "ops": len(items),
+        "failures": failures,
+        "wall_s": round(wall, 3),
+        "ops_per_s": round(len(items) / wall, 1) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run(args) -> dict:
+    scratch = Path(tempfile.mkdtemp(prefix="imgsearch-bench-"))
+    config = harness.default_config()
+    config["provider"] = args.provider
+    config["stream_results"] = not args.no_stream
+    config["cache_max_entries"] = max(config.get("cache_max_entries", 100), args.searches * 2 + 10)
+    addon = harness.load_addon(config, scratch / "user_files")
+    faults = Faults(args.latency_ms, args.error_rate, args.bandwidth_kbps, args.results, args.image_kb)
+    editor = harness.FakeEditor(scratch / "media")
+    search, utils = addon.search, addon.utils
+
+    phases = []
+    with StandInServer(faults, seed=args.seed) as server:
+        harness.point_at(addon, server.base_url)
+        queries = [f"bench query {i}" for i in range(args.searches)]
+
+        phases.append(_phase("search (miss)", lambda q: bool(search.getresultbyquery(q)), queries, args.concurrency))
+        addon.scheduler.SCHEDULER.wait_idle(30)
+        phases.append(_phase("search (hit)", lambda q: bool(search.getresultbyquery(q)), queries, args.concurrency))
+
+        def download(q):
+            result = search.get_current_result(q)
+            if result is None:
+                return False
+            url = result.original_url or result.url
+            name, err = utils.save_file_to_library(editor, url, "img_", ".jpg")
+            return bool(name) and not err
+
+        phases.append(_phase("download", download, queries[: args.downloads], args.concurrency))
+
+        # Bulk fill: pre-warm a fresh batch through the shared scheduler
+        bulk = [f"bulk query {i}" for i in range(args.searches)]
+        addon.scheduler.SCHEDULER.max_workers = args.concurrency
+        config["background_max_workers"] = args.concurrency
+        start = time.perf_counter()
+        for q in bulk:
+            addon.scheduler.SCHEDULER.submit(lambda q=q: search.prewarm(q, addon.scheduler.WARMING), addon.scheduler.WARMING)
+        addon.scheduler.SCHEDULER.wait_idle(600)
+        wall = time.perf_counter() - start
+        warmed = sum(1 for q in bulk if search.is_cached(q))
+        phases.append(
+            {
+                "phase": "bulk prewarm",
+                "ops": len(bulk),
+                "failures": len(bulk) - warmed,
+                "wall_s": round(wall, 3),
+                "ops_per_s": round(len(bulk) / wall, 1) if wall else 0.0,
+            }
+        )
+        requests_served = server.requests
+
+    return {
+        "settings": {
+            "provider": args.provider,
+            "stream": not args.no_stream,
+            "searches": args.searches,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "bandwidth_kbps": args.bandwidth_kbps,
+            "results": args.results,
+            "image_kb": args.image_kb,
+        },
+        "python": sys.version.split()[0],
+        "phases": phases,
+        "stages": addon.timing.TIMINGS.summary(),
+        "requests_served": requests_served,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _print_report(report, baseline=None):
+    base = {p["phase"]: p for p in (baseline or {}).get("phases", [])}
+    print(f"{'phase':<16}{'ops':>6}{'fail':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for p in report["phases"]:
+        line = (
+            f"{p['phase']:<16}{p['ops']:>6}{p['failures']:>6}{p['ops_per_s']:>10}"
+            f"{p.get('p50_ms', ''):>10}{p.get('p95_ms', ''):>10}"
+        )
+        old = base.get(p["phase"])
+        if old and old.get("ops_per_s"):
+            change = (p["ops_per_s"] - old["ops_per_s"]) / old["ops_per_s"] * 100
+            line += f"   ({change:+.1f}% ops/s vs baseline)"
+        print(line)
+    print(f"\nrequests served: {report['requests_served']}   peak RSS: {report['peak_rss_kb']} KB")
+    print(f"\n{'stage':<16}{'provider':<36}{'count':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for row in report["stages"]:
+        print(f"{row['stage']:<16}{row['provider'][:35]:<36}{row['count']:>6}{row['p50_ms']:>10}{row['p95_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", default="yandex", choices=["yandex", "duckduckgo", "google"])
+    parser.add_argument("--searches", type=int, default=100)
+    parser.add_argument("--downloads", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="0 = unlimited")
+    parser.add_argument("--results", type=int, default=30, help="results per provider response")
+    parser.add_argument("--image-kb", type=float, default=60.0)
+    parser.add_argument("--no-stream", action="store_true", help="disable streaming result parsing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON from an earlier run")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = run(args)
+    _print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
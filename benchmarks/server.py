@@ -0,0 +1,126 @@
+# server.py
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import payloads
+
+# Local stand-in for the Yandex, DuckDuckGo and Google endpoints plus an
+# image host, with injectable latency, error rate and bandwidth limit.
+#
+#   /yandex/images/search?...&text=Q   Yandex JSON (blocks[0].html)
+#   /ddg/?q=Q                          DuckDuckGo HTML carrying a vqd token
+#   /ddg/i.js?q=Q&vqd=...              DuckDuckGo results JSON
+#   /google/customsearch/v1?q=Q        Google CSE items JSON
+#   /img/..., /thumb/...               image bytes
+
+
+class Faults:
+    """Knobs applied to every response; change them between benchmark phases."""
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, bandwidth_kbps=0.0, results=30, image_kb=60):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.bandwidth_kbps = bandwidth_kbps
+        self.results = results
+        self.image_kb = image_kb
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        faults = server.faults
+        with server.lock:
+            server.requests += 1
+            fail = server.rng.random() < faults.error_rate
+        if faults.latency_ms:
+            time.sleep(faults.latency_ms / 1000.0)
+        if fail:
+            return self._send(503, b"unavailable", "text/plain")
+
+        parts = urlsplit(self.path)
+        qs = parse_qs(parts.query)
+        query = (qs.get("text") or qs.get("q") or [""])[0]
+        base = server.base_url
+        path = parts.path
+
+        if path.startswith("/yandex/images/search"):
+            body, ctype = payloads.yandex(query, base, faults.results), "application/json"
+        elif path == "/ddg/":
+            body, ctype = payloads.ddg_html(query), "text/html"
+        elif path == "/ddg/i.js":
+            body, ctype = payloads.ddg_results(query, base, faults.results), "application/json"
+        elif path == "/google/customsearch/v1":
+            start = int((qs.get("start") or ["1"])[0])
+            body, ctype = payloads.google(query, base, start, faults.results), "application/json"
+        elif path.startswith(("/img/", "/thumb/")):
+            size = int(faults.image_kb * 1024) if path.startswith("/img/") else 4096
+            body, ctype = payloads.image_bytes(size), "image/jpeg"
+        else:
+            return self._send(404, b"not found", "text/plain")
+        self._send(200, body, ctype)
+
+    def _send(self, status, body, ctype):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        kbps = self.server.faults.bandwidth_kbps
+        if not kbps:
+            self.wfile.write(body)
+            return
+        chunk = 4096
+        delay = chunk / (kbps * 1024.0)
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i : i + chunk])
+            self.wfile.flush()
+            time.sleep(delay)
+
+
+class StandInServer:
+    """Threaded HTTP server on 127.0.0.1 (random free port) run in the background."""
+
+    def __init__(self, faults: Faults | None = None, seed: int = 0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.faults = faults or Faults()
+        self.httpd.lock = threading.Lock()
+        self.httpd.rng = random.Random(seed)
+        self.httpd.requests = 0
+        self.httpd.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return self.httpd.base_url
+
+    @property
+    def faults(self) -> Faults:
+        return self.httpd.faults
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,12 @@
+import importlib.util
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_addon_module(name):
+    """Load addon/<name>.py on its own, for modules that do not import Anki."""
+    spec = importlib.util.spec_from_file_location(f"addon_{name}", REPO_ROOT / "addon" / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
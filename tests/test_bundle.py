@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+bundle = load_addon_module("bundle")
+cache = load_addon_module("cache")
+
+
+def _entry(provider, query, urls, label="Yandex"):
+    return {
+        "key": [provider, query],
+        "provider": label,
+        "fetched_at": 100.0,
+        "index": 0,
+        "results": [{"url": u} for u in urls],
+    }
+
+
+class BundleTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.shelf = bundle.BundleShelf(os.path.join(self._tmp.name, "bundles"))
+
+    def tearDown(self):
+        self.shelf._reopen()
+        self._tmp.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self._tmp.name, name + bundle.BUNDLE_SUFFIX)
+
+    def test_roundtrip_with_deduplicated_images(self):
+        path = self._path("team")
+        images = [("https://a/1.jpg", b"same"), ("https://b/1.jpg", b"same"), ("https://a/2.png", b"other")]
+        counts = bundle.export_bundle(path, [_entry("yandex", "cat", ["u1", "u2"])], images, {"addon_version": "3.1"})
+        self.assertEqual(counts, {"queries": 1, "images": 2, "image_urls": 3})
+
+        self.assertEqual(self.shelf.install(path), {"queries": 1, "images": 2})
+        self.assertEqual(self.shelf.lookup("yandex", "cat"), ("Yandex", 100.0, [{"url": "u1"}, {"url": "u2"}]))
+        self.assertIsNone(self.shelf.lookup("ddg", "cat"))
+        self.assertEqual(self.shelf.image("https://b/1.jpg"), b"same")
+        self.assertIsNone(self.shelf.image("https://c/1.jpg"))
+        self.assertEqual(self.shelf.stats(), {"bundles": 1, "queries": 1, "images": 2})
+
+    def test_cache_entries_export(self):
+        qc = cache.QueryCache()
+        qc.put(("yandex", "cat"), ["u1"], "Yandex")
+        qc.put(("yandex", "none"), [], "Yandex", reason="no_results")
+        entries = qc.export_entries(lambda r: {"url": r})
+        self.assertEqual([e["key"] for e in entries], [["yandex", "cat"]])
+
+        path = self._path("cache")
+        bundle.export_bundle(path, entries, [])
+        self.shelf.install(path)
+        self.assertEqual(self.shelf.lookup("yandex", "cat")[2], [{"url": "u1"}])
+
+        other = cache.QueryCache()
+        self.assertEqual(other.import_entries(entries, lambda d: d["url"]), 1)
+        self.assertEqual(other.peek(("yandex", "cat")).results, ["u1"])
+
+    def test_newest_bundle_wins_and_reinstall_is_idempotent(self):
+        old, new = self._path("old"), self._path("new")
+        bundle.export_bundle(old, [_entry("yandex", "cat", ["old"])], [])
+        bundle.export_bundle(new, [_entry("yandex", "cat", ["new"])], [])
+        self.shelf.install(old)
+        for name in self.shelf._names():
+            os.utime(os.path.join(self.shelf.folder, name), (1, 1))
+        self.shelf.install(new)
+        self.assertEqual(self.shelf.lookup("yandex", "cat")[2], [{"url": "new"}])
+        # Importing the same file again only moves it to the front
+        for name in self.shelf._names():
+            os.utime(os.path.join(self.shelf.folder, name), (1, 1))
+        self.shelf.install(old)
+        self.assertEqual(len(self.shelf._names()), 2)
+        self.assertEqual(self.shelf.lookup("yandex", "cat")[2], [{"url": "old"}])
+        self.assertEqual(self.shelf.clear(), 2)
+        self.assertIsNone(self.shelf.lookup("yandex", "cat"))
+
+    def test_rejects_files_that_are_not_bundles(self):
+        junk = self._path("junk")
+        with open(junk, "wb") as f:
+            f.write(b"not sqlite at all" * 10)
+        with self.assertRaises(ValueError):
+            self.shelf.install(junk)
+        other = self._path("other")
+        conn = sqlite3.connect(other)
+        conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO meta VALUES ('version', '99')")
+        conn.commit()
+        conn.close()
+        with self.assertRaises(ValueError):
+            self.shelf.install(other)
+        self.assertEqual(self.shelf._names(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+cache = load_addon_module("cache")
+results = load_addon_module("results")
+
+
+def _records(n, prefix="u"):
+    return [results.ImageResult(f"https://example.com/{prefix}{i}.jpg") for i in range(n)]
+
+
+class QueryCacheTests(unittest.TestCase):
+    def test_byte_bound_evicts_oldest(self):
+        qc = cache.QueryCache(max_entries=100, max_bytes=0)
+        qc.put("a", _records(10), "Yandex")
+        one_entry = qc.stats()["approx_bytes"]
+        qc.max_bytes = int(one_entry * 2.5)
+        qc.put("b", _records(10), "Yandex")
+        qc.put("c", _records(10), "Yandex")
+        self.assertNotIn("a", qc)
+        self.assertEqual(len(qc), 2)
+        self.assertEqual(qc.stats()["evictions"], 1)
+
+    def test_free_slots_counts_entries_and_bytes(self):
+        qc = cache.QueryCache(max_entries=3, max_bytes=0)
+        self.assertEqual(qc.free_slots(), 3)
+        qc.put("a", _records(2), "Yandex")
+        self.assertEqual(qc.free_slots(), 2)
+        qc.max_bytes = qc.stats()["approx_bytes"]
+        self.assertEqual(qc.free_slots(), 0)
+
+    def test_append_grows_entry_and_step_clamps(self):
+        qc = cache.QueryCache()
+        entry = qc.put("k", _records(1), "Yandex")
+        before = qc.stats()["approx_bytes"]
+        qc.append(entry, results.ImageResult("https://example.com/extra.jpg"))
+        self.assertGreater(qc.stats()["approx_bytes"], before)
+        self.assertEqual(qc.step("k", 5).url, "https://example.com/extra.jpg")
+        self.assertEqual(qc.step("k", -5).url, "https://example.com/u0.jpg")
+
+    def test_invalid_entry_counts_as_miss(self):
+        qc = cache.QueryCache()
+        qc.put("k", [], "Yandex", reason="no_results")
+        self.assertIsNone(qc.get("k", valid=lambda e: bool(e.results)))
+        self.assertEqual(qc.stats()["misses"], 1)
+
+    def test_concurrent_use_keeps_bounds(self):
+        qc = cache.QueryCache(max_entries=20)
+
+        def worker(n):
+            for i in range(200):
+                entry = qc.put((n, i), _records(2), "Yandex")
+                qc.append(entry, results.ImageResult("https://example.com/x.jpg"))
+                qc.get((n, i - 1))
+                qc.step((n, i), 1)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(qc), 20)
+        expected = sum(qc.peek(k).size for k in qc.keys())
+        self.assertEqual(qc.stats()["approx_bytes"], expected)
+
+
+    def test_save_and_load_roundtrip(self):
+        qc = cache.QueryCache()
+        qc.put(("yandex", "a"), _records(3, "a"), "Yandex")
+        qc.put(("yandex", "empty"), [], "Yandex", reason="no_results")
+        qc.put(("yandex", "b"), _records(2, "b"), "Yandex")
+        qc.step(("yandex", "a"), 1)
+        qc.peek(("yandex", "a")).fetched_at -= 100
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.json")
+            self.assertEqual(qc.save(path, results.ImageResult.to_dict), 2)
+            fresh = cache.QueryCache()
+            fresh.put(("yandex", "live"), _records(1, "live"), "Yandex")
+            self.assertEqual(fresh.load(path, results.ImageResult.from_dict), 2)
+        entry = fresh.peek(("yandex", "a"))
+        self.assertEqual(entry.current().url, "https://example.com/a1.jpg")
+        self.assertGreaterEqual(entry.age(), 100)
+        self.assertNotIn(("yandex", "empty"), fresh)
+        # Loaded entries are evicted before the ones used this session
+        self.assertEqual(fresh.keys()[-1], ("yandex", "live"))
+
+    def test_load_ignores_missing_or_foreign_files(self):
+        qc = cache.QueryCache()
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(qc.load(os.path.join(tmp, "none.json"), results.ImageResult.from_dict), 0)
+            path = os.path.join(tmp, "other.json")
+            with open(path, "w") as f:
+                f.write('{"version": 99, "entries": []}')
+            self.assertEqual(qc.load(path, results.ImageResult.from_dict), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import importlib
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+CASSETTE = REPO_ROOT / "tests" / "cassettes" / "synthetic.json.gz"
+
+
+def _load_cli():
+    """Import addon.cli the way `python -m addon.cli` does: real package, no Anki."""
+    for name in [n for n in sys.modules if n in ("addon", "aqt", "anki") or n.startswith(("addon.", "aqt.", "anki."))]:
+        del sys.modules[name]
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    return importlib.import_module("addon.cli")
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class CliTests(unittest.TestCase):
+    def setUp(self):
+        self.cli = _load_cli()
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cli.utils.set_standalone_config(None)
+        self._tmp.cleanup()
+
+    def _run(self, *argv, stdin=""):
+        out = os.path.join(self._tmp.name, "out.jsonl")
+        real_stdin, real_stderr = sys.stdin, sys.stderr
+        sys.stdin, sys.stderr = io.StringIO(stdin), io.StringIO()
+        try:
+            code = self.cli.main(["-o", out, "--rate", "0", *argv])
+        finally:
+            sys.stdin, sys.stderr = real_stdin, real_stderr
+        with open(out, encoding="utf-8") as f:
+            return code, [json.loads(line) for line in f]
+
+    def test_package_imports_without_anki(self):
+        self.assertNotIn("aqt", sys.modules)
+        self.assertIsNone(self.cli.utils.mw)
+        self.assertEqual(self.cli.utils.get_config()["provider"], "yandex")
+
+    def test_replayed_queries_stream_jsonl(self):
+        code, records = self._run("--replay", str(CASSETTE), "--limit", "3", "--concurrency", "3",
+                                  stdin="cat\n# skipped\n\nred panda\nnever recorded\n")
+        self.assertEqual(code, 0)
+        by_query = {r["query"]: r for r in records}
+        self.assertEqual(sorted(by_query), ["cat", "never recorded", "red panda"])
+        self.assertEqual(by_query["red panda"]["line"], 4)
+        self.assertEqual(by_query["cat"]["provider"], "Yandex")
+        self.assertIsNone(by_query["cat"]["error"])
+        self.assertEqual(len(by_query["cat"]["results"]), 3)
+        self.assertTrue(by_query["cat"]["results"][0]["url"].startswith("https://"))
+        self.assertEqual(by_query["never recorded"]["results"], [])
+        self.assertIsNotNone(by_query["never recorded"]["error"])
+
+    def test_flags_override_config(self):
+        queries = os.path.join(self._tmp.name, "words.txt")
+        with open(queries, "w", encoding="utf-8") as f:
+            f.write("cat\n")
+        _, records = self._run(queries, "--replay", str(CASSETTE), "--provider", "ddg")
+        self.assertEqual(records[0]["provider"], "DuckDuckGo")
+        self.assertEqual(self.cli.utils.get_config()["provider"], "ddg")
+
+    def test_profile_covers_worker_threads(self):
+        folder = os.path.join(self._tmp.name, "profiles")
+        code, records = self._run("--replay", str(CASSETTE), "--concurrency", "2", "--profile", folder,
+                                  stdin="cat\nred panda\n")
+        self.assertEqual(code, 0)
+        self.assertEqual(len(records), 2)
+        names = os.listdir(folder)
+        prof = [n for n in names if n.endswith("-batch.prof")]
+        self.assertEqual(len(prof), 1)
+        # Queries run on the pool's threads, not the one that started the batch
+        stats = pstats.Stats(os.path.join(folder, prof[0]))
+        self.assertTrue(any(func[2] == "run_query" for func in stats.stats))
+        summary = [n for n in names if n.endswith("-summary.txt")]
+        with open(os.path.join(folder, summary[0]), encoding="utf-8") as f:
+            self.assertIn("Threads profiled:", f.read())
+
+    def test_local_provider_answers_from_first_query(self):
+        library = os.path.join(self._tmp.name, "library")
+        os.makedirs(library)
+        with open(os.path.join(library, "red_panda.jpg"), "wb") as f:
+            f.write(b"img")
+        self.cli.utils.user_files_path = lambda *parts: os.path.join(self._tmp.name, "user_files", *parts)
+        _, records = self._run("--provider", "local", "--local-dir", library, stdin="red panda\n")
+        self.assertEqual(records[0]["provider"], "Local library")
+        self.assertTrue(records[0]["results"][0]["url"].endswith("red_panda.jpg"))
+
+    def test_download_first_saves_first_working_variant(self):
+        source = os.path.join(self._tmp.name, "source.png")
+        with open(source, "wb") as f:
+            f.write(b"\x89PNG fake")
+        ImageResult = self.cli.search.ImageResult
+        broken = ImageResult(Path(self._tmp.name, "missing.jpg").as_uri())
+        working = ImageResult(Path(source).as_uri())
+        folder = os.path.join(self._tmp.name, "images")
+        os.makedirs(folder)
+        path, url = self.cli.download_first([broken, working], folder, "Red panda!", "default", 0, 5.0)
+        self.assertEqual(url, working.url)
+        self.assertTrue(os.path.basename(path).startswith("Red_panda_"))
+        self.assertTrue(path.endswith(".png"))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"\x89PNG fake")
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = self.cli.RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 3 / 50 - 0.005)
+        unlimited = self.cli.RateLimiter(0)
+        start = time.monotonic()
+        for _ in range(100):
+            unlimited.wait()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+download_cache = load_addon_module("download_cache")
+
+
+class DownloadCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self._tmp.name, "download_cache")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_roundtrip_is_content_addressed(self):
+        cache = download_cache.DownloadCache(self.folder)
+        digest = cache.put("https://a/1.jpg", b"same")
+        cache.put("https://b/1.jpg", b"same")
+        self.assertEqual(digest, hashlib.sha256(b"same").hexdigest())
+        self.assertEqual(cache.get("https://b/1.jpg"), b"same")
+        self.assertIn("https://a/1.jpg", cache)
+        self.assertEqual(len([n for n in os.listdir(self.folder) if n != "index.json"]), 1)
+        # A new instance reads the persisted index
+        cache.flush()
+        self.assertEqual(download_cache.DownloadCache(self.folder).get("https://b/1.jpg"), b"same")
+
+    def test_size_bound_evicts_oldest(self):
+        cache = download_cache.DownloadCache(self.folder, max_bytes=25)
+        cache.put("u1", b"a" * 10)
+        old = os.path.join(self.folder, hashlib.sha256(b"a" * 10).hexdigest())
+        os.utime(old, (1, 1))
+        cache.put("u2", b"b" * 10)
+        cache.put("u3", b"c" * 10)
+        self.assertIsNone(cache.get("u1"))
+        self.assertEqual(cache.get("u3"), b"c" * 10)
+        self.assertLessEqual(cache.total_bytes(), 25)
+        self.assertIsNone(cache.put("huge", b"x" * 26))
+
+    def test_puts_use_in_memory_sizes_and_batch_index_writes(self):
+        cache = download_cache.DownloadCache(self.folder)
+        cache.put("u0", b"0" * 10)
+        scans = []
+        files = cache._files
+        cache._files = lambda: scans.append(1) or files()
+        for i in range(1, 5):
+            cache.put(f"u{i}", str(i).encode() * 10)
+        self.assertEqual(scans, [])
+        self.assertEqual(cache.total_bytes(), 50)
+        # Written right away once, then held back until flush()
+        self.assertIsNone(download_cache.DownloadCache(self.folder).get("u4"))
+        cache.flush()
+        self.assertEqual(download_cache.DownloadCache(self.folder).get("u4"), b"4" * 10)
+
+    def test_corrupt_file_is_a_miss(self):
+        cache = download_cache.DownloadCache(self.folder)
+        digest = cache.put("u", b"data")
+        with open(os.path.join(self.folder, digest), "wb") as f:
+            f.write(b"tampered")
+        self.assertIsNone(cache.get("u"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+local_images = load_addon_module("local_images")
+
+
+class LocalImageIndexTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmp.name, "library")
+        self.index_path = os.path.join(self._tmp.name, "index.json")
+        os.makedirs(os.path.join(self.root, "animals"))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, rel, data=b"img"):
+        path = os.path.join(self.root, rel)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _index(self):
+        index = local_images.LocalImageIndex(refresh_interval_s=0)
+        index.configure(self.root, self.index_path)
+        return index
+
+    def _names(self, matches):
+        return [os.path.relpath(m["path"], self.root) for m in matches]
+
+    def test_tokenize(self):
+        self.assertEqual(local_images.tokenize("RedPanda_02-small"), ["red", "panda", "02", "small"])
+        self.assertEqual(local_images.tokenize("Ärger über"), ["ärger", "über"])
+
+    def test_filename_folder_and_sidecar_tokens(self):
+        self._write("animals/red_panda.jpg")
+        self._write("animals/cat_and_dog.png")
+        self._write("animals/cat.jpg")
+        self._write("IMG_0042.jpg")
+        with open(os.path.join(self.root, "IMG_0042.txt"), "w", encoding="utf-8") as f:
+            f.write("kitten, cat, fluffy")
+        self._write("notes.txt")
+        index = self._index()
+
+        self.assertEqual(self._names(index.search("Red Panda")), [os.path.join("animals", "red_panda.jpg")])
+        # Fewer unrelated words first
+        self.assertEqual(
+            self._names(index.search("cat")),
+            [os.path.join("animals", "cat.jpg"), os.path.join("animals", "cat_and_dog.png"), "IMG_0042.jpg"],
+        )
+        self.assertEqual(self._names(index.search("kitten")), ["IMG_0042.jpg"])
+        self.assertEqual(len(index.search("animals")), 3)
+        self.assertEqual(index.search("notes"), [])
+        match = index.search("panda")[0]
+        self.assertEqual((match["mime"], match["byte_size"]), ("image/jpeg", 3))
+
+    def test_incremental_refresh_and_persistence(self):
+        cat = self._write("animals/cat.jpg")
+        self._write("animals/dog.jpg")
+        index = self._index()
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.refresh(), 0)
+
+        os.unlink(cat)
+        self._write("animals/bird.jpg")
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.search("cat"), [])
+        self.assertEqual(len(index.search("bird")), 1)
+
+        with open(self.index_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(sorted(saved["files"]), [os.path.join("animals", n) for n in ("bird.jpg", "dog.jpg")])
+        # A new instance only re-reads what changed since the saved index
+        reopened = self._index()
+        self.assertEqual(reopened.refresh(), 0)
+        self.assertEqual(len(reopened.search("dog")), 1)
+        sidecar = os.path.join(self.root, "animals", "dog.txt")
+        with open(sidecar, "w", encoding="utf-8") as f:
+            f.write("puppy")
+        self.assertEqual(reopened.refresh(), 1)
+        self.assertEqual(len(reopened.search("puppy")), 1)
+
+    def test_refresh_is_throttled(self):
+        self._write("animals/cat.jpg")
+        index = local_images.LocalImageIndex(refresh_interval_s=3600)
+        index.configure(self.root, self.index_path)
+        self.assertEqual(len(index.search("cat")), 1)
+        self._write("animals/cow.jpg")
+        self.assertEqual(index.search("cow"), [])
+        self.assertEqual(index.refresh(force=True), 1)
+        self.assertEqual(len(index.search("cow")), 1)
+
+    def test_require_all_words(self):
+        self._write("animals/red_car.jpg")
+        self._write("animals/red_apple.jpg")
+        index = self._index()
+        self.assertEqual(len(index.search("red apple")), 2)
+        self.assertEqual(self._names(index.search("red apple", require_all=True)), [os.path.join("animals", "red_apple.jpg")])
+        self.assertEqual(index.search("red pear", require_all=True), [])
+
+    def test_due_refresh_is_handed_to_spawn(self):
+        self._write("animals/cat.jpg")
+        spawned = []
+        index = local_images.LocalImageIndex(refresh_interval_s=0)
+        index.configure(self.root, self.index_path, spawn=spawned.append)
+        # The first build is spawned too; nothing is found until it is done
+        self.assertEqual(index.search("cat"), [])
+        self.assertFalse(index.ready)
+        self.assertEqual(len(spawned), 1)
+        # Searches meanwhile do not queue another build
+        index.search("cat")
+        self.assertEqual(len(spawned), 1)
+        spawned.pop()()
+        self.assertTrue(index.ready)
+        self.assertEqual(len(index.search("cat")), 1)
+        spawned.pop()()
+        self._write("animals/cow.jpg")
+        # Later refreshes are spawned; the search answers from the current index
+        self.assertEqual(index.search("cow"), [])
+        self.assertEqual(len(spawned), 1)
+        spawned.pop()()
+        self.assertEqual(len(index.search("cow")), 1)
+
+        # A new instance loads the saved index through spawn as well
+        reopened = local_images.LocalImageIndex(refresh_interval_s=0)
+        reopened.configure(self.root, self.index_path, spawn=spawned.append)
+        spawned.clear()
+        reopened.start()
+        self.assertEqual(len(spawned), 1)
+        spawned.pop()()
+        self.assertEqual(len(reopened.search("cow")), 1)
+
+    def test_disabled_without_folder(self):
+        index = local_images.LocalImageIndex()
+        self.assertFalse(index.enabled)
+        self.assertEqual(index.search("cat"), [])
+        index.configure(os.path.join(self._tmp.name, "missing"), self.index_path)
+        self.assertEqual(index.search("cat"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+media_index = load_addon_module("media_index")
+
+
+class MediaIndexTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "media_index", "User 1.json")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_most_recent_file_per_normalized_query(self):
+        index = media_index.MediaIndex(self.path)
+        self.assertFalse(index.exists_on_disk())
+        index.add("Red  Panda", "panda_1.jpg")
+        index.add("red panda", "panda_2.jpg")
+        index.add("red panda", "panda_1.jpg")
+        self.assertEqual(index.lookup("RED PANDA"), "panda_1.jpg")
+        self.assertIsNone(index.lookup("panda"))
+        # Persisted
+        reopened = media_index.MediaIndex(self.path)
+        self.assertTrue(reopened.exists_on_disk())
+        self.assertEqual(reopened.lookup("red panda"), "panda_1.jpg")
+        self.assertEqual(reopened.stats(), {"queries": 1, "files": 2})
+
+    def test_missing_files_are_skipped_and_dropped(self):
+        index = media_index.MediaIndex(self.path)
+        index.add("cat", "old.jpg")
+        index.add("cat", "deleted.jpg")
+        self.assertEqual(index.lookup("cat", exists=lambda f: f != "deleted.jpg"), "old.jpg")
+        self.assertEqual(index.stats()["files"], 1)
+        self.assertIsNone(index.lookup("cat", exists=lambda f: False))
+        self.assertEqual(media_index.MediaIndex(self.path).stats(), {"queries": 0, "files": 0})
+
+    def test_rebuild_and_per_query_limit(self):
+        index = media_index.MediaIndex(self.path)
+        index.add("stale", "gone.jpg")
+        pairs = [("dog", f"dog_{i}.jpg") for i in range(media_index.MAX_FILES_PER_QUERY + 3)]
+        self.assertEqual(index.rebuild(pairs + [("", "x.jpg"), ("bird", "")]), 1)
+        self.assertIsNone(index.lookup("stale"))
+        self.assertEqual(index.lookup("dog"), f"dog_{media_index.MAX_FILES_PER_QUERY + 2}.jpg")
+        self.assertEqual(index.stats()["files"], media_index.MAX_FILES_PER_QUERY)
+
+    def test_disabled_without_path(self):
+        index = media_index.MediaIndex()
+        index.add("cat", "cat.jpg")
+        self.assertIsNone(index.lookup("cat"))
+        self.assertEqual(index.rebuild([("cat", "cat.jpg")]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
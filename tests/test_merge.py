@@ -0,0 +1,54 @@
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+merge = load_addon_module("merge")
+results = load_addon_module("results")
+
+
+class CanonicalUrlTests(unittest.TestCase):
+    def test_scheme_host_and_tracking_params(self):
+        self.assertEqual(
+            merge.canonical_url("http://Example.COM/a.jpg?utm_source=x&b=2&fbclid=y&a=1#frag"),
+            "https://example.com/a.jpg?a=1&b=2",
+        )
+
+    def test_proxy_is_unwrapped(self):
+        wrapped = "https://external-content.duckduckgo.com/iu/?u=http%3A%2F%2Fexample.com%2Fa.jpg&f=1"
+        self.assertEqual(merge.canonical_url(wrapped), "https://example.com/a.jpg")
+
+    def test_size_suffixes_are_stripped(self):
+        self.assertEqual(
+            merge.canonical_url("https://example.com/wp/cat-300x200.jpg"),
+            "https://example.com/wp/cat.jpg",
+        )
+        self.assertEqual(
+            merge.canonical_url("https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Cat.jpg/220px-Cat.jpg"),
+            "https://upload.wikimedia.org/wikipedia/commons/a/ab/Cat.jpg",
+        )
+
+
+class DedupeTests(unittest.TestCase):
+    def test_duplicates_dropped_and_metadata_merged(self):
+        first = results.ImageResult("http://example.com/a.jpg")
+        dup = results.ImageResult("https://example.com/a-640x480.jpg", width=640, height=480)
+        other = results.ImageResult("https://example.com/b.jpg")
+        kept = merge.dedupe([first, dup, other])
+        self.assertEqual(kept, [first, other])
+        self.assertEqual((first.width, first.height), (640, 480))
+
+    def test_original_url_links_records(self):
+        a = results.ImageResult("https://thumbs.example/1", original_url="https://example.com/a.jpg")
+        b = results.ImageResult("https://example.com/a.jpg?utm_medium=x")
+        self.assertEqual(merge.dedupe([a, b]), [a])
+
+    def test_interleave_round_robin(self):
+        y = [results.ImageResult(u) for u in ("https://y/1", "https://y/2", "https://y/3")]
+        d = [results.ImageResult(u) for u in ("https://d/1", "http://y/2")]
+        merged = merge.interleave(y, d)
+        self.assertEqual([r.url for r in merged], ["https://y/1", "https://d/1", "https://y/2", "https://y/3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
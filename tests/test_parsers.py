@@ -0,0 +1,296 @@
+import gzip
+import importlib
+import json
+import sys
+import tempfile
+import time
+import types
+import unittest
+import urllib.parse
+from pathlib import Path
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+# Provider parsers run against every response in tests/cassettes/*.json.gz
+# (recorded with `python -m benchmarks.record`), both directly and end to end
+# through the providers with the cassette replayed, with a time budget per
+# payload so parser slowdowns show up as failures.
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+CASSETTES = sorted((REPO_ROOT / "tests" / "cassettes").glob("*.json.gz"))
+
+# Best-of-3 parse time allowed per payload: a fixed part plus a per-MB part
+_BUDGET_BASE_S = 0.02
+_BUDGET_PER_MB_S = 0.25
+
+
+def _load_providers(config, user_files):
+    for name in [n for n in sys.modules if n == "addon" or n.startswith("addon.")]:
+        del sys.modules[name]
+    anki_utils = types.ModuleType("anki.utils")
+    anki_utils.strip_html_media = lambda s: s
+    anki = types.ModuleType("anki")
+    anki.utils = anki_utils
+    aqt = types.ModuleType("aqt")
+    aqt.mw = types.SimpleNamespace(
+        addonManager=types.SimpleNamespace(getConfig=lambda _name: config, writeConfig=lambda *_: None)
+    )
+    sys.modules.update({"anki": anki, "anki.utils": anki_utils, "aqt": aqt})
+    package = types.ModuleType("addon")
+    package.__path__ = [str(REPO_ROOT / "addon")]
+    sys.modules["addon"] = package
+
+    utils = importlib.import_module("addon.utils")
+    utils.CURRENT_DIR = user_files
+    return types.SimpleNamespace(
+        yimages=importlib.import_module("addon.yimages"),
+        ddg=importlib.import_module("addon.ddg_hidden_test"),
+        gimages=importlib.import_module("addon.gimages"),
+        transport=importlib.import_module("addon.transport"),
+    )
+
+
+def _interactions():
+    for path in CASSETTES:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for item in json.load(f)["interactions"]:
+                yield path.name, item
+
+
+def _kind(url):
+    if "/images/search" in url:
+        return "yandex"
+    if url.split("?", 1)[0].endswith("/i.js"):
+        return "duckduckgo"
+    if "/customsearch/" in url:
+        return "google"
+    return None
+
+
+def _query_of(url):
+    params = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    return (params.get("text") or params.get("q") or [""])[0]
+
+
+def _best_of(fn, runs=3):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class CassetteParserTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.config = {
+            "max_retries": 0,
+            "google_api_key": "test-key",
+            "google_cx": "test-cx",
+            "google_result_depth": 10,
+            "google_daily_quota": 100000,
+            "ddg_vqd_ttl_s": 0,
+        }
+        cls.p = _load_providers(cls.config, cls._tmp.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def _parse(self, kind, body):
+        data = json.loads(body)
+        if kind == "yandex":
+            return self.p.yimages.parse_yimages_results(data)
+        if kind == "duckduckgo":
+            return self.p.ddg.parse_ddg_results(data)
+        return self.p.gimages.parse_gimages_response(data)
+
+    def test_corpus_is_present(self):
+        self.assertTrue(CASSETTES, "tests/cassettes has no recordings")
+        kinds = {_kind(item["request"]) for _, item in _interactions()}
+        self.assertLessEqual({"yandex", "duckduckgo", "google"}, kinds)
+
+    def test_every_payload_parses_within_budget(self):
+        for name, item in _interactions():
+            kind = _kind(item["request"])
+            if kind is None or item.get("status", 200) != 200 or "text" not in item:
+                continue
+            body = item["text"]
+            with self.subTest(cassette=name, request=item["request"][:120]):
+                results, seconds = _best_of(lambda: self._parse(kind, body))
+                if kind == "google" and not json.loads(body).get("items"):
+                    self.assertEqual(list(results), [])
+                    continue
+                self.assertTrue(results, "parser found no results")
+                for image in results:
+                    self.assertTrue(image.url.startswith(("http://", "https://")), image.url)
+                    self.assertEqual(image.provider, kind)
+                budget = _BUDGET_BASE_S + _BUDGET_PER_MB_S * len(body) / 1e6
+                self.assertLess(seconds, budget, f"{kind} parse took {seconds * 1000:.1f} ms")
+
+    def test_replayed_providers_match_parsers_streaming_or_not(self):
+        p = self.p
+        providers = {
+            "yandex": (p.yimages.get_yimage_results, p.yimages.iter_yimages),
+            "duckduckgo": (p.ddg.get_ddg_image_results, p.ddg.iter_ddg_images),
+            "google": (p.gimages.getgimage_results, p.gimages.itergimages),
+        }
+        for path in CASSETTES:
+            with p.transport.use_cassette(str(path)) as cassette:
+                for key in cassette.keys():
+                    kind = _kind(key)
+                    if kind is None or "start=" in key:
+                        continue
+                    query = _query_of(key[4:])
+                    fetch, stream = providers[kind]
+                    with self.subTest(cassette=path.name, provider=kind, query=query):
+                        batch = fetch(query)
+                        self.assertIsNone(getattr(batch, "error", None))
+                        self.assertTrue(batch)
+                        streamed = list(stream(query))
+                        self.assertEqual([r.url for r in streamed], [r.url for r in batch])
+
+    def test_payload_cache_keeps_replayable_bodies(self):
+        p = self.p
+        payloads = importlib.import_module("addon.payload_cache")
+        payloads.PAYLOADS.configure(str(Path(self._tmp.name) / "payload_cache"))
+        try:
+            with p.transport.use_cassette(str(CASSETTES[0])):
+                batch = p.yimages.get_yimage_results("cat")
+                streamed = list(p.ddg.iter_ddg_images("cat"))
+            body, _ = payloads.PAYLOADS.get("yandex", "cat")
+            self.assertEqual([r.url for r in p.yimages.parse_yimages_payload(body)], [r.url for r in batch])
+            body, _ = payloads.PAYLOADS.get("duckduckgo", "cat")
+            self.assertEqual([r.url for r in p.ddg.parse_ddg_payload(body)], [r.url for r in streamed])
+        finally:
+            payloads.PAYLOADS.configure(None)
+
+    def test_streamed_searches_record_provider_timings(self):
+        p = self.p
+        timing = importlib.import_module("addon.timing")
+        streams = {"yandex": p.yimages.iter_yimages, "duckduckgo": p.ddg.iter_ddg_images}
+        with p.transport.use_cassette(str(CASSETTES[0])) as cassette:
+            for provider, stream in streams.items():
+                with self.subTest(provider=provider):
+                    timing.TIMINGS.clear()
+                    hits = cassette.hits
+                    self.assertTrue(list(stream("cat")))
+                    spans = [s for s in timing.TIMINGS.samples() if s[:2] == ("provider_http", provider)]
+                    # One span per request, including DuckDuckGo's token page
+                    self.assertEqual(len(spans), cassette.hits - hits)
+                    self.assertTrue(all(s[3] for s in spans))
+
+    def test_yandex_sizes_describe_the_original_variant(self):
+        item = json.dumps({
+            "thumb": {"url": "//im.test/thumb/1"},
+            "img_href": "https://site.test/cat.jpg",
+            "preview": [{"url": "//im.test/small.jpg", "w": 300, "h": 200, "fileSizeInBytes": 9000}],
+            "dups": [{"url": "https://im.test/big.jpg", "w": 1200, "h": 800, "fileSizeInBytes": 90000}],
+        })
+        image = self.p.yimages._result_from_serp_item(item)
+        self.assertEqual(image.url, "https://im.test/thumb/1")
+        self.assertEqual(image.thumb_url, "https://im.test/thumb/1")
+        self.assertEqual(image.original_url, "https://im.test/big.jpg")
+        self.assertEqual((image.width, image.height, image.byte_size), (1200, 800, 90000))
+        self.assertEqual(image.candidate_urls("default"), ["https://im.test/thumb/1"])
+        self.assertEqual(image.candidate_urls("original", max_bytes=50000), ["https://im.test/thumb/1"])
+
+        bare = self.p.yimages._result_from_serp_item(
+            json.dumps({"thumb": {"url": "//im.test/thumb/2"}, "img_href": "https://site.test/dog.jpg"})
+        )
+        self.assertEqual(bare.url, "https://im.test/thumb/2")
+        self.assertEqual(bare.original_url, "https://site.test/dog.jpg")
+        self.assertEqual((bare.width, bare.height, bare.byte_size), (0, 0, 0))
+
+    def test_unrecorded_query_fails_without_network(self):
+        p = self.p
+        path = str(CASSETTES[0])
+        with p.transport.use_cassette(path) as cassette:
+            self.assertEqual(p.yimages.get_yimage_results("never recorded").error, "provider_error")
+            self.assertEqual(p.ddg.get_ddg_image_results("never recorded").error, "provider_error")
+            self.assertGreaterEqual(cassette.misses, 2)
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class DdgStreamTokenTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.p = _load_providers({"max_retries": 0, "ddg_vqd_ttl_s": 0}, self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_stream_without_results_refreshes_token(self):
+        p = self.p
+        tokens = []
+
+        def get_vqd(query, *net):
+            tokens.append(query)
+            return f"vqd-{len(tokens)}"
+
+        bodies = {"vqd-1": b'{"error": "invalid vqd"}', "vqd-2": b'{"results": [{"image": "https://a.test/1.jpg"}]}'}
+        p.ddg._get_vqd = get_vqd
+        p.transport.get = lambda url, params=None, **_: p.transport._build_response(
+            url, 200, {"Content-Type": "application/json"}, bodies[params["vqd"]]
+        )
+
+        streamed = list(p.ddg.iter_ddg_images("cat"))
+        self.assertEqual([r.url for r in streamed], ["https://a.test/1.jpg"])
+        self.assertEqual(len(tokens), 2)
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class GooglePagingTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        config = {
+            "max_retries": 0,
+            "google_api_key": "test-key",
+            "google_cx": "test-cx",
+            "google_result_depth": 20,
+            "google_daily_quota": 100000,
+        }
+        self.p = _load_providers(config, self._tmp.name)
+        self.starts = []
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _serve(self, pages):
+        p = self.p
+
+        def get(url, params=None, **_):
+            start = int(params.get("start", 1))
+            self.starts.append(start)
+            return p.transport._build_response(url, 200, {"Content-Type": "application/json"}, pages[start])
+
+        p.transport.get = get
+
+    def test_empty_first_page_ends_both_paths(self):
+        page = b'{"items": [{"link": "https://a.test/11.jpg"}]}'
+        self._serve({1: b'{"kind": "customsearch#search"}', 11: page})
+        self.assertEqual(list(self.p.gimages.getgimage_results("cat")), [])
+        self.starts.clear()
+        self.assertEqual(list(self.p.gimages.itergimages("cat")), [])
+        # Streaming does not spend quota on the second page
+        self.assertEqual(self.starts, [1])
+
+    def test_both_paths_merge_pages_in_order(self):
+        self._serve({
+            1: b'{"items": [{"link": "https://a.test/1.jpg"}]}',
+            11: b'{"items": [{"link": "https://a.test/11.jpg"}]}',
+        })
+        expected = ["https://a.test/1.jpg", "https://a.test/11.jpg"]
+        self.assertEqual([r.url for r in self.p.gimages.getgimage_results("cat")], expected)
+        self.assertEqual([r.url for r in self.p.gimages.itergimages("cat")], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
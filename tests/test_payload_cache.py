@@ -0,0 +1,112 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+payload_cache = load_addon_module("payload_cache")
+
+
+class PayloadCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self._tmp.name, "payload_cache")
+
+    def tearDown(self):
+        payload_cache.PAYLOADS.configure(None)
+        self._tmp.cleanup()
+
+    def test_roundtrip_is_compressed_and_case_insensitive(self):
+        cache = payload_cache.PayloadCache(self.folder)
+        body = b'{"items": []}' * 100
+        self.assertTrue(cache.put("google", "Red Panda", 0, body))
+        self.assertEqual(cache.get("google", "red panda", 0)[0], body)
+        self.assertIsNone(cache.get("yandex", "red panda", 0))
+        self.assertLess(cache.total_bytes(), len(body))
+        # A new instance reads the persisted index
+        reopened = payload_cache.PayloadCache(self.folder)
+        self.assertEqual(reopened.get("google", "Red Panda", 0)[0], body)
+        self.assertEqual(reopened.queries(), [("google", "Red Panda")])
+
+    def test_pages_stop_at_first_gap_or_old_page(self):
+        cache = payload_cache.PayloadCache(self.folder)
+        cache.put("google", "cat", 0, b"p0")
+        cache.put("google", "cat", 1, b"p1")
+        cache.put("google", "cat", 3, b"p3")
+        self.assertEqual(cache.pages("google", "cat"), [b"p0", b"p1"])
+        self.assertEqual(cache.pages("google", "cat", max_age_s=3600), [b"p0", b"p1"])
+        key = payload_cache._key("google", "cat", 0)
+        cache._index[key]["stored_at"] -= 7200
+        self.assertEqual(cache.pages("google", "cat", max_age_s=3600), [])
+
+    def test_size_bound_evicts_oldest(self):
+        one = gzip.compress(b"a" * 10)
+        cache = payload_cache.PayloadCache(self.folder, max_bytes=len(one) * 2)
+        cache.put("yandex", "one", 0, b"a" * 10)
+        os.utime(os.path.join(self.folder, cache._index[payload_cache._key("yandex", "one", 0)]["file"]), (1, 1))
+        cache.put("yandex", "two", 0, b"a" * 10)
+        cache.put("yandex", "three", 0, b"a" * 10)
+        self.assertIsNone(cache.get("yandex", "one"))
+        self.assertIsNotNone(cache.get("yandex", "three"))
+        self.assertLessEqual(cache.total_bytes(), cache.max_bytes)
+
+    def test_puts_use_in_memory_sizes_and_batch_index_writes(self):
+        cache = payload_cache.PayloadCache(self.folder)
+        cache.put("yandex", "q0", 0, b"x" * 100)
+        scans = []
+        files = cache._files
+        cache._files = lambda: scans.append(1) or files()
+        for i in range(1, 5):
+            cache.put("yandex", f"q{i}", 0, b"x" * 100)
+        self.assertEqual(scans, [])
+        names = [n for n in os.listdir(self.folder) if n.endswith(".gz")]
+        on_disk = sum(os.path.getsize(os.path.join(self.folder, n)) for n in names)
+        self.assertEqual(cache.total_bytes(), on_disk)
+        # Written right away once, then held back until flush()
+        self.assertIsNone(payload_cache.PayloadCache(self.folder).get("yandex", "q4"))
+        cache.flush()
+        self.assertIsNotNone(payload_cache.PayloadCache(self.folder).get("yandex", "q4"))
+
+    def test_corrupt_file_is_a_miss(self):
+        cache = payload_cache.PayloadCache(self.folder)
+        cache.put("yandex", "cat", 0, b"body")
+        name = cache._index[payload_cache._key("yandex", "cat", 0)]["file"]
+        with open(os.path.join(self.folder, name), "wb") as f:
+            f.write(b"not gzip")
+        self.assertIsNone(cache.get("yandex", "cat"))
+        self.assertEqual(cache.queries(), [])
+
+    def test_stamp_persists(self):
+        cache = payload_cache.PayloadCache(self.folder)
+        cache.put("yandex", "cat", 0, b"body")
+        cache.set_stamp("3.11.2")
+        self.assertEqual(payload_cache.PayloadCache(self.folder).stamp(), "3.11.2")
+
+    def test_shared_store_and_tee_only_when_configured(self):
+        shared = payload_cache.PAYLOADS
+        payload_cache.store("yandex", "cat", 0, b"body")
+        body = payload_cache.Tee([b"a", b"b"], "yandex", "dog")
+        self.assertEqual(list(body), [b"a", b"b"])
+        body.finish()
+        self.assertFalse(os.path.exists(self.folder))
+
+        shared.configure(self.folder)
+        payload_cache.store("yandex", "cat", 0, b"body")
+        self.assertEqual(shared.get("yandex", "cat")[0], b"body")
+
+        # finish() reads what the parser left unread
+        body = payload_cache.Tee([b"a", b"b", b"c"], "yandex", "dog")
+        self.assertEqual(next(iter(body)), b"a")
+        body.finish()
+        self.assertEqual(shared.get("yandex", "dog")[0], b"abc")
+
+        # A body abandoned half way is not stored
+        body = payload_cache.Tee([b"a", b"b"], "yandex", "bird")
+        next(iter(body))
+        self.assertIsNone(shared.get("yandex", "bird"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+phash = load_addon_module("phash")
+
+
+def _gradient(step=10, offset=0):
+    return [[offset + x * step for x in range(phash.HASH_W)] for _ in range(phash.HASH_H)]
+
+
+class PHashTests(unittest.TestCase):
+    def test_dhash_is_brightness_invariant(self):
+        self.assertEqual(phash.dhash_from_pixels(_gradient()), phash.dhash_from_pixels(_gradient(offset=40)))
+        self.assertEqual(phash.dhash_from_pixels(_gradient()), 0)
+        self.assertEqual(phash.dhash_from_pixels(_gradient(step=-10, offset=200)), 2**64 - 1)
+
+    def test_hamming_and_is_near(self):
+        self.assertEqual(phash.hamming(0b1011, 0b0001), 2)
+        self.assertTrue(phash.is_near(0b1011, [0b0001], max_distance=2))
+        self.assertFalse(phash.is_near(0b1011, [0b0001], max_distance=1))
+
+    def test_undecodable_bytes_give_no_hash(self):
+        self.assertIsNone(phash.dhash_bytes(b""))
+
+    def test_cache_is_bounded(self):
+        cache = phash.PHashCache(max_entries=2)
+        for i in range(3):
+            cache.put(f"u{i}", i)
+        self.assertIsNone(cache.get("u0"))
+        self.assertEqual(cache.get("u2"), 2)
+        cache.put("u3", None)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
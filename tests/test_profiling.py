@@ -0,0 +1,71 @@
+import os
+import pstats
+import tempfile
+import threading
+import tracemalloc
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+profiling = load_addon_module("profiling")
+
+
+def _work():
+    return sum(len(str(i) * 10) for i in range(20000))
+
+
+class ProfilingTests(unittest.TestCase):
+    def test_arm_is_one_shot(self):
+        profiling.arm()
+        self.assertTrue(profiling.is_armed())
+        self.assertTrue(profiling.take_armed())
+        self.assertFalse(profiling.take_armed())
+
+    def test_run_profiled_writes_prof_and_summary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = os.path.join(tmp, "profiles")
+            result, prof_path, summary_path = profiling.run_profiled(_work, folder, "search", top_n=5)
+            self.assertEqual(result, _work())
+            self.assertTrue(prof_path.endswith(".prof"))
+            stats = pstats.Stats(prof_path)
+            self.assertTrue(any(func[2] == "_work" for func in stats.stats))
+            with open(summary_path, encoding="utf-8") as f:
+                text = f.read()
+            self.assertIn("Top 5 allocations by line", text)
+            self.assertIn("Peak traced memory", text)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_threads_started_during_the_call_are_profiled(self):
+        def batch():
+            worker = threading.Thread(target=_work)
+            worker.start()
+            worker.join()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _, prof_path, summary_path = profiling.run_profiled(batch, tmp, "batch", threads=True)
+            stats = pstats.Stats(prof_path)
+            self.assertTrue(any(func[2] == "_work" for func in stats.stats))
+            with open(summary_path, encoding="utf-8") as f:
+                self.assertIn("Threads profiled:", f.read())
+
+    def test_summary_states_thread_coverage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _, _, summary_path = profiling.run_profiled(_work, tmp, "search")
+            with open(summary_path, encoding="utf-8") as f:
+                text = f.read()
+        expected = "all threads" if profiling._PROFILES_ALL_THREADS else "the calling thread only"
+        self.assertIn(f"Threads profiled: {expected}", text)
+
+    def test_files_written_when_call_fails(self):
+        def boom():
+            raise RuntimeError("provider exploded")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(RuntimeError):
+                profiling.run_profiled(boom, tmp, "search")
+            self.assertEqual(len([n for n in os.listdir(tmp) if n.endswith(".prof")]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+ranking = load_addon_module("ranking")
+results = load_addon_module("results")
+R = results.ImageResult
+
+
+class RankingTests(unittest.TestCase):
+    def test_icons_and_huge_files_move_to_the_end(self):
+        icon = R("https://a/icon.png", width=40, height=40)
+        poster = R("https://a/poster.jpg", width=1000, height=800, byte_size=12 * 1024 * 1024)
+        good = R("https://a/good.jpg", width=1024, height=768)
+        ranked = ranking.rank([icon, poster, good], ranking.RankingPrefs())
+        self.assertEqual(ranked, [good, poster, icon])
+
+    def test_format_allow_list_uses_mime_then_extension(self):
+        prefs = ranking.RankingPrefs({"formats": ["jpg", "png"]})
+        svg = R("https://a/x.svg")
+        tiff = R("https://a/y", mime="image/tiff")
+        jpeg = R("https://a/z.JPG")
+        self.assertEqual(ranking.rank([svg, tiff, jpeg], prefs), [jpeg, svg, tiff])
+
+    def test_unknown_metadata_keeps_provider_order(self):
+        items = [R(f"https://a/{i}") for i in range(5)]
+        self.assertEqual(ranking.rank(items, ranking.RankingPrefs()), items)
+
+    def test_target_size_and_aspect(self):
+        prefs = ranking.RankingPrefs({"target_long_side_px": 800, "aspect_ratio": 1.0})
+        wide = R("https://a/wide", width=800, height=200)
+        huge = R("https://a/huge", width=6400, height=6400)
+        square = R("https://a/square", width=700, height=700)
+        self.assertEqual(ranking.rank([wide, huge, square], prefs), [square, wide, huge])
+
+    def test_disabled(self):
+        icon = R("https://a/icon.png", width=10, height=10)
+        good = R("https://a/good.jpg", width=1024, height=768)
+        prefs = ranking.RankingPrefs({"enabled": False})
+        self.assertEqual(ranking.rank([icon, good], prefs), [icon, good])
+
+
+if __name__ == "__main__":
+    unittest.main()
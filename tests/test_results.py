@@ -0,0 +1,51 @@
+import importlib.util
+import unittest
+from pathlib import Path
+
+
+def _load_results():
+    repo_root = Path(__file__).resolve().parents[1]
+    spec = importlib.util.spec_from_file_location("addon_results", repo_root / "addon" / "results.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+results = _load_results()
+
+
+class SizeProfileTests(unittest.TestCase):
+    def _yandex_like(self, **kwargs):
+        # As the Yandex parser builds it: the thumbnail is downloaded by
+        # default, and the reported sizes belong to the sized preview kept
+        # as original_url
+        return results.ImageResult(
+            "https://thumb/1",
+            thumb_url="https://thumb/1",
+            original_url="https://origin/1.jpg",
+            **kwargs,
+        )
+
+    def test_default_keeps_provider_url_first(self):
+        image = self._yandex_like(width=4000, height=3000)
+        self.assertEqual(image.candidate_urls("default")[0], "https://thumb/1")
+
+    def test_original_prefers_full_resolution_with_thumb_fallback(self):
+        image = self._yandex_like(width=4000, height=3000)
+        self.assertEqual(image.candidate_urls("original"), ["https://origin/1.jpg", "https://thumb/1"])
+
+    def test_medium_uses_original_only_when_small_enough(self):
+        self.assertEqual(self._yandex_like(width=800, height=600).candidate_urls("medium")[0], "https://origin/1.jpg")
+        self.assertEqual(self._yandex_like(width=4000, height=3000).candidate_urls("medium")[0], "https://thumb/1")
+
+    def test_known_oversized_original_is_skipped(self):
+        image = self._yandex_like(width=800, height=600, byte_size=5_000_000)
+        self.assertEqual(image.candidate_urls("original", max_bytes=1_000_000), ["https://thumb/1"])
+
+    def test_thumbnail_profile_with_ddg_style_record(self):
+        image = results.ImageResult("https://origin/2.png", thumb_url="https://tse.bing/th?id=2")
+        self.assertEqual(image.candidate_urls("thumbnail"), ["https://tse.bing/th?id=2", "https://origin/2.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+scheduler = load_addon_module("scheduler")
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_higher_priority_lanes_run_first(self):
+        sched = scheduler.Scheduler(max_workers=1)
+        gate = threading.Event()
+        order = []
+        sched.submit(gate.wait)  # occupy the only worker
+        sched.submit(lambda: order.append("warm"), scheduler.WARMING)
+        sched.submit(lambda: order.append("prefetch"), scheduler.PREFETCH)
+        sched.submit(lambda: order.append("interactive"), scheduler.INTERACTIVE)
+        gate.set()
+        self.assertTrue(sched.wait_idle(5))
+        self.assertEqual(order, ["interactive", "prefetch", "warm"])
+
+    def test_concurrency_cap(self):
+        sched = scheduler.Scheduler(max_workers=2)
+        lock = threading.Lock()
+        running, peak = [0], [0]
+        release = threading.Event()
+
+        def job():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+
+        for _ in range(6):
+            sched.submit(job, scheduler.PREFETCH)
+        release.set()
+        self.assertTrue(sched.wait_idle(5))
+        self.assertLessEqual(peak[0], 2)
+        self.assertLessEqual(sched.stats()["threads"], 2)
+
+    def test_pause_holds_background_lanes_only(self):
+        sched = scheduler.Scheduler(max_workers=1)
+        done = []
+        sched.pause()
+        sched.submit(lambda: done.append("warm"), scheduler.WARMING)
+        sched.submit(lambda: done.append("interactive"), scheduler.INTERACTIVE)
+        ran = threading.Event()
+        sched.submit(ran.set, scheduler.INTERACTIVE)
+        self.assertTrue(ran.wait(5))
+        self.assertEqual(done, ["interactive"])
+        self.assertEqual(sched.stats()["queued"]["warming"], 1)
+        sched.resume()
+        self.assertTrue(sched.wait_idle(5))
+        self.assertEqual(done, ["interactive", "warm"])
+
+    def test_clear_drops_queued_background_jobs(self):
+        sched = scheduler.Scheduler(max_workers=1)
+        sched.pause()
+        sched.submit(lambda: None, scheduler.PREFETCH)
+        sched.submit(lambda: None, scheduler.WARMING)
+        self.assertEqual(sched.clear(), 2)
+        self.assertTrue(sched.wait_idle(5))
+
+    def test_failing_job_does_not_stop_worker(self):
+        sched = scheduler.Scheduler(max_workers=1)
+        done = threading.Event()
+        sched.submit(lambda: 1 / 0)
+        sched.submit(done.set)
+        self.assertTrue(done.wait(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 import importlib.util
+import os
 import sys
+import tempfile
+import time
 import types
 import unittest
 from pathlib import Path
@@ -12,7 +15,14 @@ def _make_module(name, **attrs):
     return mod
 
 
-def _load_search(config, ddg_results=None, yandex_results=None, google_results=None, strip_fn=None):
+def _load_search(
+    config,
+    ddg_results=None,
+    yandex_results=None,
+    google_results=None,
+    strip_fn=None,
+    streaming=False,
+):
     # Clear prior stubs/modules
     for name in [
         "addon.search",
@@ -59,13 +69,24 @@ def _load_search(config, ddg_results=None, yandex_results=None, google_results=N
         calls["google"] = q
         return list(google_results or [])
 
-    sys.modules["addon.ddg_hidden_test"] = _make_module(
-        "addon.ddg_hidden_test", get_ddg_images=_ddg, getddgimages=_ddg
-    )
-    sys.modules["addon.yimages"] = _make_module(
-        "addon.yimages", get_yimages=_yandex, getyimages=_yandex
-    )
-    sys.modules["addon.gimages"] = _make_module("addon.gimages", getgimages=_google)
+    ddg_attrs = {"get_ddg_images": _ddg, "getddgimages": _ddg}
+    yandex_attrs = {"get_yimages": _yandex, "getyimages": _yandex}
+    google_attrs = {"getgimages": _google}
+    if streaming:
+        def _stream(name, results):
+            def _iter(q):
+                calls[name + "_stream"] = q
+                yield from (results or [])
+
+            return _iter
+
+        ddg_attrs["iter_ddg_images"] = _stream("ddg", ddg_results)
+        yandex_attrs["iter_yimages"] = _stream("yandex", yandex_results)
+        google_attrs["itergimages"] = _stream("google", google_results)
+
+    sys.modules["addon.ddg_hidden_test"] = _make_module("addon.ddg_hidden_test", **ddg_attrs)
+    sys.modules["addon.yimages"] = _make_module("addon.yimages", **yandex_attrs)
+    sys.modules["addon.gimages"] = _make_module("addon.gimages", **google_attrs)
 
     # Load addon.search without executing addon/__init__.py
     search_path = repo_root / "addon" / "search.py"
@@ -113,6 +134,53 @@ class SearchProviderTests(unittest.TestCase):
         self.assertEqual(calls.get("google"), "planet")
         self.assertNotIn("yandex", calls)
 
+    def test_google_quota_exhausted_routes_to_yandex(self):
+        config = {"provider": "google", "google_fallback_to_yandex": True}
+        search, calls = _load_search(config, google_results=["g1"], yandex_results=["y1"])
+        search.google_quota_allows_search = lambda: False
+        self.assertEqual(search.getresultbyquery("planet"), "y1")
+        self.assertEqual(search.get_provider_label("planet"), "Yandex (Google daily quota used up)")
+        self.assertNotIn("google", calls)
+
+    def test_google_quota_available_uses_google(self):
+        config = {"provider": "google"}
+        search, calls = _load_search(config, google_results=["g1"], yandex_results=["y1"])
+        search.google_quota_allows_search = lambda: True
+        self.assertEqual(search.getresultbyquery("planet"), "g1")
+        self.assertEqual(calls.get("google"), "planet")
+
+    def test_empty_result_is_negatively_cached(self):
+        config = {"provider": "yandex", "negative_cache_ttl_s": 60}
+        search, calls = _load_search(config, yandex_results=[])
+        self.assertIsNone(search.getresultbyquery("zzz"))
+        self.assertEqual(search.get_failure_reason("zzz"), "no_results")
+        calls.clear()
+        self.assertIsNone(search.getresultbyquery("zzz"))
+        self.assertNotIn("yandex", calls)
+
+    def test_negative_cache_expires(self):
+        config = {"provider": "yandex", "negative_cache_ttl_s": 0}
+        search, calls = _load_search(config, yandex_results=[])
+        search.getresultbyquery("zzz")
+        calls.clear()
+        search.getresultbyquery("zzz")
+        self.assertEqual(calls.get("yandex"), "zzz")
+
+    def test_provider_error_reason(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config)
+        search._get_yandex_results = lambda q: search.ResultList(error="provider_error")
+        self.assertIsNone(search.getresultbyquery("q"))
+        self.assertEqual(search.get_failure_reason("q"), "provider_error")
+
+    def test_provider_error_while_offline(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config)
+        search._get_yandex_results = lambda q: search.ResultList(error="provider_error")
+        search.utils._network_available = lambda: False
+        search.getresultbyquery("q")
+        self.assertEqual(search.get_failure_reason("q"), "offline")
+
     def test_provider_label_default(self):
         config = {"provider": "yandex"}
         search, _ = _load_search(config)
@@ -143,13 +211,635 @@ class SearchProviderTests(unittest.TestCase):
     def test_cache_eviction(self):
         config = {"provider": "ddg"}
         search, _ = _load_search(config, ddg_results=["u1"])
-        search.MAX_CACHED_QUERIES = 2
+        search.CACHE.max_entries = 2
         search.getresultbyquery("q1")
         search.getresultbyquery("q2")
         search.getresultbyquery("q3")  # should evict q1
-        self.assertNotIn("q1", search.RESULTS)
-        self.assertIn("q2", search.RESULTS)
-        self.assertIn("q3", search.RESULTS)
+        self.assertNotIn(search._cache_key("q1"), search.CACHE)
+        self.assertIn(search._cache_key("q2"), search.CACHE)
+        self.assertIn(search._cache_key("q3"), search.CACHE)
+        self.assertEqual(search.get_cache_stats()["evictions"], 1)
+
+    def test_lookup_touches_lru_order(self):
+        config = {"provider": "ddg"}
+        search, _ = _load_search(config, ddg_results=["u1"])
+        search.CACHE.max_entries = 2
+        search.getresultbyquery("q1")
+        search.getresultbyquery("q2")
+        search.getresultbyquery("q1")  # q1 becomes most recent
+        search.getresultbyquery("q3")  # should evict q2
+        self.assertIn(search._cache_key("q1"), search.CACHE)
+        self.assertNotIn(search._cache_key("q2"), search.CACHE)
+
+    def test_cache_hit_miss_counters(self):
+        config = {"provider": "ddg"}
+        search, _ = _load_search(config, ddg_results=["u1"])
+        search.getresultbyquery("q1")
+        search.getresultbyquery("q1")
+        stats = search.get_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_query_normalization_shares_entry(self):
+        config = {"provider": "ddg"}
+        search, calls = _load_search(config, ddg_results=["d1"])
+        search.getresultbyquery("{{c1::Big  Cat::animal}}")
+        self.assertEqual(calls.get("ddg"), "Big Cat")
+        calls.clear()
+        self.assertEqual(search.getresultbyquery("big cat"), "d1")
+        self.assertNotIn("ddg", calls)
+
+    def test_cache_is_partitioned_by_provider(self):
+        config = {"provider": "ddg"}
+        search, calls = _load_search(config, ddg_results=["d1"], yandex_results=["y1"])
+        self.assertEqual(search.getresultbyquery("cat"), "d1")
+        config["provider"] = "yandex"
+        self.assertEqual(search.getresultbyquery("cat"), "y1")
+        self.assertEqual(calls.get("yandex"), "cat")
+        config["provider"] = "ddg"
+        calls.clear()
+        self.assertEqual(search.getresultbyquery("cat"), "d1")
+        self.assertEqual(calls, {})
+
+    def test_fallback_reuses_cached_yandex_entry(self):
+        config = {"provider": "yandex"}
+        search, calls = _load_search(config, google_results=[], yandex_results=["y1"])
+        search.getresultbyquery("cat")
+        config["provider"] = "google"
+        calls.clear()
+        self.assertEqual(search.getresultbyquery("cat"), "y1")
+        self.assertEqual(search.get_provider_label("cat"), "Yandex (fallback from Google)")
+        self.assertEqual(calls, {"google": "cat"})
+
+    def test_fallback_results_cached_under_yandex(self):
+        config = {"provider": "ddg"}
+        search, calls = _load_search(config, ddg_results=[], yandex_results=["y1"])
+        search.getresultbyquery("cat")
+        config["provider"] = "yandex"
+        calls.clear()
+        self.assertEqual(search.getresultbyquery("cat"), "y1")
+        self.assertEqual(search.get_provider_label("cat"), "Yandex")
+        self.assertEqual(calls, {})
+
+    def test_records_keep_provider_metadata(self):
+        config = {"provider": "ddg"}
+        search, _ = _load_search(config)
+        search._get_ddg_results = lambda q: [
+            search.ImageResult("https://a/full.jpg", thumb_url="https://a/t.jpg", width=800, height=600)
+        ]
+        self.assertEqual(search.getresultbyquery("q"), "https://a/full.jpg")
+        record = search.get_current_result("q")
+        self.assertEqual((record.width, record.height), (800, 600))
+        self.assertEqual(record.thumb_url, "https://a/t.jpg")
+        self.assertEqual(record.provider, "duckduckgo")
+
+    def test_bare_url_strings_are_wrapped(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config, yandex_results=["y1"])
+        search.getresultbyquery("q")
+        record = search.get_current_result("q")
+        self.assertEqual(record.url, "y1")
+        self.assertEqual(record.provider, "yandex")
+
+    def test_duplicate_urls_are_merged(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(
+            config,
+            yandex_results=["http://ex.com/a.jpg", "https://ex.com/a.jpg?utm_source=y", "https://ex.com/b.jpg"],
+        )
+        self.assertEqual(search.getresultbyquery("q"), "http://ex.com/a.jpg")
+        self.assertEqual(search.getnextresultbyquery("q"), "https://ex.com/b.jpg")
+        self.assertEqual(search.getnextresultbyquery("q"), "https://ex.com/b.jpg")
+
+    def test_merge_providers_interleaves(self):
+        config = {"provider": "yandex", "merge_providers": ["yandex", "ddg"]}
+        search, calls = _load_search(
+            config,
+            yandex_results=["https://y/1", "https://shared/x.jpg"],
+            ddg_results=["https://d/1", "http://shared/x.jpg", "https://d/2"],
+        )
+        self.assertEqual(search.getresultbyquery("q"), "https://y/1")
+        self.assertEqual(search.get_provider_label("q"), "Yandex + DuckDuckGo")
+        urls = [search.getnextresultbyquery("q") for _ in range(3)]
+        self.assertEqual(urls, ["https://d/1", "https://shared/x.jpg", "https://d/2"])
+        # The merged list is not filed under either single provider
+        self.assertNotIn(search._cache_key("q", "yandex"), search.CACHE)
+
+    def test_next_skips_near_duplicate_images(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config, yandex_results=["a", "a-crop", "b", "c"])
+        search.PHASHES.clear()
+        search.getresultbyquery("q")
+        search.PHASHES.put("a", 0b0000)
+        search.PHASHES.put("a-crop", 0b0011)
+        search.PHASHES.put("b", 2**64 - 1)
+        self.assertEqual(search.getnextresultbyquery("q"), "b")
+        # Going back and forward again still reaches shown images
+        self.assertEqual(search.getprevresultbyquery("q"), "a-crop")
+        self.assertEqual(search.getprevresultbyquery("q"), "a")
+        self.assertEqual(search.getnextresultbyquery("q"), "b")
+
+    def test_near_duplicate_skipping_can_be_disabled(self):
+        config = {"provider": "yandex", "phash_dedupe": False}
+        search, _ = _load_search(config, yandex_results=["a", "a-crop"])
+        search.PHASHES.clear()
+        search.getresultbyquery("q")
+        search.PHASHES.put("a", 0)
+        search.PHASHES.put("a-crop", 0)
+        self.assertEqual(search.getnextresultbyquery("q"), "a-crop")
+
+    def test_all_remaining_duplicates_still_advance(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config, yandex_results=["a", "a2"])
+        search.PHASHES.clear()
+        search.getresultbyquery("q")
+        search.PHASHES.put("a", 0)
+        search.PHASHES.put("a2", 0)
+        self.assertEqual(search.getnextresultbyquery("q"), "a2")
+
+    def test_prefetch_hashes_upcoming_thumbnails(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config)
+        search.PHASHES.clear()
+        search._get_yandex_results = lambda q: [
+            search.ImageResult("u%d" % i, thumb_url="t%d" % i) for i in range(6)
+        ]
+        fetched, pending = [], []
+        search.utils._download_bytes = lambda url, max_bytes=0: fetched.append(url) or b""
+        search._start_background = lambda fn, lane=None: pending.append(fn)
+        search.getresultbyquery("q")
+        self.assertEqual(len(pending), 1)
+        pending.pop()()
+        self.assertEqual(fetched, ["t1", "t2", "t3"])
+
+    def test_no_hash_prefetch_without_near_duplicate_skipping(self):
+        for config in ({"phash_dedupe": False}, {"phash_prefetch": False}):
+            search, _ = _load_search(config, yandex_results=["u1", "u2"])
+            pending = []
+            search.utils._download_bytes = lambda url, max_bytes=0: b""
+            search._start_background = lambda fn, lane=None: pending.append(fn)
+            search.getresultbyquery("q")
+            self.assertEqual(pending, [])
+
+    def test_results_are_ranked_before_download(self):
+        config = {"provider": "ddg"}
+        search, _ = _load_search(config)
+        search._get_ddg_results = lambda q: [
+            search.ImageResult("https://a/icon.png", width=32, height=32),
+            search.ImageResult("https://a/photo.jpg", width=1200, height=900),
+        ]
+        self.assertEqual(search.getresultbyquery("q"), "https://a/photo.jpg")
+        self.assertEqual(search.getnextresultbyquery("q"), "https://a/icon.png")
+
+    def test_quota_limited_provider(self):
+        search, _ = _load_search({"provider": "google"})
+        self.assertTrue(search.uses_quota_limited_provider())
+        search, _ = _load_search({"provider": "yandex", "merge_providers": ["yandex", "google"]})
+        self.assertTrue(search.uses_quota_limited_provider())
+        search, _ = _load_search({"provider": "duckduckgo"})
+        self.assertFalse(search.uses_quota_limited_provider())
+
+    def test_prewarm_makes_search_a_cache_hit(self):
+        config = {"provider": "yandex"}
+        search, calls = _load_search(config, yandex_results=["y1"])
+        first = search.prewarm("<b>q</b>")
+        self.assertEqual(first.url, "y1")
+        self.assertEqual(search.get_cache_stats()["misses"], 0)
+        calls.clear()
+        self.assertEqual(search.getresultbyquery("<b>q</b>"), "y1")
+        self.assertNotIn("yandex", calls)
+        self.assertEqual(search.get_cache_stats()["hits"], 1)
+        self.assertIsNone(search.prewarm("   "))
+
+    def test_cache_has_room_until_a_search_would_evict(self):
+        search, _ = _load_search({"provider": "yandex", "cache_max_entries": 3}, yandex_results=["y1"])
+        self.assertTrue(search.cache_has_room())
+        search.prewarm("a")
+        self.assertTrue(search.cache_has_room())
+        search.prewarm("b")
+        self.assertFalse(search.cache_has_room())
+
+    def test_is_cached(self):
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config, yandex_results=["y1"])
+        self.assertFalse(search.is_cached("q"))
+        search.getresultbyquery("q")
+        self.assertTrue(search.is_cached(" Q "))
+
+    def test_fetch_is_timed_per_provider(self):
+        config = {"provider": "ddg"}
+        search, _ = _load_search(config, ddg_results=[], yandex_results=["y1"])
+        search.TIMINGS.clear()
+        search.getresultbyquery("q")
+        search.getresultbyquery("q")
+        rows = search.TIMINGS.summary()
+        self.assertEqual([(r["stage"], r["provider"], r["count"]) for r in rows],
+                         [("search", "Yandex (fallback from DuckDuckGo)", 1)])
+
+    def test_concurrent_fetch_for_same_key_is_shared(self):
+        import threading
+
+        config = {"provider": "yandex"}
+        search, _ = _load_search(config)
+        started, release = threading.Event(), threading.Event()
+        count = []
+
+        def slow(q):
+            count.append(q)
+            started.set()
+            release.wait(5)
+            return ["y1"]
+
+        search._get_yandex = slow
+        worker = threading.Thread(target=search.prewarm, args=("q",))
+        worker.start()
+        started.wait(5)
+        answer = []
+        clicker = threading.Thread(target=lambda: answer.append(search.getresultbyquery("q")))
+        clicker.start()
+        release.set()
+        worker.join(5)
+        clicker.join(5)
+        self.assertEqual(answer, ["y1"])
+        self.assertEqual(len(count), 1)
+
+
+class PayloadCacheSearchTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        config = {"provider": "yandex", "payload_cache_enabled": True}
+        self.search, self.calls = _load_search(config, yandex_results=["net1"])
+        self.search.utils.user_files_path = lambda *parts: os.path.join(self._tmp.name, *parts)
+        self.search.utils.addon_version = lambda: "3.0.1"
+        self.search.parse_yimages_payload = lambda body: body.decode().split()
+
+    def tearDown(self):
+        self.search.PAYLOADS.configure(None)
+        self._tmp.cleanup()
+
+    def test_stored_payload_answers_without_provider_call(self):
+        search = self.search
+        search._apply_cache_limits()
+        search.PAYLOADS.put("yandex", "cats", 0, b"p1 p2")
+        self.assertEqual(search.getresultbyquery("Cats"), "p1")
+        self.assertEqual(search.getnextresultbyquery("Cats"), "p2")
+        self.assertNotIn("yandex", self.calls)
+
+    def test_old_payload_goes_to_network(self):
+        search = self.search
+        search._apply_cache_limits()
+        search.PAYLOADS.put("yandex", "cats", 0, b"p1")
+        key = next(iter(search.PAYLOADS._index))
+        search.PAYLOADS._index[key]["stored_at"] -= 2 * search.DEFAULT_SOFT_TTL_S
+        self.assertEqual(search.getresultbyquery("cats"), "net1")
+
+    def test_reparse_rebuilds_cached_entries_only(self):
+        search = self.search
+        search._apply_cache_limits()
+        search.PAYLOADS.put("yandex", "cats", 0, b"old")
+        search.PAYLOADS.put("yandex", "dogs", 0, b"dog")
+        self.assertEqual(search.getresultbyquery("cats"), "old")
+        self.assertTrue(search.payloads_need_reparse())
+
+        search.parse_yimages_payload = lambda body: ["new-" + body.decode()]
+        self.assertEqual(search.reparse_payloads(), 1)
+        self.assertEqual(search.get_current_result("cats").url, "new-old")
+        self.assertFalse(search.is_cached("dogs"))
+        self.assertFalse(search.payloads_need_reparse())
+        self.assertNotIn("yandex", self.calls)
+
+    def test_disabled_by_default(self):
+        search, calls = _load_search({"provider": "yandex"}, yandex_results=["net1"])
+        self.assertEqual(search.getresultbyquery("cats"), "net1")
+        self.assertFalse(search.PAYLOADS.enabled)
+
+
+class BundleSearchTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.search, self.calls = _load_search({"provider": "yandex"}, yandex_results=["net1"])
+        self.bundle = importlib.util.module_from_spec(
+            importlib.util.spec_from_file_location(
+                "addon_bundle", Path(__file__).resolve().parents[1] / "addon" / "bundle.py"
+            )
+        )
+        self.bundle.__spec__.loader.exec_module(self.bundle)
+        self.shelf = self.bundle.BundleShelf(os.path.join(self._tmp.name, "bundles"))
+        self.search.utils.bundles = lambda: self.shelf
+
+    def tearDown(self):
+        self.shelf._reopen()
+        self._tmp.cleanup()
+
+    def test_bundle_answers_miss_without_provider_call(self):
+        search = self.search
+        source = os.path.join(self._tmp.name, "team.imgsearch-bundle")
+        results = [search.ImageResult("b1").to_dict(), search.ImageResult("b2").to_dict()]
+        entry = {"key": ["yandex", "red panda"], "provider": "Yandex", "fetched_at": time.time(), "results": results}
+        self.bundle.export_bundle(source, [entry], [])
+        self.shelf.install(source)
+
+        self.assertEqual(search.getresultbyquery("Red Panda"), "b1")
+        self.assertEqual(search.getnextresultbyquery("Red Panda"), "b2")
+        self.assertEqual(search.get_provider_label("red panda"), "Yandex")
+        self.assertNotIn("yandex", self.calls)
+        self.assertEqual(search.getresultbyquery("cats"), "net1")
+
+    def test_bundle_rows_keep_their_age(self):
+        search = self.search
+        source = os.path.join(self._tmp.name, "team.imgsearch-bundle")
+        results = [search.ImageResult("b1").to_dict()]
+        fetched_at = time.time() - 3600
+        entries = [
+            {"key": ["yandex", "fresh"], "provider": "Yandex", "fetched_at": fetched_at, "results": results},
+            {"key": ["yandex", "old"], "provider": "Yandex", "fetched_at": time.time() - 2 * 86400, "results": results},
+        ]
+        self.bundle.export_bundle(source, entries, [])
+        self.shelf.install(source)
+
+        self.assertEqual(search.getresultbyquery("fresh"), "b1")
+        self.assertAlmostEqual(search.CACHE.get(("yandex", "fresh")).fetched_at, fetched_at, places=3)
+        # Past the hard TTL the bundle row is ignored and the provider asked
+        self.assertEqual(search.getresultbyquery("old"), "net1")
+        self.assertIn("yandex", self.calls)
+
+
+class LocalLibrarySearchTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmp.name, "library")
+        os.makedirs(self.root)
+        for name in ("red_panda.jpg", "cat.png"):
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(b"img")
+
+    def tearDown(self):
+        self.search.LOCAL_IMAGES.configure(None)
+        self._tmp.cleanup()
+
+    def _load(self, config, **kwargs):
+        config = dict(config, local_images_dir=self.root)
+        self.search, calls = _load_search(config, **kwargs)
+        self.search.utils.user_files_path = lambda *parts: os.path.join(self._tmp.name, *parts)
+        # Index builds run in the background; here they finish before the search goes on
+        self.search._start_background = lambda fn, lane=None: fn()
+        return self.search, calls
+
+    def test_local_provider_answers_without_network(self):
+        for streaming in (False, True):
+            search, calls = self._load({"provider": "local"}, yandex_results=["y1"], streaming=streaming)
+            url = search.getresultbyquery("Red panda")
+            self.assertEqual(url, Path(self.root, "red_panda.jpg").as_uri())
+            self.assertEqual(search.get_provider_label("Red panda"), "Local library")
+            self.assertEqual(search.get_current_result("Red panda").provider, "local")
+            self.assertEqual(calls, {})
+
+    def test_local_provider_falls_back_to_yandex(self):
+        search, calls = self._load({"provider": "local"}, yandex_results=["y1"])
+        self.assertEqual(search.getresultbyquery("giraffe"), "y1")
+        self.assertEqual(search.get_provider_label("giraffe"), "Yandex (fallback from Local library)")
+
+        search, calls = self._load({"provider": "local", "local_fallback_to_yandex": False}, yandex_results=["y1"])
+        self.assertIsNone(search.getresultbyquery("giraffe"))
+        self.assertNotIn("yandex", calls)
+
+    def test_local_first_tier_before_remote_provider(self):
+        search, calls = self._load({"provider": "duckduckgo", "local_images_first": True}, ddg_results=["d1"])
+        self.assertEqual(search.getresultbyquery("cat"), Path(self.root, "cat.png").as_uri())
+        self.assertNotIn("ddg", calls)
+        self.assertEqual(search.getresultbyquery("giraffe"), "d1")
+
+        search, calls = self._load({"provider": "duckduckgo"}, ddg_results=["d1"])
+        self.assertEqual(search.getresultbyquery("cat"), "d1")
+
+    def test_local_first_tier_needs_every_word(self):
+        search, calls = self._load({"provider": "duckduckgo", "local_images_first": True}, ddg_results=["d1"])
+        self.assertEqual(search.getresultbyquery("red apple"), "d1")
+        self.assertEqual(calls.get("ddg"), "red apple")
+        # As the provider itself, the closest local match is still offered
+        search, calls = self._load({"provider": "local"}, yandex_results=["y1"])
+        self.assertEqual(search.getresultbyquery("red apple"), Path(self.root, "red_panda.jpg").as_uri())
+
+    def test_no_local_tier_until_the_index_is_built(self):
+        search, calls = self._load({"provider": "duckduckgo", "local_images_first": True}, ddg_results=["d1"])
+        pending = []
+        search._start_background = lambda fn, lane=None: pending.append(fn)
+        search.start_local_index()
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(search.getresultbyquery("cat"), "d1")
+        pending.pop()()
+        search.CACHE.clear()
+        self.assertEqual(search.getresultbyquery("cat"), Path(self.root, "cat.png").as_uri())
+
+
+class MediaReuseSearchTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.search, self.calls = _load_search({"provider": "yandex"}, yandex_results=["y1"])
+        self.search.utils.user_files_path = lambda *parts: os.path.join(self._tmp.name, *parts)
+        self.search.utils.profile_name = lambda: "User 1"
+
+    def tearDown(self):
+        self.search.MEDIA_INDEX.configure(None)
+        self._tmp.cleanup()
+
+    def test_remembered_media_is_reused_per_profile(self):
+        search = self.search
+        self.assertTrue(search.media_index_needs_build())
+        self.assertEqual(search.reuse_media_mode(), "auto")
+        search.remember_media("Red   Panda ", "panda.jpg")
+        self.assertEqual(search.reusable_media("red  PANDA"), "panda.jpg")
+        self.assertIsNone(search.reusable_media("red panda", exists=lambda f: False))
+        self.assertTrue(os.path.exists(os.path.join(self._tmp.name, "media_index", "User 1.json")))
+        self.assertEqual(self.calls, {})
+
+        search.utils.profile_name = lambda: "User 2"
+        self.assertIsNone(search.reusable_media("cat"))
+        self.assertEqual(search.rebuild_media_index([("Cat", "cat.jpg")]), 1)
+        self.assertEqual(search.reusable_media("cat"), "cat.jpg")
+        self.assertFalse(search.media_index_needs_build())
+
+    def test_mode_from_config(self):
+        search, _ = _load_search({"reuse_existing_media": "OFFER"})
+        self.assertEqual(search.reuse_media_mode(), "offer")
+        search, _ = _load_search({"reuse_existing_media": "sometimes"})
+        self.assertEqual(search.reuse_media_mode(), "auto")
+
+
+class StaleWhileRevalidateTests(unittest.TestCase):
+    def _load(self, config, **kwargs):
+        search, calls = _load_search(config, **kwargs)
+        pending = []
+        search._start_background = lambda fn, lane=None: pending.append(fn)
+        return search, calls, pending
+
+    def _age(self, search, query, seconds):
+        search.CACHE.peek(search._cache_key(query)).fetched_at -= seconds
+
+    def test_soft_stale_entry_served_then_refreshed(self):
+        config = {"provider": "ddg", "cache_soft_ttl_s": 10, "cache_hard_ttl_s": 100}
+        search, calls, pending = self._load(config, ddg_results=["d1", "d2"])
+        search.getresultbyquery("q")
+        search.getnextresultbyquery("q")
+        self._age(search, "q", 50)
+        calls.clear()
+
+        self.assertEqual(search.getresultbyquery("q"), "d2")
+        self.assertNotIn("ddg", calls)
+        self.assertEqual(len(pending), 1)
+        # A second lookup while the refresh is in flight does not queue another
+        search.getresultbyquery("q")
+        self.assertEqual(len(pending), 1)
+
+        search._get_ddg = lambda q: ["d0", "d2", "d3"]
+        pending.pop()()
+        # Still on the same image, now at its new position
+        self.assertEqual(search.getresultbyquery("q"), "d2")
+        self.assertEqual(search.getnextresultbyquery("q"), "d3")
+        self.assertLess(search.CACHE.peek(search._cache_key("q")).age(), 10)
+
+    def test_empty_refresh_keeps_stale_list(self):
+        config = {"provider": "yandex", "cache_soft_ttl_s": 10}
+        search, calls, pending = self._load(config, yandex_results=["y1"])
+        search.getresultbyquery("q")
+        self._age(search, "q", 50)
+        search.getresultbyquery("q")
+        search._get_yandex = lambda q: []
+        pending.pop()()
+        self.assertEqual(search.getresultbyquery("q"), "y1")
+
+    def test_hard_expired_entry_refetched_synchronously(self):
+        config = {"provider": "ddg", "cache_soft_ttl_s": 10, "cache_hard_ttl_s": 100}
+        search, calls, pending = self._load(config, ddg_results=["d1"])
+        search.getresultbyquery("q")
+        self._age(search, "q", 500)
+        calls.clear()
+        search._get_ddg = lambda q: ["fresh"]
+        self.assertEqual(search.getresultbyquery("q"), "fresh")
+        self.assertEqual(pending, [])
+
+    def test_yandex_hard_expired_entry_refetched(self):
+        for streaming in (False, True):
+            config = {"provider": "yandex", "cache_soft_ttl_s": 10, "cache_hard_ttl_s": 100}
+            search, calls = _load_search(config, yandex_results=["y1"], streaming=streaming)
+            search._start_background = lambda fn, lane=None: None
+            search.getresultbyquery("q")
+            self._age(search, "q", 500)
+            search._get_yandex = lambda q: ["y2"]
+            if streaming:
+                search._iter_yandex = lambda q: iter(["y2"])
+            self.assertEqual(search.getresultbyquery("q"), "y2")
+
+    def test_yandex_soft_stale_entry_refreshed(self):
+        for streaming in (False, True):
+            config = {"provider": "yandex", "cache_soft_ttl_s": 10, "cache_hard_ttl_s": 100}
+            search, calls, pending = self._load(config, yandex_results=["y1"])
+            if streaming:
+                search._iter_yandex = lambda q: iter(["y1"])
+            search.getresultbyquery("q")
+            self._age(search, "q", 50)
+            self.assertEqual(search.getresultbyquery("q"), "y1")
+            search._get_yandex = lambda q: ["y2"]
+            if streaming:
+                search._iter_yandex = lambda q: iter(["y2"])
+            pending.pop()()
+            self.assertEqual(search.getresultbyquery("q"), "y2")
+            self.assertLess(search.CACHE.peek(search._cache_key("q")).age(), 10)
+
+    def test_fallback_reuses_only_fresh_yandex_entry(self):
+        config = {"provider": "ddg", "cache_soft_ttl_s": 10, "cache_hard_ttl_s": 100}
+        search, calls, pending = self._load(config, ddg_results=[], yandex_results=["y1"])
+        key = search._cache_key("q", "yandex")
+        search.CACHE.put(key, [search.ImageResult("cached")], "Yandex")
+        self.assertEqual(search.getresultbyquery("q"), "cached")
+        search.CACHE.clear()
+        search.CACHE.put(key, [search.ImageResult("cached")], "Yandex")
+        search.CACHE.peek(key).fetched_at -= 50
+        self.assertEqual(search.getresultbyquery("q"), "y1")
+
+
+class StreamingSearchTests(unittest.TestCase):
+    def _load(self, config, **kwargs):
+        search, calls = _load_search(config, streaming=True, **kwargs)
+        pending = []
+        search._start_background = lambda fn, lane=None: pending.append(fn)
+        return search, calls, pending
+
+    def test_first_window_returned_before_rest_is_drained(self):
+        urls = [f"d{i}" for i in range(1, 14)]
+        search, calls, pending = self._load({"provider": "ddg"}, ddg_results=urls)
+        window = search.STREAM_RANK_WINDOW
+        self.assertEqual(search.getresultbyquery("q"), "d1")
+        self.assertEqual([r.url for r in search.CACHE.peek(search._cache_key("q")).results], urls[:window])
+        self.assertEqual(calls.get("ddg_stream"), "q")
+        self.assertNotIn("ddg", calls)
+
+        for job in pending:
+            job()
+        self.assertEqual([r.url for r in search.CACHE.peek(search._cache_key("q")).results], urls)
+        self.assertEqual(search.getnextresultbyquery("q"), "d2")
+
+    def test_drain_runs_in_the_callers_lane(self):
+        search, calls = _load_search({"provider": "ddg"}, streaming=True, ddg_results=["d1", "d2"])
+        lanes = []
+        search._start_background = lambda fn, lane=search.INTERACTIVE: lanes.append(lane)
+        search.getresultbyquery("q")
+        search.prewarm("r")
+        search.prewarm("s", search.WARMING)
+        self.assertEqual(lanes, [search.INTERACTIVE, search.PREFETCH, search.WARMING])
+
+    def test_stream_falls_back_to_yandex(self):
+        search, calls, pending = self._load(
+            {"provider": "google", "google_fallback_to_yandex": True},
+            google_results=[],
+            yandex_results=["y1"],
+        )
+        self.assertEqual(search.getresultbyquery("q"), "y1")
+        self.assertEqual(search.get_provider_label("q"), "Yandex (fallback from Google)")
+        self.assertEqual(calls.get("google_stream"), "q")
+
+    def test_stream_drain_skips_duplicates(self):
+        config = {"provider": "yandex"}
+        search, calls, pending = self._load(
+            config, yandex_results=["https://ex.com/a.jpg", "http://ex.com/a.jpg", "https://ex.com/b.jpg"]
+        )
+        search.getresultbyquery("q")
+        pending.pop()()
+        self.assertEqual(search.getnextresultbyquery("q"), "https://ex.com/b.jpg")
+        self.assertEqual(search.getnextresultbyquery("q"), "https://ex.com/b.jpg")
+
+    def test_stream_first_result_is_ranked_winner(self):
+        config = {"provider": "yandex"}
+        search, calls, pending = self._load(config)
+        R = search.ImageResult
+        records = [
+            R("https://a/icon.png", width=32, height=32),
+            R("https://a/photo.jpg", width=1200, height=900),
+            R("https://a/1.jpg"),
+        ]
+        search._iter_yandex = lambda q: iter(records)
+        self.assertEqual(search.getresultbyquery("q"), "https://a/photo.jpg")
+        pending.pop()()
+        self.assertEqual(search.getnextresultbyquery("q"), "https://a/1.jpg")
+        self.assertEqual(search.getnextresultbyquery("q"), "https://a/icon.png")
+
+    def test_stream_drain_ranks_remaining_results(self):
+        config = {"provider": "yandex"}
+        search, calls, pending = self._load(config)
+        R = search.ImageResult
+        window = [R(f"https://a/{i}.jpg", width=800, height=600) for i in range(search.STREAM_RANK_WINDOW)]
+        late = [R("https://a/tiny.jpg", width=20, height=20), R("https://a/late.jpg", width=900, height=700)]
+        search._iter_yandex = lambda q: iter(window + late)
+        self.assertEqual(search.getresultbyquery("q"), "https://a/0.jpg")
+        pending.pop()()
+        results = search.CACHE.peek(search._cache_key("q")).results
+        self.assertEqual(results[-1].url, "https://a/tiny.jpg")
+
+    def test_stream_disabled_by_config(self):
+        search, calls, pending = self._load({"provider": "ddg", "stream_results": False}, ddg_results=["d1", "d2"])
+        self.assertEqual(search.getresultbyquery("q"), "d1")
+        self.assertEqual([r.url for r in search.CACHE.peek(search._cache_key("q")).results], ["d1", "d2"])
+        self.assertEqual(pending, [])
+        self.assertNotIn("ddg_stream", calls)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+import json
+import time
+import unittest
+
+from tests._helpers import load_addon_module
+
+
+timing = load_addon_module("timing")
+
+
+class TimingTests(unittest.TestCase):
+    def test_percentiles_per_stage_and_provider(self):
+        t = timing.Timings()
+        for ms in range(1, 101):
+            t.record("provider_http", ms / 1000.0, "yandex")
+        t.record("provider_http", 0.5, "google")
+        rows = {(r["stage"], r["provider"]): r for r in t.summary()}
+        yandex = rows[("provider_http", "yandex")]
+        self.assertEqual(yandex["count"], 100)
+        self.assertEqual(yandex["p50_ms"], 50.0)
+        self.assertEqual(yandex["p95_ms"], 95.0)
+        self.assertEqual(yandex["max_ms"], 100.0)
+        self.assertEqual(rows[("provider_http", "google")]["p95_ms"], 500.0)
+
+    def test_ring_buffer_is_bounded(self):
+        t = timing.Timings(capacity=3)
+        for i in range(5):
+            t.record("download", i)
+        self.assertEqual(len(t), 3)
+        self.assertEqual(t.summary()[0]["max_ms"], 4000.0)
+
+    def test_timed_records_failures_and_reraises(self):
+        t = timing.Timings()
+        with self.assertRaises(ValueError):
+            with t.timed("parse", "duckduckgo"):
+                raise ValueError("bad json")
+        with t.timed("parse", "duckduckgo"):
+            pass
+        row = t.summary()[0]
+        self.assertEqual((row["count"], row["errors"]), (2, 1))
+
+    def test_stream_span_skips_time_spent_by_the_consumer(self):
+        t = timing.Timings()
+
+        def slow_chunks():
+            time.sleep(0.02)
+            yield b"a"
+            time.sleep(0.02)
+            yield b"b"
+
+        span = timing.StreamSpan(t, "provider_http", "yandex")
+        for _ in span.chunks(slow_chunks()):
+            time.sleep(0.05)  # the consumer's work is not provider time
+        span.finish()
+        span.finish(ok=False)
+        self.assertEqual(len(t), 1)
+        seconds = t.samples()[0][2]
+        self.assertGreaterEqual(seconds, 0.04)
+        self.assertLess(seconds, 0.09)
+
+    def test_export_json(self):
+        t = timing.Timings()
+        t.record("media_add", 0.01)
+        data = json.loads(t.export_json({"cache": {"entries": 1}}))
+        self.assertEqual(data["summary"][0]["stage"], "media_add")
+        self.assertEqual(data["samples"][0]["ms"], 10.0)
+        self.assertEqual(data["cache"], {"entries": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tests._helpers import load_addon_module
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+transport = load_addon_module("transport") if requests else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class TransportTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "c.json.gz")
+
+    def tearDown(self):
+        transport.activate(None)
+        self._tmp.cleanup()
+
+    def test_request_key_sorts_params_and_drops_credentials(self):
+        a = transport.request_key("https://h/x", {"q": "a b", "key": "secret", "cx": "id", "num": 10})
+        b = transport.request_key("https://h/x?num=10&q=a+b")
+        self.assertEqual(a, b)
+        self.assertNotIn("secret", a)
+
+    def test_saved_cassette_replays_text_and_binary_bodies(self):
+        cassette = transport.Cassette(self.path, transport.RECORD)
+        cassette.add("https://h/api", {"q": "cat", "key": "secret"}, 200,
+                     {"Content-Type": "application/json", "Set-Cookie": "x"}, b'{"items": [1, 2]}')
+        cassette.add("https://h/img.jpg", None, 200, {}, b"\xff\xd8\x00\xff\xd9")
+        cassette.save()
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            raw = f.read()
+        self.assertNotIn("secret", raw)
+        self.assertNotIn("Set-Cookie", raw)
+
+        with transport.use_cassette(self.path) as replay:
+            resp = transport.get("https://h/api", params={"key": "other", "q": "cat"})
+            resp.raise_for_status()
+            self.assertEqual(resp.json(), {"items": [1, 2]})
+            with transport.get("https://h/img.jpg", stream=True) as img:
+                self.assertEqual(b"".join(img.iter_content(chunk_size=2)), b"\xff\xd8\x00\xff\xd9")
+        self.assertEqual(replay.hits, 2)
+        self.assertIsNone(transport.active())
+
+    def test_replay_of_unrecorded_request_is_a_connection_error(self):
+        transport.Cassette(self.path, transport.RECORD).save()
+        with transport.use_cassette(self.path) as replay:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                transport.get("https://h/missing")
+        self.assertEqual(replay.misses, 1)
+
+    def test_replay_of_missing_file_fails_fast(self):
+        with self.assertRaises(FileNotFoundError):
+            transport.Cassette(self.path, transport.REPLAY)
+
+    def test_record_mode_captures_live_responses(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/search"
+        try:
+            with transport.use_cassette(self.path, transport.RECORD):
+                live = transport.get(url, params={"q": "cat"}, timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(live.json(), {"path": "/search?q=cat"})
+        with transport.use_cassette(self.path):
+            self.assertEqual(transport.get(url, params={"q": "cat"}).json(), live.json())
+
+
+if __name__ == "__main__":
+    unittest.main()